@@ -114,6 +114,253 @@ DATABASES = {
 }
 
 
+# Video analysis pipeline
+# Number of workers per stage of the chunk pipeline (videos/pipeline.py).
+# Inference calls are further limited by the scheduler settings below.
+
+CHUNK_PIPELINE_CONCURRENCY = {
+    "download": int(os.getenv("CHUNK_DOWNLOAD_WORKERS", 4)),
+    "upload": int(os.getenv("CHUNK_UPLOAD_WORKERS", 4)),
+    "inference": int(os.getenv("CHUNK_INFERENCE_WORKERS", 8)),
+    "delete": int(os.getenv("CHUNK_DELETE_WORKERS", 2)),
+}
+
+# "cloudinary": download every chunk as a so_X,eo_Y transformation
+# "local": download the source once and cut the chunks with ffmpeg
+CHUNK_SOURCE_MODE = os.getenv("CHUNK_SOURCE_MODE", "cloudinary")
+# Max drift between a stream-copied segment and its interval before re-encoding
+CHUNK_SEGMENT_TOLERANCE_SECONDS = float(
+    os.getenv("CHUNK_SEGMENT_TOLERANCE_SECONDS", 1.0)
+)
+# Pipe remote chunks straight from Cloudinary into the NVIDIA asset upload.
+# Only applies with VLM_CACHE_ENABLED off: the cache needs the chunk's hash
+# before the upload, so cached runs download each chunk to a temp file first
+CHUNK_STREAM_UPLOADS = os.getenv("CHUNK_STREAM_UPLOADS", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Persistent cache of VLM responses keyed by clip content + inference params
+VLM_CACHE_ENABLED = os.getenv("VLM_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+VLM_CACHE_MAX_BYTES = int(os.getenv("VLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# 0 keeps entries until they are evicted by size
+VLM_CACHE_TTL_SECONDS = int(os.getenv("VLM_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+# Stores between two full size checks of the cache, in between each process
+# keeps a running total of what it stored
+VLM_CACHE_EVICT_INTERVAL = int(os.getenv("VLM_CACHE_EVICT_INTERVAL", 100))
+# "fixed": 30s chunks, "adaptive": boundaries follow scene changes and activity
+CHUNK_BOUNDARY_MODE = os.getenv("CHUNK_BOUNDARY_MODE", "adaptive")
+# Adaptive chunk lengths: a chunk is cut at a scene change once it is
+# CHUNK_MIN_SECONDS long, or once it holds CHUNK_ACTIVE_SECONDS of activity,
+# and static stretches grow up to CHUNK_MAX_SECONDS
+CHUNK_MIN_SECONDS = int(os.getenv("CHUNK_MIN_SECONDS", 10))
+CHUNK_MAX_SECONDS = int(os.getenv("CHUNK_MAX_SECONDS", 300))
+CHUNK_ACTIVE_SECONDS = int(os.getenv("CHUNK_ACTIVE_SECONDS", 30))
+# Frames per second decoded (at 64x36 grayscale) to score the video
+SCENE_SAMPLE_FPS = float(os.getenv("SCENE_SAMPLE_FPS", 2))
+# Histogram distance (0-1) between two frames that counts as a scene change
+SCENE_CUT_THRESHOLD = float(os.getenv("SCENE_CUT_THRESHOLD", 0.35))
+# Fraction of changed pixels above which a moment counts as active
+SCENE_ACTIVITY_THRESHOLD = float(os.getenv("SCENE_ACTIVITY_THRESHOLD", 0.02))
+# Gray-level change of a pixel that is more than sensor noise
+SCENE_PIXEL_THRESHOLD = int(os.getenv("SCENE_PIXEL_THRESHOLD", 12))
+# Idle prefilter (videos/prefilter.py): chunks whose motion stays below every
+# threshold get a synthetic "static scene" result instead of a VLM call
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Fraction of changed pixels, mean frame difference (0-1) and normal flow in
+# pixels per frame, taken at this percentile of the chunk's frames
+PREFILTER_ACTIVITY_THRESHOLD = float(os.getenv("PREFILTER_ACTIVITY_THRESHOLD", 0.005))
+PREFILTER_ENERGY_THRESHOLD = float(os.getenv("PREFILTER_ENERGY_THRESHOLD", 0.01))
+PREFILTER_FLOW_THRESHOLD = float(os.getenv("PREFILTER_FLOW_THRESHOLD", 0.02))
+PREFILTER_PERCENTILE = float(os.getenv("PREFILTER_PERCENTILE", 95))
+# Perceptual-hash deduplication (videos/dedup.py): chunks that look like an
+# analyzed segment reuse its analysis instead of a VLM call. Off by default,
+# calibrate the thresholds on your cameras' footage before turning it on
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "false").lower() in ("1", "true", "yes")
+# Frames hashed per chunk, the most bits any aligned pair may differ by, and
+# the most any thumbnail cell (4x4 pixels of the 64x36 decoded frames) may
+# change, in gray levels, beyond the overall brightness change
+DEDUP_FRAMES_PER_SEGMENT = int(os.getenv("DEDUP_FRAMES_PER_SEGMENT", 8))
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 8))
+DEDUP_MAX_CELL_DIFFERENCE = int(os.getenv("DEDUP_MAX_CELL_DIFFERENCE", 10))
+# Also match segments of other videos with the same camera_id
+DEDUP_ACROSS_CAMERA = os.getenv("DEDUP_ACROSS_CAMERA", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Most recent analyzed chunks searched for a match
+DEDUP_HISTORY_LIMIT = int(os.getenv("DEDUP_HISTORY_LIMIT", 2000))
+# Defaults to the ffmpeg binary bundled with imageio-ffmpeg
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY")
+
+
+# Inference scheduler in front of cosmos-nemotron (videos/scheduler.py)
+# Token bucket: average requests per second per process (0 disables) and burst
+NVIDIA_RATE_LIMIT_PER_SECOND = float(os.getenv("NVIDIA_RATE_LIMIT_PER_SECOND", 2))
+NVIDIA_RATE_LIMIT_BURST = int(os.getenv("NVIDIA_RATE_LIMIT_BURST", 4))
+# AIMD concurrency limit per process: grows on success, halves on 429
+NVIDIA_INITIAL_CONCURRENCY = int(os.getenv("NVIDIA_INITIAL_CONCURRENCY", 2))
+NVIDIA_MIN_CONCURRENCY = int(os.getenv("NVIDIA_MIN_CONCURRENCY", 1))
+NVIDIA_MAX_CONCURRENCY = int(os.getenv("NVIDIA_MAX_CONCURRENCY", 8))
+# In-flight requests across every process on the database (0 disables)
+NVIDIA_GLOBAL_CONCURRENCY = int(os.getenv("NVIDIA_GLOBAL_CONCURRENCY", 0))
+# Attempts per request on 429 / 5xx / connection errors, with jittered backoff
+NVIDIA_MAX_ATTEMPTS = int(os.getenv("NVIDIA_MAX_ATTEMPTS", 5))
+NVIDIA_BACKOFF_BASE_SECONDS = float(os.getenv("NVIDIA_BACKOFF_BASE_SECONDS", 1))
+NVIDIA_BACKOFF_MAX_SECONDS = float(os.getenv("NVIDIA_BACKOFF_MAX_SECONDS", 60))
+# Seconds an inference request may take before it is abandoned (and retried)
+NVIDIA_INFERENCE_TIMEOUT_SECONDS = float(
+    os.getenv("NVIDIA_INFERENCE_TIMEOUT_SECONDS", 300)
+)
+
+
+# NVIDIA asset collector (videos/assets.py, `manage.py collect_assets`)
+# When false, assets are deleted synchronously as soon as a chunk is done
+NVCF_ASSET_GC_ENABLED = os.getenv("NVCF_ASSET_GC_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+NVCF_ASSET_GC_BATCH_SIZE = int(os.getenv("NVCF_ASSET_GC_BATCH_SIZE", 20))
+NVCF_ASSET_GC_INTERVAL_SECONDS = float(os.getenv("NVCF_ASSET_GC_INTERVAL_SECONDS", 5))
+NVCF_ASSET_GC_MAX_ATTEMPTS = int(os.getenv("NVCF_ASSET_GC_MAX_ATTEMPTS", 5))
+NVCF_ASSET_GC_BACKOFF_SECONDS = float(os.getenv("NVCF_ASSET_GC_BACKOFF_SECONDS", 30))
+# Active assets older than this are treated as leaked by a crashed process
+NVCF_ASSET_ORPHAN_SECONDS = int(os.getenv("NVCF_ASSET_ORPHAN_SECONDS", 3600))
+# Description of every uploaded asset. Untracked assets in NVIDIA's storage
+# are only swept when NVCF_ASSET_SWEEP_UNTRACKED is on, and only if their
+# description starts with this one: make it unique per deployment first,
+# other deployments sharing the API key would lose their uploads otherwise
+NVCF_ASSET_DESCRIPTION = os.getenv("NVCF_ASSET_DESCRIPTION", "Video analysis")
+NVCF_ASSET_SWEEP_UNTRACKED = os.getenv(
+    "NVCF_ASSET_SWEEP_UNTRACKED", "false"
+).lower() in ("1", "true", "yes")
+
+
+# Shared HTTP / database clients (videos/clients.py)
+# Number of per-host pools kept and connections kept alive per host
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32))
+# Multiplex NVIDIA and OpenAI API calls over HTTP/2 (needs the h2 package)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+# SQLAlchemy pool of the engine shared by every PGVector store
+VECTOR_DB_POOL_SIZE = int(os.getenv("VECTOR_DB_POOL_SIZE", 5))
+VECTOR_DB_MAX_OVERFLOW = int(os.getenv("VECTOR_DB_MAX_OVERFLOW", 10))
+# "per_video" keeps a PGVector collection per video (video_id_<id>), "shared"
+# stores every chunk in one indexed collection filtered by video_id (see
+# videos/vector_store.py and `manage.py migrate_vector_store`)
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "per_video")
+VECTOR_SHARED_COLLECTION = os.getenv("VECTOR_SHARED_COLLECTION", "video_chunks")
+# HNSW index build parameters
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", 16))
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", 64))
+# Candidate search of cross-video search in the shared collection: "none"
+# (index of the full vectors), "halfvec" or "binary" (index of half precision
+# or sign-bit vectors, reranked exactly), or "exact" (no index). Quantized
+# modes fetch page size times VECTOR_RERANK_FACTOR candidates to rerank.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", 4))
+# Embeddings of the chunk documents and queries (videos/embedding_backends.py):
+# "openai" or "hashing" (local hashed bag of words, works offline). A non-zero
+# EMBEDDING_DIMENSIONS truncates OpenAI vectors (Matryoshka: 256, 512, 1024)
+# or sizes the hashing vectors (default 1024). Collections record what they
+# were embedded with: after a change per-video collections are re-embedded,
+# the shared one needs a new VECTOR_SHARED_COLLECTION and `embed_backlog`
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 0))
+# Embed chunks in micro-batches while the analysis runs instead of only at the
+# end: documents per batch, and seconds a finished chunk waits for a batch
+EMBEDDING_INCREMENTAL = os.getenv("EMBEDDING_INCREMENTAL", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+EMBEDDING_MICRO_BATCH_SIZE = int(os.getenv("EMBEDDING_MICRO_BATCH_SIZE", 8))
+EMBEDDING_MICRO_BATCH_SECONDS = float(os.getenv("EMBEDDING_MICRO_BATCH_SECONDS", 2))
+# Retrieval of the agents and chat (videos/vector_store.py): "hybrid" fuses
+# vector and full-text (tsvector) results with reciprocal rank fusion,
+# "vector" is similarity search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each side, the RRF constant and the text search config
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 20))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", 60))
+RETRIEVAL_TEXT_SEARCH_CONFIG = os.getenv("RETRIEVAL_TEXT_SEARCH_CONFIG", "english")
+# Cross-video moment search (GET /api/search/): default and largest page
+# size, deepest hit that can be paged to, and snippet length in characters
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", 100))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 1000))
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", 240))
+# In-process cache of hot videos' chunk vectors (videos/vector_cache.py):
+# bytes it may hold per process, and seconds before an entry is reloaded
+# even if no embedding event invalidated it
+VECTOR_CACHE_ENABLED = os.getenv("VECTOR_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Serve full-text and hybrid retrieval from the cache too. Off by default:
+# the cache matches words by prefix, the database stems them and ranks with
+# the tsvector GIN index, so results differ from the database's
+VECTOR_CACHE_TEXT_SEARCH = os.getenv("VECTOR_CACHE_TEXT_SEARCH", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+VECTOR_CACHE_MAX_BYTES = int(os.getenv("VECTOR_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+VECTOR_CACHE_TTL_SECONDS = float(os.getenv("VECTOR_CACHE_TTL_SECONDS", 300))
+# Keep every computed document embedding in the database, keyed by text hash
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Bulk embedding (videos/bulk_embed.py, `manage.py embed_backlog`): documents
+# and estimated tokens per embeddings request, requests in flight, and the
+# account's tokens-per-minute limit (0 disables)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 2048))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", 250000))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 1000000))
+
+
+# Background jobs (videos/jobs.py, `manage.py run_workers`)
+# When true, analyze / embed / agent endpoints queue a job and answer 202 unless
+# the request passes background=false.
+
+RUN_JOBS_IN_BACKGROUND = os.getenv("RUN_JOBS_IN_BACKGROUND", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", 2))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", 2))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_BACKOFF_SECONDS = int(os.getenv("JOB_RETRY_BACKOFF_SECONDS", 30))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 600))
+# Longest a client stays subscribed to a video's server-sent events
+# (videos/events.py), it reconnects after that
+EVENT_STREAM_MAX_SECONDS = int(os.getenv("EVENT_STREAM_MAX_SECONDS", 3600))
+
+# Every detector in one pass (videos/specialised_agents/evaluate_all.py):
+# characters of chunk descriptions per LLM call, and the number of calls
+# above which a warning is logged (descriptions are never cut, longer videos
+# take more calls)
+EVALUATE_ALL_MAX_CONTEXT_CHARS = int(os.getenv("EVALUATE_ALL_MAX_CONTEXT_CHARS", 60000))
+EVALUATE_ALL_MAX_CALLS = int(os.getenv("EVALUATE_ALL_MAX_CALLS", 3))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -2,11 +2,12 @@ import os
 
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 
+from ..clients import get_chat_model
+from ..vector_store import collection_for, get_video_store
+
 system_message = """
 You are an intelligent AI assistant designed to interpret JSON data structures. The data includes fields such as 'start_time_seconds' and 'end_time_seconds' representing time frames in seconds. Provide accurate information based on these fields when queried about time frames or timestamps.
 You are an AI assistant specialized in providing detailed and accurate information about crime, fire, and robbery incidents. Your knowledge is supplemented by a comprehensive vector database containing relevant data. When responding to user inquiries, adhere to the following guidelines:
@@ -43,21 +44,16 @@ def create_chat_agent(video_id: int, thread_id: str):
     """Create a chat agent for a specific video"""
 
     # Initialize vector store
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    collection_name = f"video_id_{video_id}"
+    collection_name = collection_for(video_id)
 
     global chat_vector_store
 
-    chat_vector_store = PGVector(
-        embeddings=embeddings,
-        collection_name=collection_name,
-        connection=os.getenv("POSTGRES_CONNECTION"),
-    )
+    chat_vector_store = get_video_store(video_id)
 
     @tool(response_format="content_and_artifact")
     def retrieve(query: str):
         """Retrieve information related to a query."""
-        retrieved_docs = chat_vector_store.similarity_search(query, k=2)
+        retrieved_docs = chat_vector_store.search(query, k=2)
         print("Retrieved docs:", retrieved_docs)
         print("Retrieved from CHAT AGENT!")
         serialized = "\n\n".join(
@@ -67,7 +63,7 @@ def create_chat_agent(video_id: int, thread_id: str):
         return serialized, retrieved_docs
 
     # Initialize LLM and create agent
-    llm = ChatOpenAI(model="gpt-4o-mini")
+    llm = get_chat_model()
     memory = MemorySaver()
     agent_executor = create_react_agent(llm, [retrieve], checkpointer=memory)
 
@@ -0,0 +1,451 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .clients import get_analyzer
+from .dedup import deduplicate_chunks, duplicate_response
+from .embed import ChunkEmbedder, create_embedding
+from .events import (
+    ANALYSIS_DONE,
+    ANALYSIS_FAILED,
+    CHUNK_COMPLETED,
+    CHUNK_STARTED,
+    chunk_description,
+    publish,
+)
+from .media import is_local_source, local_path, segment_video
+from .metadata import ensure_metadata
+from .models import VideoChunk
+from .pipeline import Chunk, ChunkPipeline, ChunkSkipped
+from .prefilter import prefilter_chunks
+from .scenes import motion_profile, scene_intervals
+
+logger = logging.getLogger(__name__)
+
+MAX_CHUNK_DURATION = 30
+# First key of the two-int advisory locks held while a video is analyzed
+ANALYSIS_LOCK_NAMESPACE = 0x414E4C59  # "ANLY"
+
+# Videos being analyzed by this process, when the database isn't Postgres
+_analyzing = set()
+_analyzing_lock = threading.Lock()
+
+
+class AnalysisError(ValueError):
+    """Raised when a video cannot be analyzed because of its own data"""
+
+
+class AnalysisInProgress(Exception):
+    """Raised when another request or worker is already analyzing the video"""
+
+
+@contextmanager
+def video_analysis_lock(video_id):
+    """
+    Makes sure only one run analyzes a video at a time: two runs would plan,
+    delete and checkpoint the same chunks. On Postgres this is a session
+    advisory lock, so it holds across every web and worker process, other
+    databases only lock within the process.
+
+    Raises:
+        AnalysisInProgress: When the video is already being analyzed
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_try_advisory_lock(%s, %s)",
+                [ANALYSIS_LOCK_NAMESPACE, video_id],
+            )
+            locked = cursor.fetchone()[0]
+    else:
+        with _analyzing_lock:
+            locked = video_id not in _analyzing
+            _analyzing.add(video_id)
+    if not locked:
+        raise AnalysisInProgress(f"Video {video_id} is already being analyzed")
+
+    try:
+        yield
+    finally:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_unlock(%s, %s)",
+                    [ANALYSIS_LOCK_NAMESPACE, video_id],
+                )
+        else:
+            with _analyzing_lock:
+                _analyzing.discard(video_id)
+
+
+def build_chunk_url(original_url, start_sec, end_sec):
+    """
+    E.g. original_url:
+      https://res.cloudinary.com/.../upload/v1736265995/video_analyzer/ulbcownftehnh9f0ge48.mp4
+    Insert "so_{start_sec},eo_{end_sec}/" after "/upload/", e.g.:
+      https://res.cloudinary.com/.../upload/so_31,eo_60/v1736265995/...
+    """
+    # Insert transformation right after /upload/
+    return original_url.replace(
+        "/upload/", f"/upload/so_{int(start_sec)},eo_{int(end_sec)}/"
+    )
+
+
+def build_intervals(duration, max_chunk_duration=MAX_CHUNK_DURATION):
+    """Split [0, duration) into consecutive intervals of at most max_chunk_duration"""
+    start_time = 0
+    intervals = []
+
+    while start_time < duration:
+        end_time = min(start_time + max_chunk_duration, duration)
+        intervals.append((start_time, end_time))
+        start_time = end_time
+
+    return intervals
+
+
+def load_motion_profile(source):
+    """Motion scores of the video (see scenes.py), None if it can't be decoded"""
+    try:
+        return motion_profile(source)
+    except Exception as e:
+        logger.warning(f"Could not decode the video for motion analysis: {str(e)}")
+        return None
+
+
+def plan_intervals(duration, profile=None):
+    """
+    Chunk boundaries for a video. With CHUNK_BOUNDARY_MODE = "adaptive" they
+    follow scene changes and activity in its motion profile, falling back to
+    fixed MAX_CHUNK_DURATION intervals if the video couldn't be decoded.
+    """
+    fixed = build_intervals(duration)
+    if settings.CHUNK_BOUNDARY_MODE != "adaptive":
+        return fixed
+    if profile is None:
+        logger.warning("No motion profile for adaptive chunking, using fixed chunks")
+        return fixed
+    intervals = scene_intervals(profile, duration)
+    print(f"Adaptive chunking: {len(intervals)} chunks instead of {len(fixed)}")
+    return intervals
+
+
+def contiguous_runs(chunks):
+    """Chunks grouped into runs that follow each other without a gap"""
+    runs = []
+    for chunk in sorted(chunks, key=lambda c: c.start_time_seconds):
+        if runs and runs[-1][-1].end_time_seconds == chunk.start_time_seconds:
+            runs[-1].append(chunk)
+        else:
+            runs.append([chunk])
+    return runs
+
+
+def segment_chunks(source_path, chunks, work_dir, video_end):
+    """
+    Cut the segment of every chunk from the local copy of the video and set
+    its temp_file. Only these chunks are cut: on a resume the chunks already
+    analyzed are left out, each run of consecutive pending chunks is cut in
+    its own ffmpeg pass.
+
+    Args:
+        source_path (str): Local video file
+        chunks (list): Chunk objects to cut
+        work_dir (str): Directory the segments are written to
+        video_end (float): End of the video's last chunk
+    """
+    for number, run in enumerate(contiguous_runs(chunks)):
+        intervals = [(c.start_time_seconds, c.end_time_seconds) for c in run]
+        run_dir = os.path.join(work_dir, f"run_{number}")
+        os.makedirs(run_dir)
+        end = None if intervals[-1][1] >= video_end else intervals[-1][1]
+        segments = segment_video(source_path, intervals, run_dir, end=end)
+        if len(segments) != len(run):
+            raise Exception(
+                f"Expected {len(run)} segments but ffmpeg produced {len(segments)}"
+            )
+        for chunk, (segment_path, _, _) in zip(run, segments):
+            chunk.temp_file = segment_path
+
+
+def plan_chunks(video, source, profile=None):
+    """
+    Look up the video's duration (probed once, see metadata.py), choose its
+    intervals and create a pending VideoChunk for each of them.
+
+    Returns:
+        list: The created VideoChunk rows ordered by start_time_seconds
+    """
+    ensure_metadata(video, source)
+    duration = max(int(video.duration_seconds or 0), 0)
+    print(f"Video duration: {duration} seconds")
+    if duration == 0:
+        error_msg = "Could not retrieve video duration from Cloudinary."
+        logger.error(error_msg)
+        raise AnalysisError(error_msg)
+
+    intervals = plan_intervals(duration, profile)
+    return VideoChunk.objects.bulk_create(
+        VideoChunk(
+            video=video,
+            index=index,
+            start_time_seconds=start_sec,
+            end_time_seconds=end_sec,
+        )
+        for index, (start_sec, end_sec) in enumerate(intervals)
+    )
+
+
+def save_checkpoint(video, chunk, embedder=None):
+    """
+    Persist the outcome of a chunk as soon as it leaves the pipeline, and
+    hand successful ones to the incremental embedder if there is one
+    """
+    fields = {
+        "content_hash": chunk.content_hash,
+        "cached": chunk.cached,
+        "idle": chunk.idle,
+        "phash": chunk.phash,
+        "duplicate_of_id": chunk.duplicate_of,
+    }
+    if chunk.error is None:
+        fields.update(
+            status=VideoChunk.STATUS_SUCCEEDED, analysis=chunk.result, error=None
+        )
+    elif isinstance(chunk.error, ChunkSkipped):
+        fields.update(status=VideoChunk.STATUS_PENDING)
+    else:
+        fields.update(status=VideoChunk.STATUS_FAILED, error=str(chunk.error))
+    VideoChunk.objects.filter(video=video, index=chunk.index).update(**fields)
+    if embedder is not None and chunk.error is None:
+        embedder.add(chunk.as_result())
+    publish(
+        CHUNK_COMPLETED,
+        video.id,
+        index=chunk.index,
+        start_time_seconds=chunk.start_time_seconds,
+        end_time_seconds=chunk.end_time_seconds,
+        status=fields["status"],
+        description=chunk_description(chunk.result),
+        cached=chunk.cached,
+        idle=chunk.idle,
+        error=fields.get("error"),
+    )
+
+
+def publish_chunk_started(video, chunk):
+    publish(
+        CHUNK_STARTED,
+        video.id,
+        index=chunk.index,
+        start_time_seconds=chunk.start_time_seconds,
+        end_time_seconds=chunk.end_time_seconds,
+    )
+
+
+def analyze_video_chunks(video, progress=None, restart=False):
+    """
+    Splits the video into intervals (see plan_intervals), analyzes every
+    segment through the chunk pipeline, stores the results on the video and
+    creates its embedding.
+
+    Every chunk is checkpointed as a VideoChunk the moment it finishes. Calling
+    this again after a failure only processes the chunks that are missing or
+    failed, with the intervals planned by the first run, and then finalizes.
+
+    With CHUNK_SOURCE_MODE = "cloudinary" every interval is downloaded as its
+    own Cloudinary transformation (so_X,eo_Y). With "local" the source is
+    fetched once (or read in place when video_url is a local file) and cut into
+    segments with ffmpeg, which go straight to the upload stage.
+
+    Args:
+        video (Video): The video to analyze
+        progress (callable, optional): Called as progress(completed, total)
+            every time a chunk finishes
+        restart (bool): Drop the stored chunks and analyze from scratch
+
+    Returns:
+        list: The chunk results ordered by start_time_seconds
+
+    Raises:
+        AnalysisInProgress: When another run is analyzing the video
+    """
+    with video_analysis_lock(video.id):
+        return _analyze_video_chunks(video, progress, restart)
+
+
+def _analyze_video_chunks(video, progress, restart):
+    analyzer = get_analyzer()
+
+    secure_url = video.video_url
+    if not secure_url:
+        raise AnalysisError("No video URL found in the database.")
+
+    local_source = is_local_source(secure_url)
+    if not local_source:
+        match = re.search(r"/video/upload/(?:v\d+/)?(.+)\.\w+$", secure_url)
+        if not match:
+            error_msg = (
+                f"Could not parse public_id from URL: {secure_url}. "
+                "Make sure it's a valid Cloudinary video URL."
+            )
+            logger.error(error_msg)
+            raise AnalysisError(error_msg)
+
+        public_id = match.group(1)  # e.g. "folder_name/abcd1234"
+        print("public_id: ", public_id)
+
+    if restart:
+        video.chunks.all().delete()
+    stored = list(video.chunks.all())
+    pending = [c for c in stored if c.status != VideoChunk.STATUS_SUCCEEDED]
+    if stored:
+        print(f"Resuming video {video.id}: {len(pending)} of {len(stored)} chunks left")
+
+    segment_locally = local_source or settings.CHUNK_SOURCE_MODE == "local"
+    source_path = None
+    work_dir = None
+    embedder = None
+    try:
+        if settings.EMBEDDING_INCREMENTAL:
+            try:
+                embedder = ChunkEmbedder(video.id).start()
+            except Exception as e:
+                # Everything is still embedded once the analysis is done
+                logger.warning(f"Incremental embedding unavailable: {str(e)}")
+
+        def checkpoint(chunk):
+            save_checkpoint(video, chunk, embedder)
+
+        if segment_locally and (pending or not stored):
+            # Fetch the whole video once, every segment is cut from this copy
+            if local_source:
+                source_path = local_path(secure_url)
+            else:
+                source_path = analyzer.download_video(secure_url)
+            work_dir = tempfile.mkdtemp(prefix=f"video_{video.id}_")
+
+        # Decoded once at low resolution, for adaptive boundaries, the idle
+        # prefilter and deduplication
+        profile = None
+        if (not stored and settings.CHUNK_BOUNDARY_MODE == "adaptive") or (
+            (settings.PREFILTER_ENABLED or settings.DEDUP_ENABLED)
+            and (pending or not stored)
+        ):
+            profile = load_motion_profile(source_path or secure_url)
+
+        if not stored:
+            stored = plan_chunks(video, source_path or secure_url, profile)
+            pending = list(stored)
+
+        if pending:
+            # -------------------------------------------------------------
+            # Run the missing chunks through the staged
+            # download / upload / inference / delete pipeline
+            # -------------------------------------------------------------
+            chunks = [
+                Chunk(
+                    index=c.index,
+                    start_time_seconds=c.start_time_seconds,
+                    end_time_seconds=c.end_time_seconds,
+                    url=(
+                        None
+                        if local_source
+                        else build_chunk_url(
+                            secure_url, c.start_time_seconds, c.end_time_seconds
+                        )
+                    ),
+                )
+                for c in pending
+            ]
+
+            # Chunks without motion get a synthetic result instead of a VLM call
+            if settings.PREFILTER_ENABLED and profile is not None:
+                for chunk in prefilter_chunks(chunks, profile):
+                    checkpoint(chunk)
+                chunks = [c for c in chunks if not c.idle]
+
+            # Chunks that look like an analyzed segment reuse its analysis,
+            # duplicates of a chunk of this run wait for it to finish
+            deferred = {}
+            if settings.DEDUP_ENABLED and profile is not None:
+                resolved, deferred = deduplicate_chunks(video, chunks, profile)
+                for chunk in resolved:
+                    checkpoint(chunk)
+                waiting = {id(c) for dups in deferred.values() for c in dups}
+                chunks = [
+                    c for c in chunks if c.duplicate_of is None and id(c) not in waiting
+                ]
+
+            if segment_locally and chunks:
+                video_end = max(c.end_time_seconds for c in stored)
+                segment_chunks(source_path, chunks, work_dir, video_end)
+
+            VideoChunk.objects.filter(
+                video=video, index__in=[c.index for c in chunks]
+            ).update(
+                status=VideoChunk.STATUS_RUNNING, error=None, attempts=F("attempts") + 1
+            )
+            done_before = len(stored) - len(chunks)
+
+            def report(completed, total):
+                if progress:
+                    progress(done_before + completed, len(stored))
+
+            logger.info(f"Analyzing {len(chunks)} subclips of video {video.id}")
+            ChunkPipeline(analyzer).run(
+                chunks,
+                progress=report,
+                checkpoint=checkpoint,
+                on_start=lambda chunk: publish_chunk_started(video, chunk),
+            )
+
+            if deferred:
+                pks = dict(video.chunks.values_list("index", "pk"))
+                for original_index, duplicates in deferred.items():
+                    original = VideoChunk.objects.get(pk=pks[original_index])
+                    for chunk in duplicates:
+                        chunk.duplicate_of = original.pk
+                        chunk.result = duplicate_response(original)
+                        checkpoint(chunk)
+    except Exception as e:
+        publish(ANALYSIS_FAILED, video.id, error=str(e))
+        raise
+    finally:
+        if embedder is not None:
+            print(f"Embedded {embedder.close()} documents while analyzing")
+        if source_path and not local_source and os.path.exists(source_path):
+            os.unlink(source_path)
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Saving Analysis Results to the Video object
+    chunk_results = [c.as_result() for c in video.chunks.all()]
+    video.analysis_result = chunk_results
+    video.save()
+
+    # Embed whatever the incremental embedder didn't (chunks of earlier runs,
+    # failed batches) and drop stale documents
+    print("Creating embedding for video: ", video.id)
+    embedding_result = create_embedding(video.id, chunk_results)
+    if embedding_result == -1:
+        logger.warning(f"Failed to create embedding for video {video.id}")
+
+    print("Embedding for video created: ", video.id)
+    # Last event of the run: the collection is ready for the agents, and
+    # event streams close on it
+    publish(
+        ANALYSIS_DONE,
+        video.id,
+        chunk_count=len(chunk_results),
+        embedded=embedding_result != -1,
+    )
+    return chunk_results
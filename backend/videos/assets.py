@@ -0,0 +1,278 @@
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import NvcfAsset
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch is reserved for the collector that claimed it
+CLAIM_LEASE_SECONDS = 300
+
+
+def _is_not_found(error):
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code == 404
+
+
+class AssetCollector:
+    """
+    Tracks every asset uploaded to NVIDIA's storage and deletes them in the
+    background once released, so chunks don't wait on the delete round trip.
+
+    Assets are registered as active when their upload is authorized and marked
+    released when the chunk no longer needs them (whether inference succeeded
+    or not). A daemon thread started on the first release deletes released
+    assets in batches, retrying failures with exponential backoff up to
+    NVCF_ASSET_GC_MAX_ATTEMPTS. Batches are claimed with SKIP LOCKED so several
+    processes can collect at the same time.
+
+    On startup the collector also sweeps orphans: tracked assets still active
+    after NVCF_ASSET_ORPHAN_SECONDS (their process died before releasing
+    them). With NVCF_ASSET_SWEEP_UNTRACKED it also releases assets in
+    NVIDIA's storage that were never tracked, but only those whose
+    description starts with NVCF_ASSET_DESCRIPTION: other deployments may
+    share the API key.
+
+    Args:
+        delete_asset (callable): Deletes one asset by id, raises on failure
+        list_assets (callable, optional): Returns the assets in NVIDIA's
+            storage as dicts with assetId and description
+    """
+
+    def __init__(
+        self,
+        delete_asset,
+        list_assets=None,
+        batch_size=None,
+        interval=None,
+        max_attempts=None,
+        retry_backoff=None,
+        orphan_seconds=None,
+        sweep_untracked=None,
+        description=None,
+    ):
+        def setting(value, name):
+            return getattr(settings, name) if value is None else value
+
+        self.delete_asset = delete_asset
+        self.list_assets = list_assets
+        self.batch_size = setting(batch_size, "NVCF_ASSET_GC_BATCH_SIZE")
+        self.interval = setting(interval, "NVCF_ASSET_GC_INTERVAL_SECONDS")
+        self.max_attempts = setting(max_attempts, "NVCF_ASSET_GC_MAX_ATTEMPTS")
+        self.retry_backoff = setting(retry_backoff, "NVCF_ASSET_GC_BACKOFF_SECONDS")
+        self.orphan_seconds = setting(orphan_seconds, "NVCF_ASSET_ORPHAN_SECONDS")
+        self.sweep_untracked = setting(sweep_untracked, "NVCF_ASSET_SWEEP_UNTRACKED")
+        self.description = setting(description, "NVCF_ASSET_DESCRIPTION")
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # -------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------
+    def register(self, asset_id, description=""):
+        """Record a freshly authorized asset as active"""
+        NvcfAsset.objects.update_or_create(
+            asset_id=asset_id,
+            defaults={"description": description, "state": NvcfAsset.STATE_ACTIVE},
+        )
+
+    def release(self, asset_id):
+        """Mark an asset as no longer needed, it is deleted in the background"""
+        now = timezone.now()
+        updated = NvcfAsset.objects.filter(
+            asset_id=asset_id, state=NvcfAsset.STATE_ACTIVE
+        ).update(state=NvcfAsset.STATE_RELEASED, released_at=now, delete_after=now)
+        if not updated:
+            # Uploaded before tracking existed, or by another code path
+            NvcfAsset.objects.get_or_create(
+                asset_id=asset_id,
+                defaults={
+                    "state": NvcfAsset.STATE_RELEASED,
+                    "released_at": now,
+                    "delete_after": now,
+                },
+            )
+        self.start()
+        self._wake.set()
+
+    # -------------------------------------------------------------
+    # Collection
+    # -------------------------------------------------------------
+    def _claim_batch(self):
+        now = timezone.now()
+        with transaction.atomic():
+            assets = list(
+                NvcfAsset.objects.select_for_update(skip_locked=True)
+                .filter(state=NvcfAsset.STATE_RELEASED, delete_after__lte=now)
+                .order_by("delete_after", "id")[: self.batch_size]
+            )
+            if assets:
+                NvcfAsset.objects.filter(pk__in=[a.pk for a in assets]).update(
+                    attempts=F("attempts") + 1,
+                    delete_after=now + timedelta(seconds=CLAIM_LEASE_SECONDS),
+                )
+        for asset in assets:
+            asset.attempts += 1
+        return assets
+
+    def _delete(self, asset):
+        try:
+            self.delete_asset(asset.asset_id)
+        except Exception as e:
+            if not _is_not_found(e):
+                return self._retry_or_fail(asset, e)
+        NvcfAsset.objects.filter(pk=asset.pk).update(
+            state=NvcfAsset.STATE_DELETED, deleted_at=timezone.now(), last_error=None
+        )
+        return True
+
+    def _retry_or_fail(self, asset, error):
+        if asset.attempts >= self.max_attempts:
+            logger.error(
+                f"Giving up on deleting NVIDIA asset {asset.asset_id} after "
+                f"{asset.attempts} attempts: {str(error)}"
+            )
+            NvcfAsset.objects.filter(pk=asset.pk).update(
+                state=NvcfAsset.STATE_FAILED, last_error=str(error)
+            )
+        else:
+            delay = self.retry_backoff * 2 ** (asset.attempts - 1)
+            logger.warning(
+                f"Failed to delete NVIDIA asset {asset.asset_id}, retrying in "
+                f"{delay}s: {str(error)}"
+            )
+            NvcfAsset.objects.filter(pk=asset.pk).update(
+                last_error=str(error),
+                delete_after=timezone.now() + timedelta(seconds=delay),
+            )
+        return False
+
+    def collect(self):
+        """
+        Delete one batch of released assets.
+
+        Returns:
+            int: Number of assets claimed (deleted or rescheduled)
+        """
+        assets = self._claim_batch()
+        deleted = sum(1 for asset in assets if self._delete(asset))
+        if assets:
+            logger.info(f"Deleted {deleted} of {len(assets)} released NVIDIA assets")
+        return len(assets)
+
+    def collect_all(self):
+        """Delete released assets until none is due, returns the number claimed"""
+        total = 0
+        while True:
+            claimed = self.collect()
+            total += claimed
+            if claimed < self.batch_size:
+                return total
+
+    def sweep_orphans(self):
+        """
+        Release assets nobody is going to release anymore.
+
+        Returns:
+            int: Number of orphaned assets released
+        """
+        cutoff = timezone.now() - timedelta(seconds=self.orphan_seconds)
+        now = timezone.now()
+        swept = NvcfAsset.objects.filter(
+            state=NvcfAsset.STATE_ACTIVE, created_at__lt=cutoff
+        ).update(state=NvcfAsset.STATE_RELEASED, released_at=now, delete_after=now)
+
+        if self.sweep_untracked and self.list_assets is not None:
+            try:
+                remote = self.list_assets()
+            except Exception as e:
+                logger.warning(f"Could not list NVIDIA assets: {str(e)}")
+                remote = []
+            # Only assets this deployment uploaded, never the whole account's
+            remote_ids = {
+                uuid.UUID(asset["assetId"]): asset
+                for asset in remote
+                if (asset.get("description") or "").startswith(self.description)
+            }
+            known = set(
+                NvcfAsset.objects.filter(asset_id__in=list(remote_ids)).values_list(
+                    "asset_id", flat=True
+                )
+            )
+            # Untracked assets may belong to an upload that is being authorized
+            # right now, give it the orphan grace period before deleting them
+            untracked = [
+                NvcfAsset(
+                    asset_id=asset_id,
+                    description=(asset.get("description") or "")[:255],
+                    state=NvcfAsset.STATE_RELEASED,
+                    released_at=now,
+                    delete_after=now + timedelta(seconds=self.orphan_seconds),
+                )
+                for asset_id, asset in remote_ids.items()
+                if asset_id not in known
+            ]
+            NvcfAsset.objects.bulk_create(untracked, ignore_conflicts=True)
+            swept += len(untracked)
+
+        if swept:
+            logger.info(f"Released {swept} orphaned NVIDIA assets")
+        return swept
+
+    def stats(self):
+        """Number of tracked assets per state"""
+        counts = NvcfAsset.objects.values("state").annotate(count=Count("id"))
+        stats = {state: 0 for state, _ in NvcfAsset.STATE_CHOICES}
+        stats.update({row["state"]: row["count"] for row in counts})
+        return stats
+
+    # -------------------------------------------------------------
+    # Background thread
+    # -------------------------------------------------------------
+    def start(self):
+        """Start the background collector thread if it isn't running yet"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="nvcf-asset-collector", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            try:
+                self.sweep_orphans()
+            except Exception as e:
+                logger.error(f"NVIDIA asset orphan sweep failed: {str(e)}")
+
+            while not self._stop.is_set():
+                try:
+                    claimed = self.collect()
+                except Exception as e:
+                    logger.error(f"NVIDIA asset collection failed: {str(e)}")
+                    claimed = 0
+                if claimed < self.batch_size:
+                    # Nothing more due right now, don't hold a connection idle
+                    connection.close()
+                    self._wake.wait(self.interval)
+                    self._wake.clear()
+        finally:
+            connection.close()
@@ -0,0 +1,182 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+from .clients import get_embeddings, get_vector_store
+from .embed import chunk_documents, document_id
+from .events import EMBEDDING_DONE, publish
+from .models import Video
+from .scheduler import TokenBucket
+from .vector_store import collection_for, prepare_collection, stored_ids_by_video
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """Rough token count of an English text (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class BulkEmbedder:
+    """
+    Embeds the pending chunk documents of many videos at once.
+
+    Documents of every video are packed into batches as large as the
+    embeddings API takes (batch_size documents, batch_tokens estimated
+    tokens), up to `concurrency` batches are embedded at the same time, a
+    token bucket keeps the total under tokens_per_minute, and each batch is
+    written with one multi-row upsert per collection.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        batch_size=None,
+        batch_tokens=None,
+        concurrency=None,
+        tokens_per_minute=None,
+    ):
+        def setting(value, name):
+            return getattr(settings, name) if value is None else value
+
+        self.embeddings = embeddings or get_embeddings()
+        self.batch_size = setting(batch_size, "EMBEDDING_BATCH_SIZE")
+        self.batch_tokens = setting(batch_tokens, "EMBEDDING_BATCH_TOKENS")
+        self.concurrency = max(setting(concurrency, "EMBEDDING_CONCURRENCY"), 1)
+        tokens_per_minute = setting(tokens_per_minute, "EMBEDDING_TOKENS_PER_MINUTE")
+        self.bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+
+    def pending(self, videos):
+        """
+        Documents that are not in their video's collection yet, and ids of
+        stored documents that no longer match the video's analysis.
+
+        Returns:
+            tuple: ([(video_id, doc_id, document)], {video_id: stale ids})
+        """
+        documents = {}
+        for video_id, analysis_result in videos:
+            if analysis_result:
+                documents[video_id] = chunk_documents(video_id, analysis_result)
+                prepare_collection(video_id)
+
+        stored = stored_ids_by_video(list(documents))
+        pending = []
+        stale = {}
+        for video_id, video_documents in documents.items():
+            existing = stored[video_id]
+            ids = set()
+            for document in video_documents:
+                doc_id = document_id(document)
+                ids.add(doc_id)
+                if doc_id not in existing:
+                    pending.append((video_id, doc_id, document))
+            if existing - ids:
+                stale[video_id] = existing - ids
+        return pending, stale
+
+    def batches(self, pending):
+        """Group pending documents into batches within both size limits"""
+        batch = []
+        tokens = 0
+        for item in pending:
+            item_tokens = estimate_tokens(item[2].page_content)
+            if batch and (
+                len(batch) >= self.batch_size
+                or tokens + item_tokens > self.batch_tokens
+            ):
+                yield batch, tokens
+                batch = []
+                tokens = 0
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            yield batch, tokens
+
+    def _embed_batch(self, batch, tokens):
+        self.bucket.acquire(tokens)
+        vectors = self.embeddings.embed_documents(
+            [document.page_content for _, _, document in batch]
+        )
+
+        by_video = defaultdict(list)
+        for item, vector in zip(batch, vectors):
+            by_video[item[0]].append((item, vector))
+        for video_id, rows in by_video.items():
+            get_vector_store(collection_for(video_id)).add_embeddings(
+                texts=[document.page_content for (_, _, document), _ in rows],
+                embeddings=[vector for _, vector in rows],
+                metadatas=[document.metadata for (_, _, document), _ in rows],
+                ids=[doc_id for (_, doc_id, _), _ in rows],
+            )
+        return len(batch)
+
+    def run(self, videos):
+        """
+        Embed everything pending for the given videos.
+
+        Args:
+            videos (iterable): (video_id, analysis_result) pairs
+
+        Returns:
+            dict: videos, documents, embedded, removed, failed, seconds and
+            docs_per_second
+        """
+        started = time.monotonic()
+        videos = list(videos)
+        pending, stale = self.pending(videos)
+        print(
+            f"Embedding backlog: {len(pending)} documents of "
+            f"{len({item[0] for item in pending})} videos pending"
+        )
+
+        embedded = 0
+        failed = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(self._embed_batch, batch, tokens): batch
+                for batch, tokens in self.batches(pending)
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    embedded += future.result()
+                except Exception as e:
+                    logger.error(f"Embedding batch of {len(batch)} failed: {str(e)}")
+                    failed.update(item[0] for item in batch)
+                    continue
+                elapsed = time.monotonic() - started
+                print(
+                    f"Embedded {embedded}/{len(pending)} documents "
+                    f"({embedded / max(elapsed, 1e-6):.1f} docs/sec)"
+                )
+
+        removed = 0
+        for video_id, ids in stale.items():
+            get_vector_store(collection_for(video_id)).delete(ids=list(ids))
+            removed += len(ids)
+
+        for video_id in {item[0] for item in pending}:
+            publish(EMBEDDING_DONE, video_id, success=video_id not in failed)
+
+        seconds = time.monotonic() - started
+        return {
+            "videos": len(videos),
+            "documents": len(pending),
+            "embedded": embedded,
+            "removed": removed,
+            "failed": len(failed),
+            "seconds": round(seconds, 2),
+            "docs_per_second": round(embedded / max(seconds, 1e-6), 1),
+        }
+
+
+def backlog_videos(video_ids=None):
+    """(video_id, analysis_result) of the analyzed videos, oldest first"""
+    videos = Video.objects.filter(analysis_result__isnull=False).order_by("id")
+    if video_ids:
+        videos = videos.filter(id__in=video_ids)
+    return videos.values_list("id", "analysis_result").iterator()
@@ -0,0 +1,173 @@
+import logging
+import os
+import threading
+from functools import lru_cache
+
+import httpx
+import requests
+from django.conf import settings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_postgres import PGVector
+from requests.adapters import HTTPAdapter
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+
+# Everything below is created once per process and keeps its connections
+# alive, instead of a new TCP + TLS handshake (or SQLAlchemy engine) per call
+_lock = threading.Lock()
+_http_session = None
+_http2_client = None
+_openai_http_client = None
+_vector_engine = None
+_analyzer = None
+
+
+def _httpx_client(**kwargs):
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_POOL_MAXSIZE,
+        max_keepalive_connections=settings.HTTP_POOL_MAXSIZE,
+    )
+    if settings.HTTP2_ENABLED:
+        try:
+            return httpx.Client(http2=True, limits=limits, **kwargs)
+        except ImportError:
+            logger.warning("HTTP2_ENABLED is set but the h2 package is missing")
+    return httpx.Client(limits=limits, **kwargs)
+
+
+def get_http_session():
+    """
+    requests session with a keep-alive connection pool per host. Used for
+    Cloudinary downloads and presigned asset uploads.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            adapter = HTTPAdapter(
+                pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def get_api_client():
+    """
+    Client for the NVIDIA JSON APIs (inference, asset authorize and delete).
+
+    With HTTP2_ENABLED (and h2 installed) this is an httpx client that
+    multiplexes concurrent chunks over one connection per host, otherwise it is
+    the shared requests session. Both expose the same post/delete calls.
+    """
+    global _http2_client
+    if not settings.HTTP2_ENABLED:
+        return get_http_session()
+    with _lock:
+        if _http2_client is None:
+            # requests never times out by default, keep the same behaviour
+            _http2_client = _httpx_client(timeout=None)
+        return _http2_client
+
+
+def get_openai_http_client():
+    """httpx client shared by every LangChain OpenAI model"""
+    global _openai_http_client
+    with _lock:
+        if _openai_http_client is None:
+            _openai_http_client = _httpx_client()
+        return _openai_http_client
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(model=None):
+    """
+    Embeddings of the configured EMBEDDING_BACKEND: OpenAI (cached, and
+    truncated to EMBEDDING_DIMENSIONS if set) or the local hashing backend
+    """
+    from .embedding_backends import (
+        OPENAI_DIMENSIONS,
+        HashingEmbeddings,
+        TruncatedEmbeddings,
+    )
+    from .embedding_cache import CachedEmbeddings
+
+    dimensions = settings.EMBEDDING_DIMENSIONS
+    if settings.EMBEDDING_BACKEND == "hashing":
+        return HashingEmbeddings(dimensions or None)
+    if settings.EMBEDDING_BACKEND != "openai":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {settings.EMBEDDING_BACKEND}")
+
+    model = model or settings.EMBEDDING_MODEL
+    embeddings = OpenAIEmbeddings(
+        model=model,
+        http_client=get_openai_http_client(),
+        chunk_size=settings.EMBEDDING_BATCH_SIZE,
+    )
+    if settings.EMBEDDING_CACHE_ENABLED:
+        # Full vectors are cached, so every dimension can be served from them
+        embeddings = CachedEmbeddings(embeddings, model)
+    if dimensions and dimensions < OPENAI_DIMENSIONS.get(model, dimensions + 1):
+        embeddings = TruncatedEmbeddings(embeddings, dimensions)
+    return embeddings
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model="gpt-4o-mini", temperature=None):
+    kwargs = {"model": model, "http_client": get_openai_http_client()}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return ChatOpenAI(**kwargs)
+
+
+def get_vector_engine():
+    """SQLAlchemy engine (and connection pool) shared by every PGVector store"""
+    global _vector_engine
+    with _lock:
+        if _vector_engine is None:
+            _vector_engine = create_engine(
+                os.getenv("POSTGRES_CONNECTION"),
+                pool_size=settings.VECTOR_DB_POOL_SIZE,
+                max_overflow=settings.VECTOR_DB_MAX_OVERFLOW,
+                pool_pre_ping=True,
+            )
+        return _vector_engine
+
+
+@lru_cache(maxsize=256)
+def get_vector_store(collection_name):
+    """PGVector store for a collection, on the shared engine and embeddings"""
+    from .embedding_backends import embedding_signature
+
+    # New collections record which embeddings their vectors come from
+    return PGVector(
+        embeddings=get_embeddings(),
+        collection_name=collection_name,
+        collection_metadata=embedding_signature(),
+        connection=get_vector_engine(),
+    )
+
+
+def get_analyzer():
+    """The NvidiaAnalyzer shared by every request and pipeline of the process"""
+    global _analyzer
+    from .assets import AssetCollector
+    from .nvidia_analyzer import NvidiaAnalyzer
+    from .scheduler import InferenceScheduler
+    from .vlm_cache import get_response_cache
+
+    with _lock:
+        if _analyzer is None:
+            analyzer = NvidiaAnalyzer(
+                response_cache=get_response_cache(),
+                scheduler=InferenceScheduler(),
+            )
+            if settings.NVCF_ASSET_GC_ENABLED:
+                analyzer.asset_collector = AssetCollector(
+                    analyzer._delete_asset, list_assets=analyzer.list_assets
+                )
+            _analyzer = analyzer
+        return _analyzer
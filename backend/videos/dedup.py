@@ -0,0 +1,294 @@
+import logging
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .models import VideoChunk
+
+logger = logging.getLogger(__name__)
+
+# pHash keeps the 8x8 lowest frequencies of the frame's DCT: 64 bits
+HASH_SIZE = 8
+# Thumbnails are the mean gray level of a grid of cells (4x4 pixels of the
+# 64x36 decoded frames): coarse enough to ignore noise, fine enough that a
+# person a few pixels tall changes a cell
+THUMBNAIL_ROWS = 9
+THUMBNAIL_COLUMNS = 16
+THUMBNAIL_CELLS = THUMBNAIL_ROWS * THUMBNAIL_COLUMNS
+# Hex characters of one sampled frame in an encoded signature
+FRAME_CHARS = 16 + 2 * THUMBNAIL_CELLS
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, the first HASH_SIZE rows"""
+    k = np.arange(HASH_SIZE)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+def frame_hashes(frames):
+    """
+    64-bit perceptual hash (pHash) of every frame: the sign of each low
+    frequency DCT coefficient against their median. Small changes (noise,
+    compression, lighting flicker) flip few bits, a new scene flips many.
+
+    Args:
+        frames (numpy.ndarray): uint8 array of shape (frames, height, width)
+
+    Returns:
+        numpy.ndarray: uint64 array with one hash per frame
+    """
+    if not len(frames):
+        return np.zeros(0, dtype=np.uint64)
+    _, height, width = frames.shape
+    coefficients = np.einsum(
+        "ij,njk,lk->nil",
+        _dct_matrix(height),
+        frames.astype(np.float32),
+        _dct_matrix(width),
+    ).reshape(len(frames), -1)
+    # The DC term is only the brightness, keep it out of the median
+    median = np.median(coefficients[:, 1:], axis=1, keepdims=True)
+    bits = np.packbits(coefficients > median, axis=1)
+    return bits.view(">u8").ravel().astype(np.uint64)
+
+
+def frame_thumbnails(frames):
+    """
+    Mean gray level of every cell of a THUMBNAIL_ROWS x THUMBNAIL_COLUMNS grid
+    of every frame. pHash only keeps low frequencies, so a small object that
+    shows up barely changes it, the cell it lands in does.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (frames, THUMBNAIL_CELLS)
+    """
+    if not len(frames):
+        return np.zeros((0, THUMBNAIL_CELLS), dtype=np.uint8)
+    count, height, width = frames.shape
+    cell_height = height // THUMBNAIL_ROWS
+    cell_width = width // THUMBNAIL_COLUMNS
+    cropped = frames[
+        :, : cell_height * THUMBNAIL_ROWS, : cell_width * THUMBNAIL_COLUMNS
+    ].astype(np.float32)
+    cells = cropped.reshape(
+        count, THUMBNAIL_ROWS, cell_height, THUMBNAIL_COLUMNS, cell_width
+    ).mean(axis=(2, 4))
+    return cells.round().astype(np.uint8).reshape(count, THUMBNAIL_CELLS)
+
+
+def popcount(values):
+    """Number of set bits of every uint64, along a new last axis summed"""
+    return (
+        np.unpackbits(values.view(np.uint8), axis=-1)
+        .reshape(values.shape + (64,))
+        .sum(axis=-1)
+    )
+
+
+def segment_signature(profile, start_sec, end_sec, samples=None):
+    """
+    Hashes and thumbnails of `samples` frames spread evenly over a segment,
+    None when the segment has no decoded frames.
+
+    Returns:
+        tuple: (uint64 hashes of shape (samples,), uint8 thumbnails of shape
+        (samples, THUMBNAIL_CELLS))
+    """
+    samples = samples or settings.DEDUP_FRAMES_PER_SEGMENT
+    first = int(np.ceil(start_sec * profile.fps))
+    last = min(int(np.floor(end_sec * profile.fps)), len(profile.hashes))
+    if last <= first:
+        return None
+    positions = np.linspace(first, last - 1, samples).round().astype(int)
+    return profile.hashes[positions], profile.thumbnails[positions]
+
+
+def encode_signature(signature):
+    hashes, thumbnails = signature
+    return "".join(
+        f"{int(value):016x}{thumbnail.tobytes().hex()}"
+        for value, thumbnail in zip(hashes, thumbnails)
+    )
+
+
+def decode_signature(text):
+    """The signature encoded by encode_signature, None for other formats"""
+    if not text or len(text) % FRAME_CHARS:
+        return None
+    frames = [text[i : i + FRAME_CHARS] for i in range(0, len(text), FRAME_CHARS)]
+    hashes = np.array([int(frame[:16], 16) for frame in frames], dtype=np.uint64)
+    thumbnails = np.frombuffer(
+        bytes.fromhex("".join(frame[16:] for frame in frames)), dtype=np.uint8
+    ).reshape(len(frames), THUMBNAIL_CELLS)
+    return hashes, thumbnails
+
+
+class HammingIndex:
+    """
+    Segment signatures searchable by Hamming distance. Two segments match when
+    every pair of aligned sampled frames is within max_distance bits and no
+    cell of their thumbnails differs by more than max_cell_difference gray
+    levels, once the frames' overall brightness change is taken out. pHash
+    alone misses small objects (a person a few pixels tall flips about as
+    many bits as sensor noise), the thumbnails catch them.
+
+    Lookups are one vectorized XOR + popcount over all entries, then a
+    thumbnail comparison of the few candidates, which stays well under a
+    millisecond for the few thousand segments of a camera's recent history.
+    """
+
+    def __init__(self, samples, max_distance, max_cell_difference, entries=()):
+        self.max_distance = max_distance
+        self.max_cell_difference = max_cell_difference
+        entries = list(entries)
+        self.keys = [key for key, _ in entries]
+        # Arrays grow by doubling, rows past len(self.keys) are unused
+        capacity = max(len(entries), 16)
+        self.hashes = np.zeros((capacity, samples), dtype=np.uint64)
+        self.thumbnails = np.zeros((capacity, samples, THUMBNAIL_CELLS), dtype=np.uint8)
+        for row, (_, (hashes, thumbnails)) in enumerate(entries):
+            self.hashes[row] = hashes
+            self.thumbnails[row] = thumbnails
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, signature):
+        row = len(self.keys)
+        if row == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.zeros_like(self.hashes)])
+            self.thumbnails = np.concatenate(
+                [self.thumbnails, np.zeros_like(self.thumbnails)]
+            )
+        self.hashes[row], self.thumbnails[row] = signature
+        self.keys.append(key)
+
+    def cell_difference(self, rows, thumbnails):
+        """Largest cell change of each row, without overall brightness changes"""
+        difference = self.thumbnails[rows].astype(np.int16) - thumbnails.astype(
+            np.int16
+        )
+        difference -= np.median(difference, axis=2, keepdims=True).astype(np.int16)
+        return np.abs(difference).max(axis=(1, 2))
+
+    def nearest(self, signature):
+        """
+        Returns:
+            tuple or None: (key, distance) of the closest matching segment
+        """
+        if not self.keys:
+            return None
+        hashes, thumbnails = signature
+        count = len(self.keys)
+        distances = popcount(self.hashes[:count] ^ hashes[None, :]).max(axis=1)
+        candidates = np.flatnonzero(distances <= self.max_distance)
+        if not len(candidates):
+            return None
+        candidates = candidates[
+            self.cell_difference(candidates, thumbnails) <= self.max_cell_difference
+        ]
+        if not len(candidates):
+            return None
+        best = int(candidates[np.argmin(distances[candidates])])
+        return self.keys[best], int(distances[best])
+
+
+def _history(video, samples):
+    """Analyzed, non-duplicate chunks to match against, newest first"""
+    chunks = VideoChunk.objects.filter(
+        status=VideoChunk.STATUS_SUCCEEDED,
+        idle=False,
+        duplicate_of__isnull=True,
+        phash__isnull=False,
+    )
+    if settings.DEDUP_ACROSS_CAMERA and video.camera_id:
+        chunks = chunks.filter(video__camera_id=video.camera_id)
+    else:
+        chunks = chunks.filter(video=video)
+    chunks = chunks.order_by("-id").only("id", "phash")
+    for chunk in chunks[: settings.DEDUP_HISTORY_LIMIT]:
+        # Signatures of another format or sample count can't be compared
+        signature = decode_signature(chunk.phash)
+        if signature is not None and len(signature[0]) == samples:
+            yield chunk.pk, signature
+
+
+def deduplicate_chunks(video, chunks, profile):
+    """
+    Find chunks that look like an already analyzed segment, of this video or
+    (with DEDUP_ACROSS_CAMERA) of any video of the same camera, or like an
+    earlier chunk of this run.
+
+    Every chunk gets its signature (chunk.phash). Duplicates of an analyzed
+    segment get its analysis and chunk.duplicate_of right away, duplicates of
+    a chunk of this run are returned so they can be filled in once it is done.
+
+    Args:
+        video (Video): The video being analyzed
+        chunks (list): pipeline.Chunk objects in start time order
+        profile (MotionProfile): Motion scores and frame hashes of the video
+
+    Returns:
+        tuple: (chunks resolved from history, {original chunk index: [duplicate chunks]})
+    """
+    samples = settings.DEDUP_FRAMES_PER_SEGMENT
+    index = HammingIndex(
+        samples,
+        settings.DEDUP_MAX_DISTANCE,
+        settings.DEDUP_MAX_CELL_DIFFERENCE,
+        _history(video, samples),
+    )
+
+    # Keys are stored chunk ids (int) or chunks of this run (pipeline.Chunk)
+    matches = []
+    deferred = {}
+    for chunk in chunks:
+        signature = segment_signature(
+            profile, chunk.start_time_seconds, chunk.end_time_seconds, samples
+        )
+        if signature is None:
+            continue
+        chunk.phash = encode_signature(signature)
+        match = index.nearest(signature)
+        if match is None:
+            index.add(chunk, signature)
+            continue
+
+        original, distance = match
+        if isinstance(original, int):
+            matches.append((chunk, original))
+        else:
+            deferred.setdefault(original.index, []).append(chunk)
+        logger.info(
+            f"Chunk {chunk.start_time_seconds}-{chunk.end_time_seconds}s of video "
+            f"{video.id} duplicates an earlier segment ({distance} bits apart)"
+        )
+
+    originals = VideoChunk.objects.in_bulk([pk for _, pk in matches])
+    resolved = []
+    for chunk, pk in matches:
+        chunk.duplicate_of = pk
+        chunk.result = duplicate_response(originals[pk])
+        resolved.append(chunk)
+
+    duplicates = len(resolved) + sum(len(d) for d in deferred.values())
+    print(f"Dedup: {duplicates} of {len(chunks)} chunks reuse an earlier analysis")
+    return resolved, deferred
+
+
+def duplicate_response(original):
+    """
+    The original segment's analysis, marked with where it came from. The
+    duplicate keeps its own start and end times.
+    """
+    analysis = dict(original.analysis or {})
+    analysis["deduplicated_from"] = {
+        "video_id": original.video_id,
+        "start_time_seconds": original.start_time_seconds,
+        "end_time_seconds": original.end_time_seconds,
+    }
+    return analysis
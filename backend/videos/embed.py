@@ -1,80 +1,269 @@
-import json
-import os
+import logging
+import queue
+import threading
+import time
+import uuid
 from typing import List
 
-import psycopg2
+from django.conf import settings
 from django.db import connection
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from .clients import get_vector_store
+from .embedding_cache import text_hash
+from .events import EMBEDDING_DONE, EMBEDDING_PROGRESS, chunk_description, publish
+from .models import Video
+from .vector_store import collection_for, prepare_collection, stored_ids_by_video
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Descriptions longer than this (in characters) are split into several documents
+MAX_DOCUMENT_CHARS = 1000
+DOCUMENT_OVERLAP_CHARS = 200
+# Namespace of the deterministic (uuid5) document ids
+DOCUMENT_ID_NAMESPACE = uuid.UUID("6f1c1a4e-3b0d-4f57-9d0e-5a8c0b7e2d41")
+
+
+def chunk_documents(video_id: int, analysis_result) -> List[Document]:
+    """
+    One document per analyzed chunk, holding only the assistant's description
+    of the chunk. The response envelope (id, usage, finish_reason, ...) is
+    left out, the chunk's time range goes in the metadata.
+
+    Args:
+        video_id (int): The video the results belong to
+        analysis_result (list): Chunk results as stored on Video.analysis_result
 
-def create_embedding(video_id: int) -> int:
+    Returns:
+        list: Documents in chunk order, a description longer than
+        MAX_DOCUMENT_CHARS is split into several documents of the same chunk
+    """
+    if isinstance(analysis_result, dict):
+        analysis_result = [analysis_result]
+
+    documents = []
+    for result in analysis_result or []:
+        if not isinstance(result, dict):
+            continue
+        text = chunk_description(result.get("analysis"))
+        if not text or not text.strip():
+            continue
+        # Results stored before chunks were checkpointed use start_sec / end_sec
+        start = result.get("start_time_seconds", result.get("start_sec"))
+        end = result.get("end_time_seconds", result.get("end_sec"))
+        documents.append(
+            Document(
+                page_content=text.strip(),
+                metadata={
+                    "video_id": video_id,
+                    "start_time_seconds": start,
+                    "end_time_seconds": end,
+                },
+            )
+        )
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=MAX_DOCUMENT_CHARS, chunk_overlap=DOCUMENT_OVERLAP_CHARS
+    )
+    split = []
+    for document in documents:
+        if len(document.page_content) <= MAX_DOCUMENT_CHARS:
+            split.append(document)
+            continue
+        parts = text_splitter.split_documents([document])
+        for part, piece in enumerate(parts):
+            piece.metadata["part"] = part
+        split.extend(parts)
+    return split
+
+
+def document_id(document: Document) -> str:
+    """
+    Deterministic id of a chunk document: the same chunk range with the same
+    text always gets the same id, a changed description gets a new one.
+    """
+    metadata = document.metadata
+    key = (
+        f"{metadata['video_id']}:{metadata['start_time_seconds']}-"
+        f"{metadata['end_time_seconds']}:{metadata.get('part', 0)}:"
+        f"{text_hash(document.page_content)}"
+    )
+    return str(uuid.uuid5(DOCUMENT_ID_NAMESPACE, key))
+
+
+def create_embedding(video_id: int, analysis_result=None) -> int:
     """
     Create embeddings for a specific video's analysis results.
 
+    Idempotent: documents are upserted under deterministic ids, only chunks
+    whose text changed since the last call are embedded, and documents of
+    chunks that no longer exist are removed.
+
     Args:
         video_id (int): The ID of the video to create embeddings for
+        analysis_result (list, optional): The chunk results, read from the
+            video if not given
 
     Returns:
         int: 1 if successful, -1 if failed
     """
     try:
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-
-        # Connect to database
-        # db_connection = psycopg2.connect(os.getenv("POSTGRES_CONNECTION"))
-        # cursor = db_connection.cursor()
-        with connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT analysis_result FROM videos_video WHERE id = %s", (video_id,)
+        if analysis_result is None:
+            analysis_result = (
+                Video.objects.filter(id=video_id)
+                .values_list("analysis_result", flat=True)
+                .first()
             )
-            row = cursor.fetchone()
-
-        # Fetch specific video data
-        # cursor.execute(
-        #     "SELECT analysis_result FROM videos_video WHERE id = %s", (video_id,)
-        # )
-        # row = cursor.fetchone()
-
-        if not row or not row[0]:
+        if not analysis_result:
             return -1
 
-        # Convert JSONB data to Document
-        analysis_data = row[0]
-        content = (
-            json.dumps(analysis_data)
-            if isinstance(analysis_data, dict)
-            else str(analysis_data)
-        )
-        documents = [Document(page_content=content)]
+        documents = chunk_documents(video_id, analysis_result)
+        if not documents:
+            return -1
 
         # Initialize vector store
-        collection_name = f"video_id_{video_id}"
+        prepare_collection(video_id)
+        vector_store = get_vector_store(collection_for(video_id))
 
-        vector_store = PGVector(
-            embeddings=embeddings,
-            collection_name=collection_name,
-            connection=os.getenv("POSTGRES_CONNECTION"),
+        ids = [document_id(document) for document in documents]
+        existing = stored_ids_by_video([video_id])[video_id]
+        new = [
+            (doc_id, document)
+            for doc_id, document in zip(ids, documents)
+            if doc_id not in existing
+        ]
+        if new:
+            # Upsert, a concurrent call writing the same ids is harmless
+            vector_store.add_documents(
+                documents=[document for _, document in new],
+                ids=[doc_id for doc_id, _ in new],
+            )
+        stale = existing - set(ids)
+        if stale:
+            vector_store.delete(ids=list(stale))
+        print(
+            f"Embedding for video {video_id}: {len(new)} of {len(documents)} "
+            f"documents embedded, {len(stale)} removed"
         )
 
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
+        publish(
+            EMBEDDING_DONE,
+            video_id,
+            success=True,
+            documents=len(documents),
+            embedded=len(new),
         )
-        all_splits = text_splitter.split_documents(documents)
-
-        # Index chunks
-        vector_store.add_documents(documents=all_splits)
-
-        cursor.close()
-
         return 1
 
     except Exception as e:
         print(f"Error creating embedding: {str(e)}")
+        publish(EMBEDDING_DONE, video_id, success=False, error=str(e))
         return -1
+
+
+# Sentinel that stops a ChunkEmbedder's thread
+_STOP = object()
+
+
+class ChunkEmbedder:
+    """
+    Embeds a video's chunks while the analysis is still running. Chunk
+    results are added as they are checkpointed, a background thread embeds
+    them in micro-batches (batch_size documents, or whatever arrived within
+    max_delay seconds of the oldest one) and upserts them, so chat and the
+    agents can use the first part of a long video before the rest is done.
+
+    Documents that are already stored are skipped. Call close() to flush
+    what is left, create_embedding afterwards removes stale documents.
+    """
+
+    def __init__(self, video_id, batch_size=None, max_delay=None):
+        def setting(value, name):
+            return getattr(settings, name) if value is None else value
+
+        self.video_id = video_id
+        self.batch_size = max(setting(batch_size, "EMBEDDING_MICRO_BATCH_SIZE"), 1)
+        self.max_delay = setting(max_delay, "EMBEDDING_MICRO_BATCH_SECONDS")
+        self.queue = queue.Queue()
+        self.embedded = 0
+        self.errors = []
+        self.thread = None
+
+    def start(self):
+        prepare_collection(self.video_id)
+        self.vector_store = get_vector_store(collection_for(self.video_id))
+        self.stored = stored_ids_by_video([self.video_id])[self.video_id]
+        self.thread = threading.Thread(
+            target=self._run, name=f"chunk-embedder-{self.video_id}", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def add(self, result):
+        """Queue a chunk result (start_time_seconds, end_time_seconds, analysis)"""
+        self.queue.put(result)
+
+    def close(self):
+        """
+        Embed whatever is still queued and stop.
+
+        Returns:
+            int: Documents embedded since start()
+        """
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        return self.embedded
+
+    def _run(self):
+        pending = []
+        deadline = None
+        try:
+            while True:
+                timeout = None
+                if deadline is not None:
+                    timeout = max(deadline - time.monotonic(), 0)
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    break
+                if item is not None:
+                    for document in chunk_documents(self.video_id, [item]):
+                        doc_id = document_id(document)
+                        if doc_id not in self.stored:
+                            pending.append((doc_id, document))
+                    if pending and deadline is None:
+                        deadline = time.monotonic() + self.max_delay
+                if pending and (
+                    len(pending) >= self.batch_size or time.monotonic() >= deadline
+                ):
+                    self._flush(pending)
+                    pending = []
+                    deadline = None
+            if pending:
+                self._flush(pending)
+        finally:
+            # The embedding cache opens a database connection in this thread
+            connection.close()
+
+    def _flush(self, pending):
+        try:
+            self.vector_store.add_documents(
+                documents=[document for _, document in pending],
+                ids=[doc_id for doc_id, _ in pending],
+            )
+        except Exception as e:
+            # create_embedding retries whatever is missing at the end
+            logger.error(f"Embedding chunks of video {self.video_id} failed: {e}")
+            self.errors.append(e)
+            return
+        self.stored.update(doc_id for doc_id, _ in pending)
+        self.embedded += len(pending)
+        publish(EMBEDDING_PROGRESS, self.video_id, documents=self.embedded)
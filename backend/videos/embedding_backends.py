@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import re
+from collections import Counter
+from typing import List
+
+import numpy as np
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Native size of the OpenAI embedding models
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+# Vector size of the local backend when EMBEDDING_DIMENSIONS isn't set
+DEFAULT_HASHING_DIMENSIONS = 1024
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were which with there their they them then than into while "
+    "can could would should will also been being some any all".split()
+)
+
+
+class EmbeddingMismatchError(ValueError):
+    """A collection was embedded with another backend, model or dimension"""
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class TruncatedEmbeddings(Embeddings):
+    """
+    Matryoshka truncation: keeps the first `dimensions` values of every vector
+    and re-normalizes them. text-embedding-3 models are trained so their
+    prefixes are embeddings on their own, it is what the API's `dimensions`
+    parameter does server side. Truncating here instead lets the full vectors
+    in the embedding cache serve every dimension.
+    """
+
+    def __init__(self, embeddings, dimensions):
+        self.embeddings = embeddings
+        self.dimensions = dimensions
+
+    def _truncate(self, vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)[:, : self.dimensions]
+        return _normalize(matrix).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._truncate(self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._truncate([self.embeddings.embed_query(text)])[0]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline CPU embeddings: hashed bag of words and word bigrams with
+    sublinear term frequencies, stop words removed and signed feature hashing
+    so collisions cancel out instead of piling up.
+
+    There is no corpus-wide IDF on purpose, it would change every stored
+    vector whenever a video is added. Good enough for keyword-heavy retrieval
+    when the OpenAI API is unreachable, not a semantic model.
+    """
+
+    def __init__(self, dimensions=None):
+        self.dimensions = dimensions or DEFAULT_HASHING_DIMENSIONS
+
+    def _features(self, text):
+        words = [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOP_WORDS]
+        return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value >> 63 else -1.0
+            vector[value % self.dimensions] += sign * (1.0 + np.log(count))
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return _normalize(np.stack([self._embed(text) for text in texts])).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def embedding_signature(backend=None, model=None, dimensions=None):
+    """
+    What the configured embeddings produce, recorded on every collection so
+    vectors of different backends, models or sizes are never compared.
+
+    Returns:
+        dict: embedding_backend, embedding_model and embedding_dimensions
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    dimensions = dimensions or settings.EMBEDDING_DIMENSIONS or None
+    if backend == "hashing":
+        return {
+            "embedding_backend": backend,
+            "embedding_model": "hashing-tf",
+            "embedding_dimensions": dimensions or DEFAULT_HASHING_DIMENSIONS,
+        }
+    model = model or settings.EMBEDDING_MODEL
+    return {
+        "embedding_backend": backend,
+        "embedding_model": model,
+        "embedding_dimensions": dimensions or OPENAI_DIMENSIONS.get(model),
+    }
+
+
+# Collections created before signatures were recorded
+LEGACY_SIGNATURE = embedding_signature("openai", "text-embedding-3-large", 3072)
+
+
+def check_signature(collection_name, metadata):
+    """Raise EmbeddingMismatchError if a collection doesn't match the settings"""
+    stored = {
+        key: (metadata or {}).get(key, LEGACY_SIGNATURE[key])
+        for key in LEGACY_SIGNATURE
+    }
+    current = embedding_signature()
+    if stored != current:
+        raise EmbeddingMismatchError(
+            f"Collection {collection_name} holds {stored['embedding_backend']} "
+            f"{stored['embedding_model']} vectors of {stored['embedding_dimensions']} "
+            f"dimensions, the settings produce {current['embedding_backend']} "
+            f"{current['embedding_model']} vectors of "
+            f"{current['embedding_dimensions']} dimensions. Re-embed it."
+        )
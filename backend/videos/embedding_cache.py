@@ -0,0 +1,69 @@
+import hashlib
+import logging
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .models import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text):
+    """SHA-256 of a text, the key of its cached vector"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that look documents up in the EmbeddingCache table (by model
+    and text hash) before calling the wrapped embeddings, and store whatever
+    had to be computed. Identical texts, such as the same description of a
+    re-analyzed or deduplicated chunk, are only ever embedded once per model.
+
+    Queries are not cached, they are rarely repeated word for word.
+    """
+
+    def __init__(self, embeddings, model):
+        self.embeddings = embeddings
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = {
+            entry.text_hash: np.frombuffer(entry.vector, dtype=np.float32).tolist()
+            for entry in EmbeddingCache.objects.filter(
+                model=self.model, text_hash__in=set(hashes)
+            )
+        }
+
+        # Each missing text is embedded once, even if it appears several times
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            entries = []
+            for key, vector in zip(missing, vectors):
+                cached[key] = vector
+                entries.append(
+                    EmbeddingCache(
+                        model=self.model,
+                        text_hash=key,
+                        dimensions=len(vector),
+                        vector=np.asarray(vector, dtype=np.float32).tobytes(),
+                    )
+                )
+            # Another worker may have embedded the same text in the meantime
+            EmbeddingCache.objects.bulk_create(entries, ignore_conflicts=True)
+
+        logger.info(
+            f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} "
+            f"documents cached for {self.model}"
+        )
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
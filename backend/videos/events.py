@@ -0,0 +1,246 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel every progress event is sent on
+CHANNEL = "video_events"
+# NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD_BYTES = 7900
+# Event fields cut to fit in a NOTIFY payload
+TRUNCATABLE_FIELDS = ("description", "output")
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+# Events buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+CHUNK_STARTED = "chunk_started"
+CHUNK_COMPLETED = "chunk_completed"
+ANALYSIS_DONE = "analysis_done"
+ANALYSIS_FAILED = "analysis_failed"
+EMBEDDING_PROGRESS = "embedding_progress"
+EMBEDDING_DONE = "embedding_done"
+AGENT_DONE = "agent_done"
+# Events after which a video's stream has nothing left to report: analysis_done
+# is published once the final embedding is done, after embedding_done
+TERMINAL_EVENTS = (ANALYSIS_DONE, ANALYSIS_FAILED)
+
+
+def chunk_description(analysis):
+    """The assistant text of a VLM response, if there is one"""
+    try:
+        return analysis["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _encode(event):
+    payload = json.dumps(event, default=str)
+    if len(payload.encode("utf-8")) <= MAX_PAYLOAD_BYTES:
+        return payload
+    # Long texts are cut, the full text is stored on the chunk or the video
+    for field in TRUNCATABLE_FIELDS:
+        text = event["data"].get(field)
+        if not isinstance(text, str):
+            continue
+        overflow = len(payload.encode("utf-8")) - MAX_PAYLOAD_BYTES
+        event["data"][field] = text[: max(len(text) - overflow - 16, 0)]
+        event["data"]["truncated"] = True
+        payload = json.dumps(event, default=str)
+        if len(payload.encode("utf-8")) <= MAX_PAYLOAD_BYTES:
+            break
+    return payload
+
+
+def publish(event_type, video_id, **data):
+    """
+    Send a progress event for a video to every web process.
+
+    On Postgres the event goes through NOTIFY, so whichever process serves
+    the event stream receives it. Other databases only reach subscribers of
+    the current process. Failures are logged, never raised: progress events
+    must not break the work they report on.
+    """
+    event = {
+        "type": event_type,
+        "video_id": video_id,
+        "time": time.time(),
+        "data": data,
+    }
+    try:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, _encode(event)])
+        else:
+            hub.dispatch(event)
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} for video {video_id}: {e}")
+
+
+class Subscription:
+    def __init__(self, video_id):
+        self.video_id = video_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        if event.get("video_id") != self.video_id:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A stalled client shouldn't grow memory, drop its oldest event
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(event)
+
+
+class EventHub:
+    """
+    Fans the events of the shared NOTIFY channel out to the event streams of
+    this process, and to in-process callbacks (see add_listener). A single
+    listener thread with its own database connection is started on the first
+    subscription or callback and reconnects if it drops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._callbacks = []
+        self._listener = None
+
+    def _start_listener(self):
+        if connection.vendor == "postgresql" and (
+            self._listener is None or not self._listener.is_alive()
+        ):
+            self._listener = threading.Thread(
+                target=self._listen, name="video-events-listener", daemon=True
+            )
+            self._listener.start()
+
+    def subscribe(self, video_id):
+        subscription = Subscription(video_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            self._start_listener()
+        return subscription
+
+    def add_listener(self, callback):
+        """Call callback(event) with every event of every video"""
+        with self._lock:
+            self._callbacks.append(callback)
+            self._start_listener()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            callbacks = list(self._callbacks)
+        for subscription in subscriptions:
+            subscription.put(event)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning(f"Event listener {callback!r} failed: {e}")
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            listener = connections.create_connection("default")
+            try:
+                listener.ensure_connection()
+                with listener.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                backoff = 1
+                for payload in self._notifications(listener.connection):
+                    try:
+                        self.dispatch(json.loads(payload))
+                    except ValueError:
+                        logger.warning(f"Ignoring malformed event: {payload[:200]}")
+            except Exception as e:
+                logger.warning(f"Event listener lost its connection: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                listener.close()
+
+    @staticmethod
+    def _notifications(raw):
+        """Yield NOTIFY payloads from a psycopg (3) or psycopg2 connection"""
+        if hasattr(raw, "notifies") and callable(raw.notifies):
+            while True:
+                for notify in raw.notifies(timeout=KEEPALIVE_SECONDS):
+                    yield notify.payload
+        else:
+            while True:
+                select.select([raw], [], [], KEEPALIVE_SECONDS)
+                raw.poll()
+                while raw.notifies:
+                    yield raw.notifies.pop(0).payload
+
+
+hub = EventHub()
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def event_stream(video_id, snapshot=None, max_seconds=None):
+    """
+    Server-sent events for a video: the snapshot first (if any), then every
+    event published for the video, with keep-alive comments in between.
+
+    The stream ends after a terminal event (analysis_done or analysis_failed)
+    or after max_seconds (EVENT_STREAM_MAX_SECONDS), so abandoned streams
+    don't hold a worker thread forever. EventSource clients reconnect on
+    their own and get a fresh snapshot.
+    """
+    max_seconds = max_seconds or settings.EVENT_STREAM_MAX_SECONDS
+    deadline = time.monotonic() + max_seconds
+    subscription = hub.subscribe(video_id)
+    try:
+        if snapshot is not None:
+            yield format_sse(
+                {"type": "snapshot", "video_id": video_id, "data": snapshot}
+            )
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = subscription.queue.get(
+                    timeout=min(KEEPALIVE_SECONDS, remaining)
+                )
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+            if event.get("type") in TERMINAL_EVENTS:
+                return
+    finally:
+        hub.unsubscribe(subscription)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF accept `Accept: text/event-stream` on the event stream actions"""
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode("utf-8") if data is not None else b""
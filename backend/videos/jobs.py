@@ -0,0 +1,283 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .agents.summarize_agent import run_summarize_agent
+from .analysis import AnalysisError, analyze_video_chunks
+from .embed import create_embedding
+from .events import AGENT_DONE, publish
+from .models import Job, Video
+from .specialised_agents.assault_agent import run_assault_agent
+from .specialised_agents.commercial_agents.customer_behaviour_agent import (
+    run_customer_behaviour_agent,
+)
+from .specialised_agents.commercial_agents.suspicious_agent import run_suspicious_agent
+from .specialised_agents.commercial_agents.tamper_agent import run_tamper_agent
+from .specialised_agents.crime_agent import run_crime_agent
+from .specialised_agents.drug_agent import run_drug_agent
+from .specialised_agents.evaluate_all import run_evaluate_all
+from .specialised_agents.fire_agent import run_fire_agent
+from .specialised_agents.theft_agent import run_theft_agent
+
+logger = logging.getLogger(__name__)
+
+# Errors that will fail the same way on every attempt
+PERMANENT_ERRORS = (AnalysisError,)
+
+
+# -----------------------------------------------------------------------------
+# Queue operations
+# -----------------------------------------------------------------------------
+def enqueue(kind, video=None, payload=None, max_attempts=None):
+    """
+    Create a queued job, it is picked up by the next free worker. A video's
+    job of the same kind that is already queued or running is returned
+    instead of queueing the work twice.
+    """
+    with transaction.atomic():
+        if video is not None:
+            # Serializes concurrent enqueues for the video until the commit
+            Video.objects.select_for_update().filter(pk=video.pk).first()
+            active = (
+                Job.objects.filter(
+                    kind=kind,
+                    video=video,
+                    status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING],
+                )
+                .order_by("id")
+                .first()
+            )
+            if active is not None:
+                return active
+        return Job.objects.create(
+            kind=kind,
+            video=video,
+            payload=payload or {},
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        )
+
+
+def claim_next(worker, kinds=None):
+    """
+    Atomically claim the oldest runnable job.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so any number of workers, on any
+    number of machines, can poll the same table without handing out a job twice
+    or blocking on each other.
+
+    Returns:
+        Job or None: The claimed job, already marked as running
+    """
+    with transaction.atomic():
+        queryset = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.STATUS_QUEUED, run_after__lte=timezone.now()
+        )
+        if kinds:
+            queryset = queryset.filter(kind__in=kinds)
+        job = queryset.order_by("run_after", "id").first()
+        if job is None:
+            return None
+
+        now = timezone.now()
+        job.status = Job.STATUS_RUNNING
+        job.worker = worker
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.save(
+            update_fields=["status", "worker", "attempts", "started_at", "heartbeat_at"]
+        )
+        return job
+
+
+def report_progress(job, **progress):
+    """Store the job's progress, doubles as a heartbeat"""
+    job.progress = progress
+    Job.objects.filter(pk=job.pk).update(progress=progress, heartbeat_at=timezone.now())
+
+
+def heartbeat(job_ids):
+    """Mark jobs as still being worked on"""
+    if job_ids:
+        Job.objects.filter(pk__in=job_ids, status=Job.STATUS_RUNNING).update(
+            heartbeat_at=timezone.now()
+        )
+
+
+def requeue_stale_jobs():
+    """
+    Put jobs whose worker stopped sending heartbeats (crashed, killed, node
+    lost) back in the queue, or fail them when they are out of attempts.
+
+    Returns:
+        int: The number of jobs requeued or failed
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_SECONDS),
+    )
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.STATUS_FAILED,
+        error="Worker stopped responding",
+        finished_at=now,
+    )
+    requeued = stale.update(
+        status=Job.STATUS_QUEUED, worker=None, run_after=now, heartbeat_at=None
+    )
+    return failed + requeued
+
+
+def _finish(job, status, result=None, error=None):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "error", "finished_at"])
+
+
+def _retry_or_fail(job, error):
+    if isinstance(error, PERMANENT_ERRORS) or job.attempts >= job.max_attempts:
+        _finish(job, Job.STATUS_FAILED, error=str(error))
+        return
+
+    delay = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+    job.status = Job.STATUS_QUEUED
+    job.worker = None
+    job.error = str(error)
+    job.run_after = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=["status", "worker", "error", "run_after"])
+    logger.info(f"Job {job.id} will be retried in {delay}s")
+
+
+def run_job(job):
+    """Run a claimed job through its handler and record the outcome"""
+    handler = JOB_HANDLERS.get(job.kind)
+    print(f"Running {job.kind} job {job.id} (attempt {job.attempts})")
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        result = handler(job)
+    except Exception as e:
+        logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}", exc_info=True)
+        _retry_or_fail(job, e)
+        return job
+
+    _finish(job, Job.STATUS_SUCCEEDED, result=result)
+    print(f"Job {job.id} ({job.kind}) completed")
+    return job
+
+
+# -----------------------------------------------------------------------------
+# Handlers
+# -----------------------------------------------------------------------------
+def handle_analyze(job):
+    def progress(completed, total):
+        report_progress(job, completed_chunks=completed, total_chunks=total)
+
+    # Retries resume from the checkpointed chunks, only the first run restarts
+    restart = job.payload.get("restart", False) and job.attempts <= 1
+    chunk_results = analyze_video_chunks(job.video, progress=progress, restart=restart)
+    idle = job.video.chunks.filter(idle=True)
+    return {
+        "chunk_count": len(chunk_results),
+        "idle_chunks": idle.count(),
+        "idle_seconds": sum(
+            c.end_time_seconds - c.start_time_seconds
+            for c in idle.only("start_time_seconds", "end_time_seconds")
+        ),
+        "deduplicated_chunks": job.video.chunks.filter(
+            duplicate_of__isnull=False
+        ).count(),
+    }
+
+
+def handle_embed(job):
+    if create_embedding(job.video_id) == -1:
+        raise RuntimeError(f"Failed to create embedding for video {job.video_id}")
+    return {"status": "success"}
+
+
+# kind -> (runner, Video field the output is saved to, response key)
+AGENT_RUNNERS = {
+    Job.KIND_SUMMARIZE: (run_summarize_agent, "summary_result", "summary"),
+    Job.KIND_FIRE_AGENT: (run_fire_agent, "fire_evaluation", "fire_evaluation"),
+    Job.KIND_ASSAULT_AGENT: (
+        run_assault_agent,
+        "assault_evaluation",
+        "assault_evaluation",
+    ),
+    Job.KIND_CRIME_AGENT: (run_crime_agent, "crime_evaluation", "crime_evaluation"),
+    Job.KIND_DRUG_AGENT: (run_drug_agent, "drug_evaluation", "drug_evaluation"),
+    Job.KIND_THEFT_AGENT: (run_theft_agent, "theft_evaluation", "theft_evaluation"),
+    Job.KIND_TAMPER_AGENT: (
+        run_tamper_agent,
+        "tamper_evaluation",
+        "tamper_evaluation",
+    ),
+    Job.KIND_SUSPICIOUS_AGENT: (
+        run_suspicious_agent,
+        "suspicious_evaluation",
+        "suspicious_evaluation",
+    ),
+    Job.KIND_CUSTOMER_BEHAVIOUR_AGENT: (
+        run_customer_behaviour_agent,
+        "customer_behaviour",
+        "customer_behaviour",
+    ),
+}
+
+
+def save_agent_output(video, agent, output, **fields):
+    """
+    Saves an agent's results to the given Video fields and publishes
+    agent_done with its output to the video's event stream.
+
+    Args:
+        video (Video): The evaluated video
+        agent (str): Name of the agent, as reported in the event
+        output: What the agent returned
+        **fields: Video field -> value to save
+    """
+    for field, value in fields.items():
+        setattr(video, field, value)
+    video.save(update_fields=list(fields))
+    publish(AGENT_DONE, video.id, agent=agent, output=output)
+
+
+def handle_agent(job):
+    runner, field, key = AGENT_RUNNERS[job.kind]
+    video = job.video
+
+    print(f"Running {job.kind} for video: ", video.id)
+    output = runner(video.id)
+    save_agent_output(video, job.kind, output, **{field: {key: output}})
+
+    return {key: output}
+
+
+def handle_evaluate_all(job):
+    video = job.video
+
+    print("Running evaluate_all for video: ", video.id)
+    outputs = run_evaluate_all(video.id)
+    save_agent_output(
+        video,
+        job.kind,
+        outputs,
+        **{field: {field: output} for field, output in outputs.items()},
+    )
+
+    return outputs
+
+
+JOB_HANDLERS = {
+    Job.KIND_ANALYZE: handle_analyze,
+    Job.KIND_EMBED: handle_embed,
+    Job.KIND_EVALUATE_ALL: handle_evaluate_all,
+    **{kind: handle_agent for kind in AGENT_RUNNERS},
+}
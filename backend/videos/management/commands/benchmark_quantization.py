@@ -0,0 +1,133 @@
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sqlalchemy import text
+
+from videos.clients import get_vector_engine
+from videos.embedding_backends import embedding_signature
+from videos.management.commands.benchmark_retrieval import DEFAULT_TERMS, percentile
+from videos.vector_store import (
+    QUANTIZATIONS,
+    collection_uuid,
+    embed_search_query,
+    ensure_hnsw_index,
+    hnsw_index_name,
+    search_moments,
+    shared_mode,
+)
+
+
+def vector_bytes(quantization, dimensions):
+    """Bytes a vector takes in the column or index entries of a mode"""
+    if quantization == "binary":
+        return math.ceil(dimensions / 8) + 8
+    if quantization == "halfvec" or (quantization == "none" and dimensions > 2000):
+        return 2 * dimensions + 8
+    return 4 * dimensions + 8
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare candidate search on full, half precision and binary quantized "
+        "vectors of the shared collection: recall@k against an exact scan, "
+        "index size and query latency for each mode"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=10, help="Hits per query")
+        parser.add_argument(
+            "--terms", default=DEFAULT_TERMS, help="Comma-separated query terms"
+        )
+        parser.add_argument(
+            "--modes",
+            default="none,halfvec,binary",
+            help="Comma-separated quantization modes to compare",
+        )
+        parser.add_argument(
+            "--build",
+            action="store_true",
+            help="Create the HNSW index of every mode that doesn't have one",
+        )
+
+    def handle(self, *args, **options):
+        if not shared_mode():
+            raise CommandError(
+                "Quantized candidate search needs VECTOR_STORE_MODE=shared, "
+                "run migrate_vector_store first"
+            )
+        k = options["k"]
+        terms = [t.strip() for t in options["terms"].split(",") if t.strip()]
+        modes = [m.strip() for m in options["modes"].split(",") if m.strip()]
+        for mode in modes:
+            if mode not in QUANTIZATIONS or mode == "exact":
+                raise CommandError(f"Unknown quantization mode {mode!r}")
+
+        collection = collection_uuid(settings.VECTOR_SHARED_COLLECTION)
+        dimensions = embedding_signature()["embedding_dimensions"]
+        if options["build"]:
+            for mode in modes:
+                started = time.monotonic()
+                name = ensure_hnsw_index(mode)
+                self.stdout.write(
+                    f"Index ready: {name} ({time.monotonic() - started:.1f}s)"
+                )
+
+        queries = [embed_search_query(term) for term in terms]
+        stats = {mode: {"recall": [], "ms": []} for mode in ["exact"] + modes}
+        for embedding in queries:
+            started = time.perf_counter()
+            reference = search_moments(embedding, limit=k, quantization="exact")
+            stats["exact"]["ms"].append((time.perf_counter() - started) * 1000)
+            relevant = {hit["id"] for hit in reference}
+            if not relevant:
+                continue
+            stats["exact"]["recall"].append(1.0)
+            for mode in modes:
+                started = time.perf_counter()
+                hits = search_moments(embedding, limit=k, quantization=mode)
+                stats[mode]["ms"].append((time.perf_counter() - started) * 1000)
+                found = sum(1 for hit in hits if hit["id"] in relevant)
+                stats[mode]["recall"].append(found / len(relevant))
+
+        with get_vector_engine().connect() as db:
+            documents = db.execute(
+                text(
+                    "SELECT COUNT(*) FROM langchain_pg_embedding "
+                    "WHERE collection_id = :collection"
+                ),
+                {"collection": collection},
+            ).scalar()
+            table_bytes = db.execute(
+                text("SELECT pg_total_relation_size('langchain_pg_embedding')")
+            ).scalar()
+            index_bytes = {
+                mode: db.execute(
+                    text("SELECT pg_relation_size(to_regclass(:name))"),
+                    {"name": hnsw_index_name(collection, dimensions, mode)},
+                ).scalar()
+                for mode in modes
+            }
+
+        if not stats["exact"]["recall"]:
+            self.stdout.write("The shared collection has no documents")
+            return
+        self.stdout.write(
+            f"{len(stats['exact']['recall'])} queries, k={k}, {documents} documents "
+            f"of {dimensions} dimensions, table {table_bytes / 2**20:.1f} MiB"
+        )
+        for mode, values in stats.items():
+            if mode == "exact":
+                size = "no index"
+            elif index_bytes[mode] is None:
+                size = "no index (run with --build)"
+            else:
+                size = f"index {index_bytes[mode] / 2**20:.1f} MiB"
+            self.stdout.write(
+                f"{mode:>7}: recall@{k} {statistics.mean(values['recall']):.3f}  "
+                f"p50 {percentile(values['ms'], 50):.1f} ms  "
+                f"p95 {percentile(values['ms'], 95):.1f} ms  "
+                f"{vector_bytes(mode, dimensions)} B/vector  {size}"
+            )
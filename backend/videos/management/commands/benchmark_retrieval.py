@@ -0,0 +1,120 @@
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.clients import get_embeddings
+from videos.embed import chunk_documents, document_id
+from videos.models import Video
+from videos.vector_store import get_video_store
+
+DEFAULT_TERMS = (
+    "fire,smoke,knife,gun,weapon,license plate,car,fall,fight,running,"
+    "theft,bag,door,police,blood"
+)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare lexical-only, vector-only and hybrid retrieval on exact-term "
+        "queries: precision@k, recall@k and latency over the embedded videos. "
+        "The ground truth is lexical: a chunk is relevant to a term when its "
+        "description contains it. This favours full-text matching, so compare "
+        "hybrid against the lexical baseline, not only against vector search. "
+        "Semantic matches without the term count as misses. The database path "
+        "(tsvector and pgvector in Postgres) and the in-process vector cache "
+        "path are benchmarked separately, the cache is warmed before timing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--video", type=int, action="append", help="Only this video (repeatable)"
+        )
+        parser.add_argument(
+            "--limit", type=int, default=50, help="Most recent videos benchmarked"
+        )
+        parser.add_argument("--k", type=int, default=2, help="Documents retrieved")
+        parser.add_argument(
+            "--terms", default=DEFAULT_TERMS, help="Comma-separated query terms"
+        )
+        parser.add_argument(
+            "--paths",
+            default="database,cache",
+            help="Comma-separated retrieval paths to benchmark: database, cache",
+        )
+
+    def handle(self, *args, **options):
+        k = options["k"]
+        terms = [t.strip().lower() for t in options["terms"].split(",") if t.strip()]
+        videos = Video.objects.filter(analysis_result__isnull=False).order_by("-id")
+        if options["video"]:
+            videos = videos.filter(id__in=options["video"])
+        videos = videos.values_list("id", "analysis_result")[: options["limit"]]
+
+        embeddings = get_embeddings()
+        modes = {
+            "lexical": lambda store, term, vector: store.text_search(term, k),
+            "vector": lambda store, term, vector: store.similarity_search_by_vector(
+                vector, k
+            ),
+            "hybrid": lambda store, term, vector: store.hybrid_search(term, vector, k),
+        }
+        paths = [p.strip() for p in options["paths"].split(",") if p.strip()]
+        if not paths:
+            raise CommandError("--paths needs database, cache or both")
+        for path in paths:
+            if path not in ("database", "cache"):
+                raise CommandError(f"Unknown retrieval path {path!r}")
+        stats = {
+            (path, mode): {"precision": [], "recall": [], "ms": []}
+            for path in paths
+            for mode in modes
+        }
+
+        for video_id, analysis_result in videos:
+            documents = chunk_documents(video_id, analysis_result)
+            stores = {
+                path: get_video_store(video_id, cache=path == "cache") for path in paths
+            }
+            if "cache" in stores:
+                # Loading the video's vectors is not part of a query
+                stores["cache"]._cached()
+            for term in terms:
+                pattern = re.compile(rf"\b{re.escape(term)}")
+                relevant = {
+                    document_id(d)
+                    for d in documents
+                    if pattern.search(d.page_content.lower())
+                }
+                if not relevant:
+                    continue
+                vector = embeddings.embed_query(term)
+                for (path, mode), values in stats.items():
+                    started = time.perf_counter()
+                    retrieved = modes[mode](stores[path], term, vector)
+                    values["ms"].append((time.perf_counter() - started) * 1000)
+                    hits = sum(1 for d in retrieved if d.id in relevant)
+                    values["precision"].append(hits / k)
+                    values["recall"].append(hits / min(k, len(relevant)))
+
+        queries = len(next(iter(stats.values()))["ms"])
+        if not queries:
+            self.stdout.write("No embedded chunk mentions any of the terms")
+            return
+        self.stdout.write(f"{queries} queries, k={k}")
+        for (path, mode), values in stats.items():
+            self.stdout.write(
+                f"{path:>8} {mode:>7}: "
+                f"precision@{k} {statistics.mean(values['precision']):.3f}  "
+                f"recall@{k} {statistics.mean(values['recall']):.3f}  "
+                f"p50 {percentile(values['ms'], 50):.1f} ms  "
+                f"p95 {percentile(values['ms'], 95):.1f} ms"
+            )
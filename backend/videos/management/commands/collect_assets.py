@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from videos.assets import AssetCollector
+from videos.clients import get_analyzer
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete released NVIDIA assets, optionally after sweeping orphans, "
+        "and show how many assets are tracked per state"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sweep",
+            action="store_true",
+            help=(
+                "Release stale active assets (and this deployment's untracked "
+                "assets in NVIDIA's storage with NVCF_ASSET_SWEEP_UNTRACKED)"
+            ),
+        )
+        parser.add_argument(
+            "--stats", action="store_true", help="Only show the asset counts"
+        )
+
+    def handle(self, *args, **options):
+        analyzer = get_analyzer()
+        collector = AssetCollector(
+            analyzer._delete_asset, list_assets=analyzer.list_assets
+        )
+
+        if not options["stats"]:
+            if options["sweep"]:
+                self.stdout.write(f"Released {collector.sweep_orphans()} orphan(s)")
+            self.stdout.write(f"Processed {collector.collect_all()} asset(s)")
+
+        for state, count in collector.stats().items():
+            self.stdout.write(f"{state}: {count}")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from videos.bulk_embed import BulkEmbedder, backlog_videos
+
+
+class Command(BaseCommand):
+    help = (
+        "Embed the chunk documents of every analyzed video that are not in "
+        "pgvector yet, in large concurrent batches, and report the throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--video", type=int, action="append", help="Only this video (repeatable)"
+        )
+        parser.add_argument("--batch-size", type=int, help="Documents per request")
+        parser.add_argument("--concurrency", type=int, help="Requests in flight")
+        parser.add_argument(
+            "--tokens-per-minute", type=int, help="Token rate limit (0 disables)"
+        )
+
+    def handle(self, *args, **options):
+        embedder = BulkEmbedder(
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            tokens_per_minute=options["tokens_per_minute"],
+        )
+        stats = embedder.run(backlog_videos(options["video"]))
+
+        self.stdout.write(
+            f"Embedded {stats['embedded']} of {stats['documents']} pending documents "
+            f"from {stats['videos']} videos in {stats['seconds']}s "
+            f"({stats['docs_per_second']} docs/sec)"
+        )
+        self.stdout.write(
+            f"Removed {stats['removed']} stale documents, "
+            f"{stats['failed']} videos had failed batches"
+        )
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from videos.vector_store import ensure_indexes, migrate_to_shared
+
+
+class Command(BaseCommand):
+    help = (
+        "Move every per-video PGVector collection into the shared collection "
+        "and create its video_id, HNSW and full-text indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the collections that would be moved",
+        )
+        parser.add_argument(
+            "--indexes-only", action="store_true", help="Only create the indexes"
+        )
+
+    def handle(self, *args, **options):
+        if not options["indexes_only"]:
+            collections, documents = migrate_to_shared(dry_run=options["dry_run"])
+            verb = "Would move" if options["dry_run"] else "Moved"
+            self.stdout.write(
+                f"{verb} {documents} documents from {collections} collections "
+                f"into {settings.VECTOR_SHARED_COLLECTION}"
+            )
+        if not options["dry_run"]:
+            for name in ensure_indexes():
+                self.stdout.write(f"Index ready: {name}")
+
+        if settings.VECTOR_STORE_MODE != "shared":
+            self.stdout.write(
+                "Set VECTOR_STORE_MODE=shared to read and write the shared collection"
+            )
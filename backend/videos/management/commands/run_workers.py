@@ -0,0 +1,111 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from videos.clients import get_analyzer
+from videos.jobs import claim_next, heartbeat, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers for analysis, embedding and agent jobs. "
+        "Can be started on any number of nodes against the same database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOB_WORKER_CONCURRENCY,
+            help="Number of jobs this process runs at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.JOB_POLL_INTERVAL_SECONDS,
+            help="Seconds to wait before polling again when the queue is empty",
+        )
+        parser.add_argument(
+            "--kind",
+            action="append",
+            dest="kinds",
+            help="Only run jobs of this kind (can be repeated)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.current_jobs = {}
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Recovered {requeued} stale job(s)")
+
+        # Sweeps orphaned NVIDIA assets, then keeps deleting released ones
+        asset_collector = get_analyzer().asset_collector
+        if asset_collector is not None:
+            asset_collector.start()
+
+        threads = []
+        for n in range(max(options["concurrency"], 1)):
+            thread = threading.Thread(
+                target=self._work,
+                args=(f"{self.worker_prefix}:{n}", options),
+                name=f"job-worker-{n}",
+            )
+            thread.start()
+            threads.append(thread)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Started {len(threads)} worker(s) as {self.worker_prefix}"
+            )
+        )
+
+        # Keep the jobs this process holds alive and pick up the ones that
+        # crashed workers (here or on other nodes) left behind
+        next_heartbeat = time.monotonic() + settings.JOB_HEARTBEAT_SECONDS
+        while any(thread.is_alive() for thread in threads):
+            threads[0].join(timeout=1)
+            if time.monotonic() >= next_heartbeat:
+                heartbeat(list(self.current_jobs.values()))
+                requeue_stale_jobs()
+                next_heartbeat = time.monotonic() + settings.JOB_HEARTBEAT_SECONDS
+        connection.close()
+        self.stdout.write("Workers stopped")
+
+    def _request_stop(self, signum, frame):
+        self.stdout.write("Stopping after the jobs in progress finish...")
+        self.stop.set()
+
+    def _work(self, worker, options):
+        try:
+            while not self.stop.is_set():
+                job = claim_next(worker, kinds=options["kinds"])
+                if job is None:
+                    if options["once"]:
+                        return
+                    self.stop.wait(options["poll_interval"])
+                    continue
+
+                self.current_jobs[worker] = job.id
+                try:
+                    run_job(job)
+                finally:
+                    self.current_jobs.pop(worker, None)
+        finally:
+            connection.close()
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from videos.vlm_cache import VlmResponseCache
+
+
+class Command(BaseCommand):
+    help = "Show statistics of the VLM response cache, evict or clear it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--evict",
+            action="store_true",
+            help="Drop expired entries and shrink the cache to VLM_CACHE_MAX_BYTES",
+        )
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete every cached response"
+        )
+
+    def handle(self, *args, **options):
+        cache = VlmResponseCache()
+
+        if options["clear"]:
+            self.stdout.write(f"Deleted {cache.clear()} cached response(s)")
+        elif options["evict"]:
+            self.stdout.write(f"Evicted {cache.evict()} cached response(s)")
+
+        stats = cache.stats()
+        self.stdout.write(f"Entries: {stats['entries']}")
+        self.stdout.write(f"Size: {stats['total_bytes']} bytes")
+        self.stdout.write(f"Lifetime hits: {stats['lifetime_hits']}")
+        # Every stored entry was a miss once, evicted ones aren't counted
+        lookups = stats["lifetime_hits"] + stats["entries"]
+        if lookups:
+            self.stdout.write(
+                f"Hit rate: {stats['lifetime_hits'] / lookups:.1%} of "
+                f"{lookups} lookups of the stored entries"
+            )
@@ -0,0 +1,143 @@
+import csv
+import logging
+import os
+import subprocess
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def ffmpeg_executable():
+    """
+    Path to the ffmpeg binary: FFMPEG_BINARY from settings, else the one
+    bundled with imageio-ffmpeg (installed with moviepy), else ffmpeg on PATH.
+    """
+    binary = getattr(settings, "FFMPEG_BINARY", None)
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def is_local_source(url):
+    """Whether the video url points at a file on this machine"""
+    if url.startswith("file://"):
+        return True
+    return "://" not in url and os.path.exists(url)
+
+
+def local_path(url):
+    return url[len("file://") :] if url.startswith("file://") else url
+
+
+def _run_ffmpeg(args):
+    command = [ffmpeg_executable(), "-hide_banner", "-loglevel", "error", "-y"]
+    command += args
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed: {result.stderr.strip()}")
+
+
+def _read_segment_list(list_file, output_dir):
+    segments = []
+    with open(list_file, newline="") as file:
+        for row in csv.reader(file):
+            if not row:
+                continue
+            name, start, end = row[0], float(row[1]), float(row[2])
+            segments.append((os.path.join(output_dir, name), start, end))
+    return segments
+
+
+def _matches_intervals(segments, intervals, tolerance):
+    if len(segments) != len(intervals):
+        return False
+    # Only the cut points matter, the last segment always runs to the end
+    for (_, start, _), (interval_start, _) in zip(segments, intervals):
+        if abs(start - interval_start) > tolerance:
+            return False
+    return True
+
+
+def _shift(segments, offset):
+    return [(path, start + offset, stop + offset) for path, start, stop in segments]
+
+
+def segment_video(source_path, intervals, output_dir, tolerance=None, end=None):
+    """
+    Split a local video into one file per interval in a single ffmpeg pass.
+
+    Segments are first cut with stream copy, which is nearly free but can only
+    cut on keyframes. If the resulting boundaries drift from the requested
+    intervals by more than `tolerance` seconds (sparse keyframes, common on
+    CCTV encoders), the video is re-encoded once with keyframes forced at every
+    cut point so the boundaries are exact.
+
+    Intervals that don't start at 0 only read the video from their first
+    start, so a stretch of the video can be segmented on its own.
+
+    Args:
+        source_path (str): Local video file
+        intervals (list): Consecutive (start_sec, end_sec) tuples
+        output_dir (str): Directory the segment files are written to
+        tolerance (float, optional): Allowed boundary drift in seconds
+        end (float, optional): Stop reading at this time instead of the end of
+            the video
+
+    Returns:
+        list: (segment_path, start_sec, end_sec) tuples with the actual
+        boundaries of every segment
+    """
+    if tolerance is None:
+        tolerance = settings.CHUNK_SEGMENT_TOLERANCE_SECONDS
+
+    # Segment times are relative to where reading starts
+    offset = intervals[0][0]
+    relative = [(start - offset, stop - offset) for start, stop in intervals]
+    input_args = ["-ss", str(offset)] if offset else []
+    if end is not None:
+        input_args += ["-to", str(end)]
+    input_args += ["-i", source_path]
+
+    cut_points = ",".join(str(start) for start, _ in relative[1:])
+    list_file = os.path.join(output_dir, "segments.csv")
+    output_pattern = os.path.join(output_dir, "segment_%04d.mp4")
+    segment_args = ["-f", "segment", "-segment_list", list_file]
+    segment_args += ["-segment_list_type", "csv", "-reset_timestamps", "1"]
+    if cut_points:
+        segment_args += ["-segment_times", cut_points]
+
+    _run_ffmpeg(
+        input_args
+        + ["-map", "0:v:0", "-map", "0:a?", "-c", "copy"]
+        + segment_args
+        + [output_pattern]
+    )
+    segments = _read_segment_list(list_file, output_dir)
+    if _matches_intervals(segments, relative, tolerance):
+        return _shift(segments, offset)
+
+    logger.info(
+        f"Keyframes of {source_path} don't line up with the chunk boundaries, "
+        "re-encoding the segments"
+    )
+    for path, _, _ in segments:
+        os.unlink(path)
+
+    encode_args = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23"]
+    encode_args += ["-c:a", "aac"]
+    if cut_points:
+        encode_args += ["-force_key_frames", cut_points]
+    _run_ffmpeg(
+        input_args
+        + ["-map", "0:v:0", "-map", "0:a?"]
+        + encode_args
+        + segment_args
+        + [output_pattern]
+    )
+    return _shift(_read_segment_list(list_file, output_dir), offset)
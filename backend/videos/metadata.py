@@ -0,0 +1,244 @@
+import logging
+import re
+import struct
+import subprocess
+
+from .clients import get_http_session
+from .media import ffmpeg_executable, is_local_source, local_path
+
+logger = logging.getLogger(__name__)
+
+# A moov box bigger than this is not worth fetching, fall back to ffmpeg
+MAX_MOOV_SIZE = 16 * 1024 * 1024
+
+# Boxes that only contain other boxes on the path to what we need
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+METADATA_FIELDS = ("duration_seconds", "fps", "width", "height", "video_codec")
+
+
+class _HttpSource:
+    """Reads byte ranges of a remote file"""
+
+    def __init__(self, url):
+        self.url = url
+
+    def read(self, offset, size):
+        with get_http_session().get(
+            self.url,
+            headers={"Range": f"bytes={offset}-{offset + size - 1}"},
+            stream=True,
+            timeout=30,
+        ) as response:
+            response.raise_for_status()
+            if response.status_code != 206 and offset:
+                raise Exception(f"{self.url} doesn't support range requests")
+            # Never read past the requested bytes, even if the range was ignored
+            return response.raw.read(size)
+
+
+class _FileSource:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, offset, size):
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            return file.read(size)
+
+
+def _boxes(data, offset=0, end=None):
+    """Yield (type, payload start, box end) for the boxes in data[offset:end]"""
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[offset : offset + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[offset + 8 : offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _find_moov(source):
+    """Walk the top-level boxes with range reads until the moov box is found"""
+    offset = 0
+    while True:
+        head = source.read(offset, 16)
+        if len(head) < 8:
+            return None
+        size, box_type = struct.unpack(">I4s", head[:8])
+        if size == 1:
+            size = struct.unpack(">Q", head[8:16])[0]
+        elif size == 0:
+            size = None
+        if box_type == b"moov":
+            if size is None or size > MAX_MOOV_SIZE:
+                return None
+            return source.read(offset, size)
+        if not size or size < 8:
+            return None
+        # Skips mdat without reading it, moov is often at the end of the file
+        offset += size
+
+
+def _full_box(data, start):
+    """(version, payload start) of a full box"""
+    return data[start], start + 4
+
+
+def _parse_track(data, start, end):
+    track = {}
+    for box_type, payload, box_end in _boxes(data, start, end):
+        if box_type in CONTAINER_BOXES:
+            track.update(_parse_track(data, payload, box_end))
+        elif box_type == b"tkhd":
+            # Width and height are 16.16 fixed point, the last 8 bytes
+            width, height = struct.unpack(">II", data[box_end - 8 : box_end])
+            track["width"], track["height"] = width >> 16, height >> 16
+        elif box_type == b"mdhd":
+            version, pos = _full_box(data, payload)
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", data[pos + 16 : pos + 28])
+            else:
+                timescale, duration = struct.unpack(">II", data[pos + 8 : pos + 16])
+            track["timescale"], track["media_duration"] = timescale, duration
+        elif box_type == b"hdlr":
+            track["handler"] = data[payload + 8 : payload + 12]
+        elif box_type == b"stsd":
+            # First sample entry: size (4) + format (4)
+            track["codec"] = data[payload + 12 : payload + 16].decode("latin-1").strip()
+        elif box_type == b"stts":
+            _, pos = _full_box(data, payload)
+            (count,) = struct.unpack(">I", data[pos : pos + 4])
+            entries = struct.unpack(
+                f">{count * 2}I", data[pos + 4 : pos + 4 + count * 8]
+            )
+            track["samples"] = sum(entries[0::2])
+    return track
+
+
+def parse_moov(moov):
+    """
+    Duration, fps, resolution and codec from an MP4 moov box.
+
+    Returns:
+        dict: The METADATA_FIELDS that could be read
+    """
+    metadata = {}
+    for box_type, payload, box_end in _boxes(moov, 8):
+        if box_type == b"mvhd":
+            version, pos = _full_box(moov, payload)
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", moov[pos + 16 : pos + 28])
+            else:
+                timescale, duration = struct.unpack(">II", moov[pos + 8 : pos + 16])
+            if timescale:
+                metadata["duration_seconds"] = duration / timescale
+        elif box_type == b"trak":
+            track = _parse_track(moov, payload, box_end)
+            if track.get("handler") != b"vide" or "video_codec" in metadata:
+                continue
+            metadata["width"] = track.get("width")
+            metadata["height"] = track.get("height")
+            metadata["video_codec"] = track.get("codec")
+            if track.get("media_duration") and track.get("samples"):
+                seconds = track["media_duration"] / track["timescale"]
+                metadata["fps"] = round(track["samples"] / seconds, 3)
+    return metadata
+
+
+def _probe_ffmpeg(source):
+    """
+    Fallback for containers other than MP4: `ffmpeg -i` prints the stream
+    information and exits without decoding anything.
+    """
+    try:
+        result = subprocess.run(
+            [ffmpeg_executable(), "-hide_banner", "-i", source],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    except subprocess.TimeoutExpired:
+        # An unreachable or stalling URL, metadata is optional
+        logger.warning(f"ffmpeg timed out probing {source}")
+        return {}
+    output = result.stderr
+    metadata = {}
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    if match:
+        hours, minutes, seconds = match.groups()
+        metadata["duration_seconds"] = (
+            int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        )
+    match = re.search(r"Stream #.*?Video: (\w+).*?, (\d{2,5})x(\d{2,5})", output)
+    if match:
+        metadata["video_codec"] = match.group(1)
+        metadata["width"], metadata["height"] = int(match.group(2)), int(match.group(3))
+    match = re.search(r"Stream #.*?Video: .*?([\d.]+) (?:fps|tbr)", output)
+    if match:
+        metadata["fps"] = float(match.group(1))
+    return metadata
+
+
+def probe(url):
+    """
+    Read a video's metadata without decoding it. For MP4 only the moov box is
+    fetched (with HTTP range requests for remote files), anything else goes
+    through a short `ffmpeg -i`.
+
+    Args:
+        url (str): Remote URL or local path of the video
+
+    Returns:
+        dict: duration_seconds, fps, width, height and video_codec (the ones
+        that could be read)
+    """
+    source = _FileSource(local_path(url)) if is_local_source(url) else _HttpSource(url)
+    try:
+        moov = _find_moov(source)
+        if moov:
+            metadata = parse_moov(moov)
+            if metadata.get("duration_seconds"):
+                return metadata
+    except Exception as e:
+        logger.warning(f"Could not read the MP4 header of {url}: {str(e)}")
+    return _probe_ffmpeg(local_path(url) if is_local_source(url) else url)
+
+
+def metadata_from_upload_result(upload_result):
+    """The METADATA_FIELDS Cloudinary already reported for an uploaded video"""
+    video_info = upload_result.get("video") or {}
+    metadata = {
+        "duration_seconds": upload_result.get("duration"),
+        "fps": upload_result.get("frame_rate"),
+        "width": upload_result.get("width"),
+        "height": upload_result.get("height"),
+        "video_codec": video_info.get("codec"),
+    }
+    return {field: value for field, value in metadata.items() if value is not None}
+
+
+def ensure_metadata(video, source=None):
+    """
+    Probe and store the video's metadata unless it is already known.
+
+    Args:
+        video (Video): The video, updated in place
+        source (str, optional): Local copy to probe instead of video_url
+
+    Returns:
+        Video: The same video
+    """
+    if video.duration_seconds:
+        return video
+    metadata = probe(source or video.video_url)
+    for field, value in metadata.items():
+        setattr(video, field, value)
+    video.save(update_fields=list(metadata) or None)
+    return video
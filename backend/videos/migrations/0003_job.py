@@ -0,0 +1,90 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0002_video_assault_evaluation_video_crime_evaluation_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("analyze", "Analyze"),
+                            ("embed", "Embed"),
+                            ("summarize_agent", "Summarize agent"),
+                            ("fire_agent", "Fire agent"),
+                            ("assault_agent", "Assault agent"),
+                            ("crime_agent", "Crime agent"),
+                            ("drug_agent", "Drug agent"),
+                            ("theft_agent", "Theft agent"),
+                            ("tamper_agent", "Tamper agent"),
+                            ("suspicious_agent", "Suspicious agent"),
+                            ("customer_behaviour_agent", "Customer behaviour agent"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("progress", models.JSONField(blank=True, default=dict)),
+                ("result", models.JSONField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=3)),
+                ("worker", models.CharField(blank=True, max_length=200, null=True)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("heartbeat_at", models.DateTimeField(blank=True, null=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "video",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="videos.video",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_after"], name="videos_job_claim_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0003_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InferenceCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("content_hash", models.CharField(db_index=True, max_length=64)),
+                ("query", models.TextField()),
+                ("params", models.JSONField(default=dict)),
+                ("response", models.JSONField()),
+                ("size_bytes", models.PositiveIntegerField(default=0)),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_accessed_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+    ]
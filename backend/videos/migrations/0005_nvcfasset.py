@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0004_inferencecacheentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NvcfAsset",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("asset_id", models.UUIDField(unique=True)),
+                ("description", models.CharField(blank=True, max_length=255)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("released", "Released"),
+                            ("deleted", "Deleted"),
+                            ("failed", "Failed"),
+                        ],
+                        default="active",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, null=True)),
+                (
+                    "delete_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("released_at", models.DateTimeField(blank=True, null=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["state", "delete_after"], name="videos_asset_gc_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0005_nvcfasset"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveIntegerField()),
+                ("start_time_seconds", models.IntegerField()),
+                ("end_time_seconds", models.IntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("analysis", models.JSONField(blank=True, null=True)),
+                ("cached", models.BooleanField(default=False)),
+                (
+                    "content_hash",
+                    models.CharField(blank=True, max_length=64, null=True),
+                ),
+                ("error", models.TextField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="videos.video",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["video", "start_time_seconds"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("video", "index"), name="videos_chunk_unique_index"
+                    )
+                ],
+            },
+        ),
+    ]
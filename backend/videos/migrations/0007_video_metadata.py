@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0006_videochunk"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="duration_seconds",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="fps",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="height",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="video_codec",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="width",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
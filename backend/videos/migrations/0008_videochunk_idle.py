@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0007_video_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videochunk",
+            name="idle",
+            field=models.BooleanField(default=False),
+        ),
+    ]
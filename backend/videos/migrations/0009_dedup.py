@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0008_videochunk_idle"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="camera_id",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=100, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="videochunk",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicates",
+                to="videos.videochunk",
+            ),
+        ),
+        migrations.AddField(
+            model_name="videochunk",
+            name="phash",
+            field=models.CharField(blank=True, max_length=512, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0010_embeddingcache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="customer_behaviour",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="suspicious_evaluation",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="tamper_evaluation",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("analyze", "Analyze"),
+                    ("embed", "Embed"),
+                    ("summarize_agent", "Summarize agent"),
+                    ("fire_agent", "Fire agent"),
+                    ("assault_agent", "Assault agent"),
+                    ("crime_agent", "Crime agent"),
+                    ("drug_agent", "Drug agent"),
+                    ("theft_agent", "Theft agent"),
+                    ("tamper_agent", "Tamper agent"),
+                    ("suspicious_agent", "Suspicious agent"),
+                    ("customer_behaviour_agent", "Customer behaviour agent"),
+                    ("evaluate_all", "Evaluate all detectors"),
+                ],
+                max_length=50,
+            ),
+        ),
+    ]
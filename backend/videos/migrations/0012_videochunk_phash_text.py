@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0011_evaluate_all"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="videochunk",
+            name="phash",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
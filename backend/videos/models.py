@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Video(models.Model):
@@ -12,7 +13,233 @@ class Video(models.Model):
     crime_evaluation = models.JSONField(null=True, blank=True)
     drug_evaluation = models.JSONField(null=True, blank=True)
     theft_evaluation = models.JSONField(null=True, blank=True)
+    tamper_evaluation = models.JSONField(null=True, blank=True)
+    suspicious_evaluation = models.JSONField(null=True, blank=True)
+    customer_behaviour = models.JSONField(null=True, blank=True)
+    # Media metadata, probed once (see metadata.py)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    fps = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    video_codec = models.CharField(max_length=50, null=True, blank=True)
+    # Videos of the same camera can reuse each other's analyses (see dedup.py)
+    camera_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.title
+
+
+class VideoChunk(models.Model):
+    """
+    One analyzed interval of a video. Saved as soon as its chunk finishes, so a
+    failed or interrupted analysis resumes with only the missing chunks.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+    start_time_seconds = models.IntegerField()
+    end_time_seconds = models.IntegerField()
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    analysis = models.JSONField(null=True, blank=True)
+    cached = models.BooleanField(default=False)
+    # No motion found by the prefilter, analysis is synthetic (see prefilter.py)
+    idle = models.BooleanField(default=False)
+    # Perceptual hashes and thumbnails of the segment's sampled frames, and
+    # the analyzed segment whose analysis was reused because it looked the same
+    phash = models.TextField(null=True, blank=True)
+    duplicate_of = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        related_name="duplicates",
+        null=True,
+        blank=True,
+    )
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["video", "start_time_seconds"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["video", "index"], name="videos_chunk_unique_index"
+            ),
+        ]
+
+    def as_result(self):
+        return {
+            "start_time_seconds": self.start_time_seconds,
+            "end_time_seconds": self.end_time_seconds,
+            "analysis": self.analysis,
+        }
+
+    def __str__(self):
+        return f"{self.video_id}:{self.start_time_seconds}-{self.end_time_seconds}s ({self.status})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work (analysis, embedding or an agent run) picked up
+    by `manage.py run_workers`.
+    """
+
+    KIND_ANALYZE = "analyze"
+    KIND_EMBED = "embed"
+    KIND_SUMMARIZE = "summarize_agent"
+    KIND_FIRE_AGENT = "fire_agent"
+    KIND_ASSAULT_AGENT = "assault_agent"
+    KIND_CRIME_AGENT = "crime_agent"
+    KIND_DRUG_AGENT = "drug_agent"
+    KIND_THEFT_AGENT = "theft_agent"
+    KIND_TAMPER_AGENT = "tamper_agent"
+    KIND_SUSPICIOUS_AGENT = "suspicious_agent"
+    KIND_CUSTOMER_BEHAVIOUR_AGENT = "customer_behaviour_agent"
+    KIND_EVALUATE_ALL = "evaluate_all"
+    KIND_CHOICES = [
+        (KIND_ANALYZE, "Analyze"),
+        (KIND_EMBED, "Embed"),
+        (KIND_SUMMARIZE, "Summarize agent"),
+        (KIND_FIRE_AGENT, "Fire agent"),
+        (KIND_ASSAULT_AGENT, "Assault agent"),
+        (KIND_CRIME_AGENT, "Crime agent"),
+        (KIND_DRUG_AGENT, "Drug agent"),
+        (KIND_THEFT_AGENT, "Theft agent"),
+        (KIND_TAMPER_AGENT, "Tamper agent"),
+        (KIND_SUSPICIOUS_AGENT, "Suspicious agent"),
+        (KIND_CUSTOMER_BEHAVIOUR_AGENT, "Customer behaviour agent"),
+        (KIND_EVALUATE_ALL, "Evaluate all detectors"),
+    ]
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name="jobs", null=True, blank=True
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    worker = models.CharField(max_length=200, null=True, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="videos_job_claim_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class InferenceCacheEntry(models.Model):
+    """
+    A stored NVIDIA VLM response, keyed by the hash of the clip bytes and the
+    inference parameters it was produced with (see vlm_cache.py).
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    query = models.TextField()
+    params = models.JSONField(default=dict)
+    response = models.JSONField()
+    size_bytes = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.hits} hits)"
+
+
+class NvcfAsset(models.Model):
+    """
+    An asset uploaded to NVIDIA's storage (NVCF), tracked from upload until the
+    asset collector has deleted it (see assets.py).
+    """
+
+    STATE_ACTIVE = "active"
+    STATE_RELEASED = "released"
+    STATE_DELETED = "deleted"
+    STATE_FAILED = "failed"
+    STATE_CHOICES = [
+        (STATE_ACTIVE, "Active"),
+        (STATE_RELEASED, "Released"),
+        (STATE_DELETED, "Deleted"),
+        (STATE_FAILED, "Failed"),
+    ]
+
+    asset_id = models.UUIDField(unique=True)
+    description = models.CharField(max_length=255, blank=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=STATE_ACTIVE)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    delete_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "delete_after"], name="videos_asset_gc_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.asset_id} ({self.state})"
+
+
+class EmbeddingCache(models.Model):
+    """
+    A computed embedding, keyed by model and SHA-256 of the text, so unchanged
+    texts are never sent to the embeddings API twice (see embedding_cache.py).
+    """
+
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    dimensions = models.PositiveIntegerField()
+    # float32 values
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "text_hash"], name="videos_embedding_cache_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.model}:{self.text_hash[:12]} ({self.dimensions})"
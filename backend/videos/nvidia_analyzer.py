@@ -1,24 +1,84 @@
+import hashlib
 import logging
 import os
 import tempfile
-import urllib.request
 import uuid
 
-import requests
+from django.conf import settings
 from dotenv import load_dotenv
 
+from .clients import get_api_client, get_http_session
+from .scheduler import RateLimitedError, TransientError, parse_retry_after
+
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 
+# Size of the blocks videos are read, hashed and written in
+TRANSFER_BLOCK_SIZE = int(os.getenv("TRANSFER_BLOCK_SIZE", 1024 * 1024))
+
+
+def file_digest(path):
+    """sha256 hex digest of a file, read in TRANSFER_BLOCK_SIZE blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(TRANSFER_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashingReader:
+    """
+    File-like wrapper that hashes whatever is read through it. Exposes the
+    expected length so requests sends a Content-Length instead of chunking.
+    """
+
+    def __init__(self, source, length):
+        self.source = source
+        self.length = length
+        self.digest = hashlib.sha256()
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = TRANSFER_BLOCK_SIZE
+        block = self.source.read(min(size, TRANSFER_BLOCK_SIZE))
+        self.digest.update(block)
+        return block
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
 class NvidiaAnalyzer:
-    def __init__(self):
+    def __init__(self, response_cache=None, scheduler=None, asset_collector=None):
         self.invoke_url = "https://ai.api.nvidia.com/v1/vlm/nvidia/cosmos-nemotron-34b"
         self.api_key = os.getenv("TEST_NVCF_API_KEY")
         if not self.api_key:
             raise ValueError("NVIDIA API key not found in environment variables")
         self.nvcf_asset_url = "https://api.nvcf.nvidia.com/v2/nvcf/assets"
+        # Fixed seed and low temperature: the same clip and query give the same
+        # answer, which is what makes cached responses a valid substitute
+        self.inference_params = {
+            "max_tokens": 8192,
+            "temperature": 0.2,
+            "top_p": 0.7,
+            "seed": 50,
+            "num_frames_per_inference": 8,
+            "model": "nvidia/vila",
+        }
+        # Optional store of previous responses, see vlm_cache.VlmResponseCache
+        self.response_cache = response_cache
+        # Optional rate limiter / retrier for inference, see scheduler.py
+        self.scheduler = scheduler
+        # Optional background deletion of assets, see assets.AssetCollector
+        self.asset_collector = asset_collector
         self.supported_formats = {
             "mp4": ["video/mp4", "video"],
             "png": ["image/png", "img"],
@@ -26,24 +86,39 @@ class NvidiaAnalyzer:
             "jpeg": ["image/jpeg", "img"],
         }
 
-    def download_video(self, url):
-        """Download video from Cloudinary URL to temporary file"""
+    def _open_source(self, url):
+        """Open a streaming response for the video url"""
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
+        }
+        response = get_http_session().get(
+            url, headers=headers, stream=True, timeout=(30, 300)
+        )
+        response.raise_for_status()
+        return response
+
+    def download_to_file(self, url):
+        """
+        Download video from Cloudinary URL to a temporary file, in fixed-size
+        blocks so memory use doesn't depend on the video size.
+
+        Returns:
+            tuple: (temp file path, sha256 hex digest of the content)
+        """
+        temp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+        temp.close()
         try:
-            temp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
             logger.info(f"Downloading video from {url} to {temp.name}")
 
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-            }
-
-            # Download the file
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req) as response:
+            digest = hashlib.sha256()
+            with self._open_source(url) as response:
                 with open(temp.name, "wb") as out_file:
-                    out_file.write(response.read())
+                    for block in response.iter_content(TRANSFER_BLOCK_SIZE):
+                        digest.update(block)
+                        out_file.write(block)
 
             logger.info("Video downloaded successfully")
-            return temp.name
+            return temp.name, digest.hexdigest()
 
         except Exception as e:
             logger.error(f"Error downloading video: {str(e)}")
@@ -51,106 +126,221 @@ class NvidiaAnalyzer:
                 os.unlink(temp.name)
             raise Exception(f"Failed to download video: {str(e)}")
 
+    def download_video(self, url):
+        """Download video from Cloudinary URL to temporary file"""
+        return self.download_to_file(url)[0]
+
+    def _authorize_upload(self, description):
+        """Request a presigned upload URL for a new asset"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "accept": "application/json",
+        }
+        authorize = get_api_client().post(
+            self.nvcf_asset_url,
+            headers=headers,
+            json={"contentType": "video/mp4", "description": description},
+            timeout=30,
+        )
+        authorize.raise_for_status()
+        authorize_res = authorize.json()
+        if self.asset_collector is not None:
+            self.asset_collector.register(authorize_res["assetId"], description)
+        return authorize_res
+
+    def _put_asset(self, upload_url, data, description):
+        """PUT the asset body (a file-like object with a known length)"""
+        response = get_http_session().put(
+            upload_url,
+            data=data,
+            headers={
+                "x-amz-meta-nvcf-asset-description": description,
+                "content-type": "video/mp4",
+            },
+            timeout=300,
+        )
+        response.raise_for_status()
+
     def _upload_asset(self, media_file, description):
         """Upload asset to NVIDIA's storage"""
+        authorize_res = None
         try:
             logger.info(f"Uploading file {media_file} to NVIDIA storage")
 
+            authorize_res = self._authorize_upload(description)
+
+            # The file object is read in blocks while it is sent
             with open(media_file, "rb") as data_input:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "accept": "application/json",
-                }
-
-                # Request upload URL
-                authorize = requests.post(
-                    self.nvcf_asset_url,
-                    headers=headers,
-                    json={"contentType": "video/mp4", "description": description},
-                    timeout=30,
-                )
-                authorize.raise_for_status()
-                authorize_res = authorize.json()
-
-                # Upload to provided URL
-                with open(media_file, "rb") as data_input:
-                    response = requests.put(
-                        authorize_res["uploadUrl"],
-                        data=data_input,
-                        headers={
-                            "x-amz-meta-nvcf-asset-description": description,
-                            "content-type": "video/mp4",
-                        },
-                        timeout=300,
-                    )
-                response.raise_for_status()
-
-                logger.info("File uploaded successfully to NVIDIA storage")
-                return uuid.UUID(authorize_res["assetId"])
+                self._put_asset(authorize_res["uploadUrl"], data_input, description)
+
+            logger.info("File uploaded successfully to NVIDIA storage")
+            return uuid.UUID(authorize_res["assetId"])
 
         except Exception as e:
             logger.error(f"Error uploading to NVIDIA storage: {str(e)}")
+            if authorize_res is not None:
+                self.release_asset(authorize_res["assetId"])
             raise
 
+    def stream_to_asset(self, url, description):
+        """
+        Pipe a video straight from its URL into NVIDIA's storage without
+        writing it to disk. Only TRANSFER_BLOCK_SIZE bytes are held at a time.
+
+        The presigned PUT needs a Content-Length, so sources that don't
+        advertise one (or send a compressed body) fall back to a download into a temporary file.
+
+        Returns:
+            tuple: (asset id, sha256 hex digest of the content)
+        """
+        with self._open_source(url) as response:
+            length = response.headers.get("Content-Length")
+            encoding = response.headers.get("Content-Encoding", "identity")
+            if length is None or encoding != "identity":
+                logger.info(f"No usable Content-Length for {url}, buffering to disk")
+                response.close()
+                temp_file, content_hash = self.download_to_file(url)
+                try:
+                    return self._upload_asset(temp_file, description), content_hash
+                finally:
+                    os.unlink(temp_file)
+
+            authorize_res = None
+            try:
+                logger.info(f"Streaming {url} to NVIDIA storage")
+                authorize_res = self._authorize_upload(description)
+                body = HashingReader(response.raw, int(length))
+                self._put_asset(authorize_res["uploadUrl"], body, description)
+            except Exception as e:
+                logger.error(f"Error streaming to NVIDIA storage: {str(e)}")
+                if authorize_res is not None:
+                    self.release_asset(authorize_res["assetId"])
+                raise
+
+        logger.info("File streamed successfully to NVIDIA storage")
+        return uuid.UUID(authorize_res["assetId"]), body.hexdigest()
+
     def _delete_asset(self, asset_id):
         """Delete asset from NVIDIA's storage"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
         }
         assert_url = f"{self.nvcf_asset_url}/{asset_id}"
-        response = requests.delete(assert_url, headers=headers, timeout=30)
+        response = get_api_client().delete(assert_url, headers=headers, timeout=30)
+        response.raise_for_status()
+
+    def release_asset(self, asset_id):
+        """
+        Give up an asset once its chunk is done with it. With an asset collector
+        the delete happens in the background, otherwise right away.
+        """
+        if self.asset_collector is None:
+            self._delete_asset(asset_id)
+        else:
+            self.asset_collector.release(asset_id)
+
+    def list_assets(self):
+        """Every asset currently in NVIDIA's storage for this API key"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "accept": "application/json",
+        }
+        response = get_api_client().get(
+            self.nvcf_asset_url, headers=headers, timeout=30
+        )
         response.raise_for_status()
+        return response.json().get("assets", [])
+
+    def _run_inference(self, asset_id, query="Describe the scene"):
+        """Run the VLM against an already uploaded asset and return the JSON response"""
+        if self.scheduler is None:
+            return self._post_inference(asset_id, query)
+        return self.scheduler.call(self._post_inference, asset_id, query)
+
+    def _post_inference(self, asset_id, query):
+        """
+        One inference request. 429 and 5xx responses are raised as
+        RateLimitedError / TransientError so the scheduler can retry them.
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "NVCF-INPUT-ASSET-REFERENCES": str(asset_id),
+            "NVCF-FUNCTION-ASSET-IDS": str(asset_id),
+            "Accept": "application/json",
+        }
+
+        messages = [
+            {
+                "role": "user",
+                "content": f'{query} <video src="data:video/mp4;asset_id,{asset_id}" />',
+            }
+        ]
+
+        payload = {
+            **self.inference_params,
+            "messages": messages,
+            "stream": False,
+        }
+
+        response = get_api_client().post(
+            self.invoke_url,
+            headers=headers,
+            json=payload,
+            timeout=settings.NVIDIA_INFERENCE_TIMEOUT_SECONDS,
+        )
+        if response.status_code == 429:
+            raise RateLimitedError(
+                "Inference rate limited (429)",
+                retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            )
+        if response.status_code >= 500:
+            raise TransientError(f"Inference failed with {response.status_code}")
+        return response.json()
+
+    def cached_response(self, content_hash, query="Describe the scene"):
+        """Previous response for the same content and parameters, if any"""
+        if self.response_cache is None or not content_hash:
+            return None
+        return self.response_cache.lookup(content_hash, query, self.inference_params)
+
+    def store_response(self, content_hash, query, response):
+        """Remember a response for content_hash, see cached_response()"""
+        if self.response_cache is not None and content_hash:
+            self.response_cache.store(
+                content_hash, query, self.inference_params, response
+            )
 
     def analyze_video(self, video_url, query="Describe the scene"):
         """Main method to analyze video using NVIDIA API"""
         try:
             # Download video from Cloudinary
-            temp_file = self.download_video(video_url)
+            temp_file, content_hash = self.download_to_file(video_url)
 
-            # Upload to NVIDIA
-            asset_id = self._upload_asset(temp_file, "Video analysis")
-
-            # Prepare API call
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "NVCF-INPUT-ASSET-REFERENCES": str(asset_id),
-                "NVCF-FUNCTION-ASSET-IDS": str(asset_id),
-                "Accept": "application/json",
-            }
-
-            messages = [
-                {
-                    "role": "user",
-                    "content": f'{query} <video src="data:video/mp4;asset_id,{asset_id}" />',
-                }
-            ]
-
-            payload = {
-                "max_tokens": 8192,
-                "temperature": 0.2,
-                "top_p": 0.7,
-                "seed": 50,
-                "num_frames_per_inference": 8,
-                "messages": messages,
-                "stream": False,
-                "model": "nvidia/vila",
-            }
+            # Same bytes analyzed before with the same parameters
+            result = self.cached_response(content_hash, query)
+            if result is not None:
+                os.unlink(temp_file)
+                return result
 
-            # Make API call
-            response = requests.post(self.invoke_url, headers=headers, json=payload)
-
-            # Clean up
-            self._delete_asset(asset_id)
+            # Upload to NVIDIA
+            asset_id = self._upload_asset(temp_file, settings.NVCF_ASSET_DESCRIPTION)
             os.unlink(temp_file)  # Delete temporary file
 
-            return response.json()
+            # Make API call, the asset is released even if it fails
+            try:
+                result = self._run_inference(asset_id, query)
+            finally:
+                self.release_asset(asset_id)
+            self.store_response(content_hash, query, result)
+
+            return result
 
         except Exception as e:
             raise Exception(f"Error analyzing video: {str(e)}")
 
 
 # Usage in views.py:
-# analyzer = NvidiaAnalyzer()
+# analyzer = get_analyzer()  # shared instance, see clients.py
 # result = analyzer.analyze_video(video_url)
@@ -0,0 +1,294 @@
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from .nvidia_analyzer import file_digest
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("download", "upload", "inference", "delete")
+
+DEFAULT_CONCURRENCY = {
+    "download": 4,
+    "upload": 4,
+    "inference": 2,
+    "delete": 2,
+}
+
+# Sentinel pushed into a stage queue to stop one of its workers
+_STOP = object()
+
+
+class ChunkSkipped(Exception):
+    """Raised for chunks that are dropped because an earlier one failed"""
+
+
+@dataclass
+class Chunk:
+    """
+    A single interval of a video travelling through the pipeline. Chunks that
+    already have a local temp_file (segmented locally) skip the download stage.
+    """
+
+    index: int
+    start_time_seconds: int
+    end_time_seconds: int
+    url: Optional[str] = None
+    temp_file: Optional[str] = None
+    asset_id: Any = None
+    content_hash: Optional[str] = None
+    result: Any = None
+    cached: bool = False
+    idle: bool = False
+    started: bool = False
+    phash: Optional[str] = None
+    duplicate_of: Optional[int] = None
+    error: Optional[Exception] = None
+
+    def as_result(self):
+        return {
+            "start_time_seconds": self.start_time_seconds,
+            "end_time_seconds": self.end_time_seconds,
+            "analysis": self.result,
+        }
+
+
+class ChunkPipeline:
+    """
+    Runs chunks through download -> upload -> inference -> delete, with every
+    stage served by its own bounded worker pool and a queue in front of it.
+
+    While one chunk is being inferred the next ones are already downloading and
+    uploading, so the total time approaches the throughput of the slowest stage
+    instead of the sum of every chunk's round trips.
+    """
+
+    def __init__(self, analyzer, query="Describe the scene", concurrency=None):
+        self.analyzer = analyzer
+        self.query = query
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        self.concurrency.update(getattr(settings, "CHUNK_PIPELINE_CONCURRENCY", {}))
+        self.concurrency.update(concurrency or {})
+        # A streamed chunk is only hashed once it is uploaded, too late for a
+        # cache hit to save the upload: with a response cache, chunks are
+        # downloaded, hashed and looked up first
+        self.stream_uploads = getattr(settings, "CHUNK_STREAM_UPLOADS", False) and (
+            getattr(analyzer, "response_cache", None) is None
+        )
+
+        # Queues between stages are bounded by the consumer's pool size so only
+        # a handful of downloaded files / uploaded assets exist at any time.
+        self.queues = {
+            stage: queue.Queue(maxsize=max(self.concurrency[stage], 1) * 2)
+            for stage in STAGES
+        }
+        self.done = queue.Queue()
+        self.failed = threading.Event()
+        self.errors = []
+        self.threads = []
+        self.on_start = None
+
+    # -------------------------------------------------------------
+    # Stage implementations
+    # -------------------------------------------------------------
+    def _download(self, chunk):
+        if self.failed.is_set():
+            # Another chunk already failed, don't pay for any new work
+            raise ChunkSkipped("Skipped because an earlier chunk failed")
+        print(
+            f"Downloading subclip number: {chunk.index + 1} : "
+            f"{chunk.start_time_seconds}-{chunk.end_time_seconds}s"
+        )
+        if self.stream_uploads:
+            # Pipe the download straight into the asset upload, no temp file
+            chunk.asset_id, chunk.content_hash = self.analyzer.stream_to_asset(
+                chunk.url, settings.NVCF_ASSET_DESCRIPTION
+            )
+            return "inference"
+
+        chunk.temp_file, chunk.content_hash = self.analyzer.download_to_file(chunk.url)
+        if self._use_cached(chunk):
+            return None
+        return "upload"
+
+    def _upload(self, chunk):
+        if self.failed.is_set():
+            raise ChunkSkipped("Skipped because an earlier chunk failed")
+        if chunk.content_hash is None:
+            # Locally cut segment, never went through the download stage
+            chunk.content_hash = file_digest(chunk.temp_file)
+            if self._use_cached(chunk):
+                return None
+        try:
+            chunk.asset_id = self.analyzer._upload_asset(
+                chunk.temp_file, settings.NVCF_ASSET_DESCRIPTION
+            )
+        finally:
+            self._remove_temp_file(chunk)
+        return "inference"
+
+    def _inference(self, chunk):
+        print(f"Analyzing subclip number: {chunk.index + 1}")
+        chunk.result = self.analyzer._run_inference(chunk.asset_id, self.query)
+        self.analyzer.store_response(chunk.content_hash, self.query, chunk.result)
+        return "delete"
+
+    def _delete(self, chunk):
+        try:
+            # Only marks the asset as released when the asset collector runs
+            self.analyzer.release_asset(chunk.asset_id)
+        except Exception as e:
+            # The analysis itself succeeded, a leftover asset is not fatal
+            logger.warning(f"Failed to delete NVIDIA asset {chunk.asset_id}: {e}")
+        return None
+
+    def _use_cached(self, chunk):
+        """Take the chunk's result from the VLM response cache if it's there"""
+        result = self.analyzer.cached_response(chunk.content_hash, self.query)
+        if result is None:
+            return False
+        print(f"Subclip number {chunk.index + 1} served from the VLM cache")
+        chunk.result = result
+        chunk.cached = True
+        self._remove_temp_file(chunk)
+        return True
+
+    def _remove_temp_file(self, chunk):
+        if chunk.temp_file and os.path.exists(chunk.temp_file):
+            os.unlink(chunk.temp_file)
+        chunk.temp_file = None
+
+    # -------------------------------------------------------------
+    # Plumbing
+    # -------------------------------------------------------------
+    def _worker(self, stage):
+        try:
+            self._work(stage)
+        finally:
+            # Cache lookups open a database connection per thread
+            connection.close()
+
+    def _work(self, stage):
+        handler = getattr(self, f"_{stage}")
+        stage_queue = self.queues[stage]
+        while True:
+            chunk = stage_queue.get()
+            if chunk is _STOP:
+                return
+            if not chunk.started and self.on_start:
+                # First stage a chunk enters, whichever it is
+                chunk.started = True
+                try:
+                    self.on_start(chunk)
+                except Exception as e:
+                    logger.warning(f"Chunk start callback failed: {str(e)}")
+            try:
+                next_stage = handler(chunk)
+            except ChunkSkipped as e:
+                chunk.error = e
+                self._remove_temp_file(chunk)
+                next_stage = None
+            except Exception as e:
+                logger.error(
+                    f"Chunk {chunk.start_time_seconds}-{chunk.end_time_seconds}s "
+                    f"failed in {stage} stage: {str(e)}"
+                )
+                chunk.error = chunk.error or e
+                self.errors.append(e)
+                self.failed.set()
+                self._remove_temp_file(chunk)
+                # An uploaded asset still has to be released
+                next_stage = "delete" if chunk.asset_id and stage != "delete" else None
+
+            if next_stage:
+                self.queues[next_stage].put(chunk)
+            else:
+                self.done.put(chunk)
+
+    def _start(self):
+        for stage in STAGES:
+            for n in range(max(self.concurrency[stage], 1)):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage,),
+                    name=f"chunk-{stage}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def _stop(self):
+        for stage in STAGES:
+            for _ in range(max(self.concurrency[stage], 1)):
+                self.queues[stage].put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def run(
+        self, chunks: List[Chunk], progress=None, checkpoint=None, on_start=None
+    ) -> List[dict]:
+        """
+        Process every chunk and return the results ordered by start_time_seconds.
+
+        checkpoint, when given, is called as checkpoint(chunk) and progress as
+        progress(completed, total), both from the calling thread each time a
+        chunk leaves the pipeline, whether it succeeded, failed (chunk.error)
+        or was skipped. on_start(chunk) is called from the worker thread that
+        picks a chunk up first. Raises the first error encountered once all
+        in-flight work has drained.
+        """
+        if not chunks:
+            return []
+
+        self.on_start = on_start
+        self._start()
+
+        # Feed from a separate thread, the download queue is bounded
+        feeder = threading.Thread(
+            target=lambda: [
+                self.queues["upload" if c.temp_file else "download"].put(c)
+                for c in chunks
+            ],
+            name="chunk-feeder",
+            daemon=True,
+        )
+        feeder.start()
+
+        finished = []
+        for _ in chunks:
+            chunk = self.done.get()
+            finished.append(chunk)
+            if checkpoint:
+                try:
+                    checkpoint(chunk)
+                except Exception as e:
+                    # An unsaved result would be lost, stop paying for more
+                    logger.error(f"Failed to checkpoint chunk {chunk.index}: {e}")
+                    self.errors.append(e)
+                    self.failed.set()
+            if progress:
+                try:
+                    progress(len(finished), len(chunks))
+                except Exception as e:
+                    logger.warning(f"Progress callback failed: {str(e)}")
+        feeder.join()
+        self._stop()
+
+        if self.errors:
+            raise self.errors[0]
+
+        cached = sum(1 for c in finished if c.cached)
+        if getattr(self.analyzer, "response_cache", None) is not None:
+            print(
+                f"VLM cache: {cached} of {len(finished)} chunks served from the "
+                f"cache ({cached / len(finished):.0%} hit rate)"
+            )
+
+        finished.sort(key=lambda c: c.start_time_seconds)
+        return [c.as_result() for c in finished]
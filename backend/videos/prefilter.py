@@ -0,0 +1,94 @@
+import logging
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IDLE_DESCRIPTION = (
+    "No significant motion or activity was detected in this interval. "
+    "The scene is static and unchanged."
+)
+# Share of a chunk's expected motion samples needed to judge it, below that
+# (a short decode, a profile of one frame) the chunk goes to the VLM
+MIN_COVERAGE = 0.5
+
+
+def chunk_motion(profile, start_sec, end_sec):
+    """
+    Peak motion of a chunk. The PREFILTER_PERCENTILE of each score is used
+    instead of the maximum so a single noisy frame doesn't count as activity.
+
+    Returns:
+        dict or None: activity, energy and flow of the chunk, None when the
+        profile has too few samples of it (less than MIN_COVERAGE)
+    """
+    window = profile.window(start_sec, end_sec)
+    samples = len(profile.activity[window])
+    if not samples or samples < MIN_COVERAGE * (end_sec - start_sec) * profile.fps:
+        return None
+    percentile = settings.PREFILTER_PERCENTILE
+    return {
+        name: float(np.percentile(getattr(profile, name)[window], percentile))
+        for name in ("activity", "energy", "flow")
+    }
+
+
+def is_idle(motion):
+    """
+    Whether a chunk's motion stays below every PREFILTER_* threshold. A chunk
+    without motion data (None) is never idle.
+    """
+    if motion is None:
+        return False
+    return (
+        motion["activity"] < settings.PREFILTER_ACTIVITY_THRESHOLD
+        and motion["energy"] < settings.PREFILTER_ENERGY_THRESHOLD
+        and motion["flow"] < settings.PREFILTER_FLOW_THRESHOLD
+    )
+
+
+def idle_response(motion):
+    """
+    Synthetic response in the shape of a VLM response, so idle chunks are
+    embedded and read by the agents like any other chunk.
+    """
+    return {
+        "choices": [{"message": {"role": "assistant", "content": IDLE_DESCRIPTION}}],
+        "prefilter": {"idle": True, **{k: round(v, 5) for k, v in motion.items()}},
+    }
+
+
+def prefilter_chunks(chunks, profile):
+    """
+    Mark the chunks without motion as idle and give them a synthetic result
+    instead of sending them to the VLM.
+
+    Args:
+        chunks (list): pipeline.Chunk objects, updated in place
+        profile (MotionProfile): Motion scores of the whole video
+
+    Returns:
+        list: The chunks that were marked idle
+    """
+    idle = []
+    unknown = 0
+    for chunk in chunks:
+        motion = chunk_motion(profile, chunk.start_time_seconds, chunk.end_time_seconds)
+        if motion is None:
+            unknown += 1
+        elif is_idle(motion):
+            chunk.idle = True
+            chunk.result = idle_response(motion)
+            idle.append(chunk)
+
+    saved_seconds = sum(c.end_time_seconds - c.start_time_seconds for c in idle)
+    print(
+        f"Prefilter: {len(idle)} of {len(chunks)} chunks idle, "
+        f"{saved_seconds} seconds of inference saved"
+    )
+    if unknown:
+        logger.warning(
+            f"Prefilter: no motion data for {unknown} chunks, they are analyzed"
+        )
+    return idle
@@ -0,0 +1,220 @@
+import logging
+import subprocess
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+
+from .dedup import frame_hashes, frame_thumbnails
+from .media import ffmpeg_executable
+
+logger = logging.getLogger(__name__)
+
+# Frames are decoded in grayscale at this size, plenty to see motion and cuts
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+HISTOGRAM_BINS = 16
+# Normal flow is capped (in pixels per frame) where the image has no gradient
+MAX_FLOW = 8.0
+
+
+def decode_frames(source, fps=None):
+    """
+    Decode a video (local path or URL) into small grayscale frames.
+
+    Args:
+        source (str): Anything ffmpeg can read
+        fps (float, optional): Frames sampled per second
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (frames, FRAME_HEIGHT, FRAME_WIDTH)
+    """
+    fps = fps or settings.SCENE_SAMPLE_FPS
+    command = [ffmpeg_executable(), "-hide_banner", "-loglevel", "error"]
+    command += ["-i", source, "-an", "-sn"]
+    command += ["-vf", f"fps={fps},scale={FRAME_WIDTH}:{FRAME_HEIGHT}"]
+    command += ["-pix_fmt", "gray", "-f", "rawvideo", "-"]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed: {result.stderr.decode().strip()}")
+
+    frame_size = FRAME_WIDTH * FRAME_HEIGHT
+    usable = len(result.stdout) - len(result.stdout) % frame_size
+    frames = np.frombuffer(result.stdout[:usable], dtype=np.uint8)
+    return frames.reshape(-1, FRAME_HEIGHT, FRAME_WIDTH)
+
+
+@dataclass
+class MotionProfile:
+    """
+    Scores of every transition between consecutive sampled frames. Transition
+    i sits between frames i and i + 1, at (i + 1) / fps seconds.
+    """
+
+    fps: float
+    activity: np.ndarray
+    energy: np.ndarray
+    flow: np.ndarray
+    shot_change: np.ndarray
+    # Perceptual hash and thumbnail of every sampled frame (not transition),
+    # see dedup.py
+    hashes: np.ndarray
+    thumbnails: np.ndarray
+
+    def window(self, start_sec, end_sec):
+        """Slice of the transitions that fall within (start_sec, end_sec]"""
+        first = int(np.floor(start_sec * self.fps))
+        last = int(np.floor(end_sec * self.fps))
+        return slice(first, max(last, first))
+
+
+def frame_scores(frames, fps, pixel_threshold=None):
+    """
+    Score every transition between consecutive frames.
+
+    Activity is the fraction of pixels that changed by more than
+    pixel_threshold gray levels, which ignores sensor noise. Energy is the mean
+    absolute frame difference (0-1). Flow approximates the optical flow
+    magnitude, in pixels per frame, as the temporal difference over the
+    spatial gradient (normal flow) of the changed pixels. The shot-change
+    score is the total variation distance between the two frames' gray-level
+    histograms, 0 for identical and 1 for disjoint histograms. Every frame
+    also gets a perceptual hash for deduplication.
+
+    Returns:
+        MotionProfile: Arrays of length frames - 1
+    """
+    if pixel_threshold is None:
+        pixel_threshold = settings.SCENE_PIXEL_THRESHOLD
+    count = len(frames)
+    if count < 2:
+        empty = np.zeros(0)
+        return MotionProfile(
+            fps,
+            empty,
+            empty,
+            empty,
+            empty,
+            frame_hashes(frames),
+            frame_thumbnails(frames),
+        )
+
+    flat = frames.reshape(count, -1)
+    diff = np.abs(flat[1:].astype(np.int16) - flat[:-1].astype(np.int16))
+    changed = diff > pixel_threshold
+    activity = changed.mean(axis=1)
+    energy = diff.mean(axis=1) / 255
+
+    # Normal flow |dI/dt| / |grad I| on the mean of each frame pair, capped
+    # where the gradient vanishes (flat areas say nothing about motion)
+    pairs = (frames[1:].astype(np.float32) + frames[:-1].astype(np.float32)) / 2
+    grad_y, grad_x = np.gradient(pairs, axis=(1, 2))
+    gradient = np.sqrt(grad_x**2 + grad_y**2).reshape(count - 1, -1)
+    normal_flow = np.minimum(diff / (gradient + 1.0), MAX_FLOW)
+    flow = (normal_flow * changed).mean(axis=1)
+
+    # Histograms of every frame in a single bincount, offsetting each frame's
+    # bins so they don't collide
+    bins = (flat // (256 // HISTOGRAM_BINS)).astype(np.int64)
+    bins += np.arange(count)[:, None] * HISTOGRAM_BINS
+    histograms = np.bincount(bins.ravel(), minlength=count * HISTOGRAM_BINS)
+    histograms = histograms.reshape(count, HISTOGRAM_BINS) / flat.shape[1]
+    shot_change = 0.5 * np.abs(histograms[1:] - histograms[:-1]).sum(axis=1)
+
+    return MotionProfile(
+        fps,
+        activity,
+        energy,
+        flow,
+        shot_change,
+        frame_hashes(frames),
+        frame_thumbnails(frames),
+    )
+
+
+def adaptive_intervals(
+    duration,
+    activity,
+    shot_change,
+    fps=None,
+    min_seconds=None,
+    max_seconds=None,
+    active_seconds=None,
+    cut_threshold=None,
+    activity_threshold=None,
+):
+    """
+    Choose chunk boundaries from the per-transition scores.
+
+    A chunk ends at the first scene change once it is at least min_seconds
+    long, or once it holds active_seconds of activity (so busy footage keeps
+    chunks about as short as before). Static stretches keep growing up to
+    max_seconds, where the chunk is cut at its quietest point so events aren't
+    split. Boundaries are whole seconds, as Cloudinary's so_/eo_ expect.
+
+    Returns:
+        list: Consecutive (start_sec, end_sec) tuples covering [0, duration)
+    """
+    fps = fps or settings.SCENE_SAMPLE_FPS
+    min_seconds = settings.CHUNK_MIN_SECONDS if min_seconds is None else min_seconds
+    max_seconds = settings.CHUNK_MAX_SECONDS if max_seconds is None else max_seconds
+    if active_seconds is None:
+        active_seconds = settings.CHUNK_ACTIVE_SECONDS
+    if cut_threshold is None:
+        cut_threshold = settings.SCENE_CUT_THRESHOLD
+    if activity_threshold is None:
+        activity_threshold = settings.SCENE_ACTIVITY_THRESHOLD
+
+    # Transition i sits between frames i and i + 1
+    times = np.floor((np.arange(len(activity)) + 1) / fps).astype(int)
+    active = activity > activity_threshold
+    cuts = shot_change >= cut_threshold
+
+    intervals = []
+    start = 0
+    busy = 0.0
+    i = 0
+    while i < len(times) and times[i] < duration:
+        length = times[i] - start
+        busy += active[i] / fps
+        if length >= max_seconds:
+            # Cut at the quietest moment of the allowed range, the latest one
+            # on ties so static footage gets chunks as long as allowed
+            earliest = start + max(min_seconds, 1)
+            window = np.nonzero((times >= earliest) & (times <= start + max_seconds))[0]
+            window = window[::-1]
+            end = (
+                times[window[np.argmin(activity[window])]] if len(window) else earliest
+            )
+        elif length >= min_seconds and (cuts[i] or busy >= active_seconds):
+            end = times[i]
+        else:
+            i += 1
+            continue
+
+        intervals.append((start, end))
+        start = end
+        busy = 0.0
+        # Resume right after the cut, which may be behind the current sample
+        i = int(np.searchsorted(times, start, side="right"))
+
+    if start < duration:
+        if intervals and duration - start < min_seconds:
+            # Too short on its own, fold the tail into the previous chunk
+            intervals[-1] = (intervals[-1][0], duration)
+        else:
+            intervals.append((start, duration))
+    return intervals
+
+
+def motion_profile(source, fps=None):
+    """Decode a video at low resolution and score its motion, see frame_scores"""
+    fps = fps or settings.SCENE_SAMPLE_FPS
+    return frame_scores(decode_frames(source, fps), fps)
+
+
+def scene_intervals(profile, duration):
+    """Adaptive (start_sec, end_sec) chunk boundaries for a scored video"""
+    return adaptive_intervals(
+        duration, profile.activity, profile.shot_change, fps=profile.fps
+    )
@@ -0,0 +1,266 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# First key of the two-int advisory locks used as global inference slots
+ADVISORY_LOCK_NAMESPACE = 0x4E564944  # "NVID"
+
+
+class RateLimitedError(Exception):
+    """The provider answered 429, optionally with a Retry-After delay"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    """A 5xx or similar failure that is worth retrying"""
+
+
+TRANSIENT_EXCEPTIONS = (
+    TransientError,
+    requests.ConnectionError,
+    requests.Timeout,
+    httpx.TransportError,
+)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls (or tokens) per second on average with bursts up to
+    `capacity`
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if not self.rate:
+            return
+        # More than a full bucket can never be available at once
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AimdLimiter:
+    """
+    Concurrency limit that grows additively while calls succeed (about +1 per
+    `limit` successes) and is cut multiplicatively when the provider throttles.
+    """
+
+    def __init__(self, initial, minimum, maximum, decrease=0.5):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False, succeeded=False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            elif succeeded:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class AdvisorySlots:
+    """
+    Caps concurrent calls across every worker process sharing the database.
+    A call holds one of `slots` Postgres session advisory locks while it runs.
+    Disabled when slots is 0 or the database isn't Postgres.
+    """
+
+    def __init__(self, slots, namespace=ADVISORY_LOCK_NAMESPACE, poll_interval=0.5):
+        self.slots = slots
+        self.namespace = namespace
+        self.poll_interval = poll_interval
+
+    def _try_acquire(self, cursor):
+        # Start at a random slot so processes don't all fight over slot 0
+        offset = random.randrange(self.slots)
+        for n in range(self.slots):
+            slot = (offset + n) % self.slots
+            cursor.execute(
+                "SELECT pg_try_advisory_lock(%s, %s)", [self.namespace, slot]
+            )
+            if cursor.fetchone()[0]:
+                return slot
+        return None
+
+    @contextmanager
+    def hold(self):
+        if not self.slots or connection.vendor != "postgresql":
+            yield
+            return
+
+        with connection.cursor() as cursor:
+            slot = self._try_acquire(cursor)
+            while slot is None:
+                time.sleep(self.poll_interval * (1 + random.random()))
+                slot = self._try_acquire(cursor)
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_unlock(%s, %s)", [self.namespace, slot]
+                )
+
+
+class InferenceScheduler:
+    """
+    Sits in front of the cosmos-nemotron endpoint: every call waits for a token,
+    a slot under the adaptive (AIMD) concurrency limit and a global advisory
+    lock slot, and is retried with jittered exponential backoff on 429s, 5xxs
+    and connection errors. A Retry-After from the provider pauses every caller
+    of the process, not just the one that got it.
+    """
+
+    def __init__(
+        self,
+        rate=None,
+        burst=None,
+        initial_concurrency=None,
+        min_concurrency=None,
+        max_concurrency=None,
+        global_concurrency=None,
+        max_attempts=None,
+        backoff_base=None,
+        backoff_max=None,
+    ):
+        def setting(value, name):
+            return getattr(settings, name) if value is None else value
+
+        self.bucket = TokenBucket(
+            setting(rate, "NVIDIA_RATE_LIMIT_PER_SECOND"),
+            setting(burst, "NVIDIA_RATE_LIMIT_BURST"),
+        )
+        self.limiter = AimdLimiter(
+            setting(initial_concurrency, "NVIDIA_INITIAL_CONCURRENCY"),
+            setting(min_concurrency, "NVIDIA_MIN_CONCURRENCY"),
+            setting(max_concurrency, "NVIDIA_MAX_CONCURRENCY"),
+        )
+        self.global_slots = AdvisorySlots(
+            setting(global_concurrency, "NVIDIA_GLOBAL_CONCURRENCY")
+        )
+        self.max_attempts = setting(max_attempts, "NVIDIA_MAX_ATTEMPTS")
+        if self.max_attempts < 1:
+            raise ValueError(
+                f"NVIDIA_MAX_ATTEMPTS must be at least 1, got {self.max_attempts}"
+            )
+        self.backoff_base = setting(backoff_base, "NVIDIA_BACKOFF_BASE_SECONDS")
+        self.backoff_max = setting(backoff_max, "NVIDIA_BACKOFF_MAX_SECONDS")
+
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _wait_if_paused(self):
+        with self.lock:
+            wait = self.paused_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt):
+        """Full jitter: uniform between 0 and the capped exponential delay"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) under the scheduler's limits and retries"""
+        for attempt in range(self.max_attempts):
+            self._wait_if_paused()
+            self.bucket.acquire()
+            self.limiter.acquire()
+            throttled = succeeded = False
+            try:
+                with self.global_slots.hold():
+                    self._count("calls")
+                    result = fn(*args, **kwargs)
+                succeeded = True
+                return result
+            except RateLimitedError as e:
+                throttled = True
+                self._count("throttled")
+                error, delay = e, self._backoff(attempt)
+                if e.retry_after is not None:
+                    delay = e.retry_after + random.uniform(0, self.backoff_base)
+                    self._pause(e.retry_after)
+            except TRANSIENT_EXCEPTIONS as e:
+                error, delay = e, self._backoff(attempt)
+            finally:
+                self.limiter.release(throttled=throttled, succeeded=succeeded)
+
+            if attempt + 1 < self.max_attempts:
+                self._count("retries")
+                logger.warning(
+                    f"Inference attempt {attempt + 1} failed ({str(error)}), "
+                    f"retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+        self._count("failures")
+        raise error
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["concurrency_limit"] = int(self.limiter.limit)
+        stats["in_flight"] = self.limiter.in_flight
+        return stats
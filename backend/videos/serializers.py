@@ -1,9 +1,21 @@
 from rest_framework import serializers
 
-from .models import Video
+from .models import Job, Video, VideoChunk
 
 
 class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
         fields = "__all__"
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = "__all__"
+
+
+class VideoChunkSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoChunk
+        exclude = ["video"]
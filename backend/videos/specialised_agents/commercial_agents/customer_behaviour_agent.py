@@ -3,11 +3,12 @@ import os
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import ToolNode, create_react_agent
 
+from ...clients import get_chat_model, get_embeddings
+from ...vector_store import collection_for, get_video_store
+
 load_dotenv()
 
 
@@ -41,8 +42,8 @@ prompt = ChatPromptTemplate.from_messages(
 )
 
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-llm = ChatOpenAI(model="gpt-4o-mini")
+embeddings = get_embeddings()
+llm = get_chat_model()
 
 
 @tool(response_format="content_and_artifact")
@@ -50,7 +51,7 @@ def retrieve(query: str):
     """Retrieve information related to a query."""
     global customer_behaviour_vector_store
     # 'vector_store' is assumed to be globally accessible or imported.
-    retrieved_docs = customer_behaviour_vector_store.similarity_search(query, k=2)
+    retrieved_docs = customer_behaviour_vector_store.search(query, k=2)
     print("Retrieved docs:", retrieved_docs)
     print("Retrieved from SUMMARY AGENT!")
     serialized = "\n\n".join(
@@ -71,16 +72,11 @@ def run_customer_behaviour_agent(video_id: int):
     message in a variable, and returns it.
     """
     global collection_name, customer_behaviour_vector_store
-    collection_name = f"video_id_{video_id}"
+    collection_name = collection_for(video_id)
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    customer_behaviour_vector_store = PGVector(
-        embeddings=embeddings,
-        collection_name=collection_name,
-        connection=os.environ.get("POSTGRES_CONNECTION"),
-    )
+    customer_behaviour_vector_store = get_video_store(video_id)
 
-    llm = ChatOpenAI(model="gpt-4o-mini")
+    llm = get_chat_model()
     memory = MemorySaver()
     agent_executor = create_react_agent(llm, [retrieve], checkpointer=memory)
 
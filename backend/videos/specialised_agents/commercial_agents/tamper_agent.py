@@ -6,11 +6,12 @@ from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import ToolNode, create_react_agent
 
+from ...clients import get_chat_model, get_embeddings
+from ...vector_store import collection_for, get_video_store
+
 load_dotenv()
 
 
@@ -139,8 +140,8 @@ prompt = ChatPromptTemplate.from_messages(
 )
 
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-llm = ChatOpenAI(model="gpt-4o-mini")
+embeddings = get_embeddings()
+llm = get_chat_model()
 
 
 def evaluate_severity(input_string: str) -> str:
@@ -161,11 +162,7 @@ def evaluate_severity(input_string: str) -> str:
     evaluator_prompt = "You are an assistant that analyzes tampering incident reports and determines their severity."
 
     # Initialize the ChatOpenAI model with desired parameters
-    chat = ChatOpenAI(
-        model_name="gpt-4o-mini",  # You can choose other models like "gpt-3.5-turbo" if preferred
-        temperature=0,  # Setting temperature to 0 for deterministic output
-        openai_api_key=api_key,
-    )
+    chat = get_chat_model(temperature=0)
 
     # Define the messages to send to the model
     messages = [
@@ -199,7 +196,7 @@ def retrieve(query: str):
     """Retrieve information related to a query."""
     global tamper_vector_store
     # 'vector_store' is assumed to be globally accessible or imported.
-    retrieved_docs = tamper_vector_store.similarity_search(query, k=2)
+    retrieved_docs = tamper_vector_store.search(query, k=2)
     print("Retrieved docs:", retrieved_docs)
     print("Retrieved from CRIME AGENT!")
     serialized = "\n\n".join(
@@ -220,16 +217,11 @@ def run_tamper_agent(video_id: int):
     structured JSON output, and returns it.
     """
     global collection_name, tamper_vector_store
-    collection_name = f"video_id_{video_id}"
+    collection_name = collection_for(video_id)
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    tamper_vector_store = PGVector(
-        embeddings=embeddings,
-        collection_name=collection_name,
-        connection=os.environ.get("POSTGRES_CONNECTION"),
-    )
+    tamper_vector_store = get_video_store(video_id)
 
-    llm = ChatOpenAI(model="gpt-4o-mini")
+    llm = get_chat_model()
     memory = MemorySaver()
     agent_executor = create_react_agent(llm, [retrieve], checkpointer=memory)
 
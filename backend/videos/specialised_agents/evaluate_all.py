@@ -0,0 +1,228 @@
+import json
+import logging
+from typing import List, Literal
+
+from django.conf import settings
+from langchain.schema import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field
+
+from ..clients import get_chat_model
+from ..events import chunk_description
+from ..models import Video
+
+logger = logging.getLogger(__name__)
+
+# detector -> (Video field, incidents key of the stored JSON, what it looks for)
+DETECTORS = {
+    "fire": ("fire_evaluation", "fire_incidents", "fire, flames, smoke or burning"),
+    "assault": (
+        "assault_evaluation",
+        "assault_incidents",
+        "physical attacks, fights, hitting or violence against a person",
+    ),
+    "crime": (
+        "crime_evaluation",
+        "crime_incidents",
+        "criminal activity such as vandalism, break-ins, weapons or robbery",
+    ),
+    "drug": (
+        "drug_evaluation",
+        "drug_incidents",
+        "drug use, possession or dealing",
+    ),
+    "theft": (
+        "theft_evaluation",
+        "theft_incidents",
+        "theft, burglary, shoplifting or stealing",
+    ),
+    "tamper": (
+        "tamper_evaluation",
+        "tamper_incidents",
+        "tampering with the camera, equipment, products, locks or property",
+    ),
+    "suspicious": (
+        "suspicious_evaluation",
+        "suspicious_incidents",
+        "suspicious behaviour such as loitering, concealment or casing the area",
+    ),
+}
+SEVERITY_ORDER = ("none", "low", "medium", "high")
+
+
+class Incident(BaseModel):
+    severity: Literal["low", "medium", "high"]
+    description: str = Field(description="What happens, in one sentence")
+    start_time_seconds: float
+    end_time_seconds: float
+
+
+class Detection(BaseModel):
+    severity: Literal["none", "low", "medium", "high"] = Field(
+        description="Overall severity, none if nothing was detected"
+    )
+    incidents: List[Incident]
+
+
+class Evaluation(BaseModel):
+    fire: Detection
+    assault: Detection
+    crime: Detection
+    drug: Detection
+    theft: Detection
+    tamper: Detection
+    suspicious: Detection
+    customer_behaviour: str = Field(
+        description=(
+            "Report on customer behaviour: areas where people spend the most "
+            "time, peak activity, high-traffic zones, popular products and "
+            "unusual patterns, with actionable insights"
+        )
+    )
+
+
+system_message_evaluate_all = """
+You are an intelligent assistant that reviews the time-stamped descriptions of a surveillance video and evaluates it for every detector at once.
+
+For each detector below, find the moments the descriptions show it, using only the descriptions:
+{detectors}
+
+For every incident give its severity (low: minor, medium: significant, high: severe or dangerous), a one sentence description, and its `start_time_seconds` and `end_time_seconds` taken from the description's time range. Give each detector an overall severity, "none" with no incidents if it is not detected. Do not report an incident under a detector it doesn't belong to.
+
+Also write the customer behaviour report described in the schema, "No customers are visible." if there are none.
+"""
+
+
+def chunk_context(analysis_result):
+    """
+    The video's chunk descriptions, one time-stamped line per chunk in time
+    order: the whole context every detector is evaluated on.
+    """
+    if isinstance(analysis_result, dict):
+        analysis_result = [analysis_result]
+    lines = []
+    for result in analysis_result or []:
+        if not isinstance(result, dict):
+            continue
+        text = chunk_description(result.get("analysis"))
+        if not text or not text.strip():
+            continue
+        # Results stored before chunks were checkpointed use start_sec / end_sec
+        start = result.get("start_time_seconds", result.get("start_sec"))
+        end = result.get("end_time_seconds", result.get("end_sec"))
+        lines.append((start or 0, f"[{start}s - {end}s] {' '.join(text.split())}"))
+    return [line for _, line in sorted(lines, key=lambda item: item[0])]
+
+
+def context_windows(lines, max_chars):
+    """
+    Consecutive groups of whole lines of at most max_chars characters (a
+    single longer line gets a window of its own). Lines are never cut: a
+    detector can only report what it is shown.
+    """
+    windows = []
+    window = []
+    size = 0
+    for line in lines:
+        if window and size + len(line) + 1 > max_chars:
+            windows.append("\n".join(window))
+            window = []
+            size = 0
+        window.append(line)
+        size += len(line) + 1
+    if window:
+        windows.append("\n".join(window))
+    return windows
+
+
+def merge_evaluations(evaluations):
+    """One Evaluation out of the evaluations of several context windows"""
+    merged = {}
+    for name in DETECTORS:
+        detections = [getattr(evaluation, name) for evaluation in evaluations]
+        merged[name] = Detection(
+            severity=max((d.severity for d in detections), key=SEVERITY_ORDER.index),
+            incidents=[i for d in detections for i in d.incidents],
+        )
+    reports = [e.customer_behaviour.strip() for e in evaluations]
+    merged["customer_behaviour"] = "\n\n".join(r for r in reports if r)
+    return Evaluation(**merged)
+
+
+def detector_output(detection, incidents_key):
+    """
+    A detection in the format of the single detector agents: the incidents,
+    then a last entry holding only the overall severity.
+    """
+    incidents = [
+        {
+            "severity": incident.severity,
+            "description": incident.description,
+            "time_interval": {
+                "start_time_seconds": incident.start_time_seconds,
+                "end_time_seconds": incident.end_time_seconds,
+            },
+        }
+        for incident in sorted(detection.incidents, key=lambda i: i.start_time_seconds)
+    ]
+    incidents.append({"severity": detection.severity})
+    return json.dumps({incidents_key: incidents}, indent=2)
+
+
+def run_evaluate_all(video_id: int):
+    """
+    Evaluates a video for every detector (fire, assault, crime, drug, theft,
+    tamper, suspicious and customer behaviour) in one schema-constrained LLM
+    call over all of its chunk descriptions. A video whose descriptions
+    exceed EVALUATE_ALL_MAX_CONTEXT_CHARS is split into consecutive windows
+    whose results are merged, with a warning when that takes more than
+    EVALUATE_ALL_MAX_CALLS calls.
+
+    Args:
+        video_id (int): The analyzed video
+
+    Returns:
+        dict: {Video field: output} for every detector, outputs are in the
+        format the single detector agents produce
+    """
+    video = Video.objects.only("analysis_result").get(id=video_id)
+    lines = chunk_context(video.analysis_result)
+    if not lines:
+        raise ValueError(f"Video {video_id} has no analyzed chunks to evaluate")
+    windows = context_windows(lines, settings.EVALUATE_ALL_MAX_CONTEXT_CHARS)
+    if len(windows) > settings.EVALUATE_ALL_MAX_CALLS:
+        logger.warning(
+            f"Video {video_id} has {sum(len(line) for line in lines)} characters "
+            f"of descriptions: evaluating it takes {len(windows)} calls, more "
+            f"than EVALUATE_ALL_MAX_CALLS ({settings.EVALUATE_ALL_MAX_CALLS})"
+        )
+
+    detectors = "\n".join(
+        f"- **{name}**: {looks_for}" for name, (_, _, looks_for) in DETECTORS.items()
+    )
+    system_prompt = system_message_evaluate_all.format(detectors=detectors)
+    llm = get_chat_model(temperature=0).with_structured_output(
+        Evaluation, method="json_schema", strict=True
+    )
+
+    evaluations = []
+    for index, window in enumerate(windows):
+        print(
+            f"Evaluating video {video_id} for every detector "
+            f"({index + 1}/{len(windows)}, {len(window)} characters)"
+        )
+        evaluations.append(
+            llm.invoke(
+                [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=f"Video descriptions:\n{window}"),
+                ]
+            )
+        )
+    evaluation = merge_evaluations(evaluations)
+
+    outputs = {
+        field: detector_output(getattr(evaluation, name), incidents_key)
+        for name, (field, incidents_key, _) in DETECTORS.items()
+    }
+    outputs["customer_behaviour"] = evaluation.customer_behaviour
+    return outputs
@@ -6,12 +6,13 @@ from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_postgres import PGVector
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import ToolNode, create_react_agent
 from pydantic import BaseModel
 
+from ..clients import get_chat_model, get_embeddings
+from ..vector_store import collection_for, get_video_store
+
 load_dotenv()
 
 
@@ -140,8 +141,8 @@ prompt = ChatPromptTemplate.from_messages(
 )
 
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-llm = ChatOpenAI(model="gpt-4o-mini")
+embeddings = get_embeddings()
+llm = get_chat_model()
 
 
 def evaluate_severity(input_string: str) -> str:
@@ -162,12 +163,7 @@ def evaluate_severity(input_string: str) -> str:
     evaluator_prompt = "You are an assistant that analyzes fire incident reports and determines their severity."
 
     # Initialize the ChatOpenAI model with desired parameters
-    chat = ChatOpenAI(
-        model_name="gpt-4o-mini",  # You can choose other models like "gpt-3.5-turbo" if preferred
-        temperature=0,  # Setting temperature to 0 for deterministic output
-        openai_api_key=api_key,
-        # Ensure your API key is set as an environment variable
-    )
+    chat = get_chat_model(temperature=0)
 
     # Define the messages to send to the model
     messages = [
@@ -201,7 +197,7 @@ def retrieve(query: str):
     """Retrieve information related to a query."""
     global fire_vector_store
     # 'vector_store' is assumed to be globally accessible or imported.
-    retrieved_docs = fire_vector_store.similarity_search(query, k=2)
+    retrieved_docs = fire_vector_store.search(query, k=2)
     print("Retrieved docs:", retrieved_docs)
     print("Retrieved from FIRE AGENT!")
     serialized = "\n\n".join(
@@ -222,16 +218,11 @@ def run_fire_agent(video_id: int):
     structured JSON output, and returns it.
     """
     global collection_name, fire_vector_store
-    collection_name = f"video_id_{video_id}"
+    collection_name = collection_for(video_id)
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    fire_vector_store = PGVector(
-        embeddings=embeddings,
-        collection_name=collection_name,
-        connection=os.environ.get("POSTGRES_CONNECTION"),
-    )
+    fire_vector_store = get_video_store(video_id)
 
-    llm = ChatOpenAI(model="gpt-4o-mini")
+    llm = get_chat_model()
     memory = MemorySaver()
     agent_executor = create_react_agent(llm, [retrieve], checkpointer=memory)
 
@@ -1,3 +1,1028 @@
-from django.test import TestCase
+import json
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import vector_store
+from .analysis import (
+    AnalysisError,
+    AnalysisInProgress,
+    analyze_video_chunks,
+    segment_chunks,
+    video_analysis_lock,
+)
+from .assets import AssetCollector
+from .dedup import (
+    HammingIndex,
+    decode_signature,
+    encode_signature,
+    frame_hashes,
+    frame_thumbnails,
+)
+from .events import (
+    ANALYSIS_DONE,
+    CHUNK_COMPLETED,
+    EMBEDDING_DONE,
+    event_stream,
+    publish,
+)
+from .metadata import _probe_ffmpeg, parse_moov
+from .models import InferenceCacheEntry, Job, NvcfAsset, Video, VideoChunk
+from .nvidia_analyzer import NvidiaAnalyzer
+from .pipeline import Chunk, ChunkPipeline, ChunkSkipped
+from .prefilter import chunk_motion, is_idle, prefilter_chunks
+from .scenes import adaptive_intervals, frame_scores
+from .scheduler import (
+    AimdLimiter,
+    InferenceScheduler,
+    RateLimitedError,
+    TokenBucket,
+    TransientError,
+)
+from .specialised_agents.evaluate_all import context_windows
+from .vector_cache import CachedVideo, VectorCache
+from .vector_store import VideoStore
+from .vlm_cache import VlmResponseCache
+
+
+def textured_scene(seed=0, height=36, width=64):
+    """A static camera view: a gradient with blocky texture, like shelves"""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(60, 190, size=(height // 6 + 1, width // 8 + 1))
+    texture = np.kron(blocks, np.ones((6, 8)))[:height, :width]
+    gradient = np.linspace(0, 40, width)[None, :]
+    return np.clip(texture + gradient, 0, 255)
+
+
+def noisy(scene, rng, sigma=2.0):
+    return np.clip(scene + rng.normal(0, sigma, scene.shape), 0, 255).astype(np.uint8)
+
+
+def signature(frames):
+    return frame_hashes(frames), frame_thumbnails(frames)
+
+
+class DedupTests(SimpleTestCase):
+    samples = 4
+
+    def index_of(self, frames):
+        index = HammingIndex(self.samples, max_distance=8, max_cell_difference=10)
+        index.add("original", signature(frames))
+        return index
+
+    def test_same_scene_with_noise_is_a_duplicate(self):
+        rng = np.random.default_rng(1)
+        scene = textured_scene()
+        index = self.index_of(np.stack([noisy(scene, rng) for _ in range(4)]))
+
+        frames = np.stack([noisy(scene, rng) for _ in range(4)])
+        self.assertEqual(index.nearest(signature(frames))[0], "original")
+
+    def test_brightness_change_is_a_duplicate(self):
+        rng = np.random.default_rng(2)
+        scene = textured_scene()
+        index = self.index_of(np.stack([noisy(scene, rng) for _ in range(4)]))
+
+        frames = np.stack([noisy(scene + 15, rng) for _ in range(4)])
+        self.assertIsNotNone(index.nearest(signature(frames)))
+
+    def test_inserted_object_is_not_a_duplicate(self):
+        rng = np.random.default_rng(3)
+        scene = textured_scene()
+        index = self.index_of(np.stack([noisy(scene, rng) for _ in range(4)]))
+
+        for width, height in [(6, 3), (8, 4), (12, 6)]:
+            for _ in range(20):
+                x = rng.integers(0, 64 - width)
+                y = rng.integers(0, 36 - height)
+                frames = np.stack([noisy(scene, rng) for _ in range(4)])
+                # A person walks into a single sampled frame
+                person = frames[2].astype(np.int16)
+                person[y : y + height, x : x + width] = np.where(
+                    person[y : y + height, x : x + width] > 127, 20, 235
+                )
+                frames[2] = person
+                self.assertIsNone(
+                    index.nearest(signature(frames)),
+                    f"{width}x{height} object at ({x}, {y}) matched",
+                )
+
+    def test_signature_round_trip(self):
+        rng = np.random.default_rng(4)
+        frames = np.stack([noisy(textured_scene(), rng) for _ in range(3)])
+        hashes, thumbnails = decode_signature(encode_signature(signature(frames)))
+        np.testing.assert_array_equal(hashes, frame_hashes(frames))
+        np.testing.assert_array_equal(thumbnails, frame_thumbnails(frames))
+        # Hash-only signatures of earlier versions are not comparable
+        self.assertIsNone(decode_signature("0" * 16 * 8))
+
+    def test_index_grows_past_its_capacity(self):
+        rng = np.random.default_rng(5)
+        scenes = [textured_scene(seed) for seed in range(40)]
+        index = HammingIndex(1, max_distance=8, max_cell_difference=10)
+        for number, scene in enumerate(scenes):
+            index.add(number, signature(noisy(scene, rng)[None]))
+
+        self.assertEqual(len(index), 40)
+        for number in (0, 17, 39):
+            frames = noisy(scenes[number], rng)[None]
+            self.assertEqual(index.nearest(signature(frames))[0], number)
+
+
+def cached_video(count, dimensions=4):
+    rng = np.random.default_rng(count)
+    ids = [str(i) for i in range(count)]
+    documents = [f"chunk {i}" for i in range(count)]
+    return CachedVideo(
+        ids, documents, [{}] * count, rng.normal(size=(count, dimensions))
+    )
+
+
+class VectorCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = VectorCache(max_bytes=2**20, ttl=60)
+        # Don't subscribe to database notifications
+        self.cache.listening = True
+
+    def test_empty_video_is_searchable_and_not_cached(self):
+        empty = cached_video(0)
+        self.assertEqual(empty.similarity_search([1.0, 0.0, 0.0, 0.0], 5), [])
+        self.assertEqual(
+            empty.hybrid_search("chunk", [1.0, 0.0, 0.0, 0.0], 5, 10, 60), []
+        )
+
+        self.cache.get(("c", "1"), lambda: empty)
+        self.assertEqual(self.cache.stats()["videos"], 0)
+
+    def test_text_search_matches_word_prefixes(self):
+        video = CachedVideo(
+            ["1", "2", "3"],
+            ["A man falls near the door", "Empty aisle", "She is falling down"],
+            [{}, {}, {}],
+            np.eye(3),
+        )
+        found = [d.id for d in video.text_search("fall", 5)]
+        self.assertEqual(sorted(found), ["1", "3"])
+
+    def test_hit_after_load(self):
+        entry = cached_video(3)
+        self.assertIs(self.cache.get(("c", "1"), lambda: entry), entry)
+        self.assertIs(self.cache.get(("c", "1"), lambda: cached_video(3)), entry)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_load_racing_an_invalidation_is_not_cached(self):
+        def load():
+            # New chunks are embedded while the old vectors are being read
+            self.cache.invalidate(1)
+            return cached_video(3)
+
+        stale = self.cache.get(("c", "1"), load)
+        self.assertEqual(len(stale.ids), 3)
+        self.assertEqual(self.cache.stats()["videos"], 0)
+
+        fresh = cached_video(4)
+        self.assertIs(self.cache.get(("c", "1"), lambda: fresh), fresh)
+        self.assertEqual(self.cache.stats()["videos"], 1)
+
+
+class EventStreamTests(SimpleTestCase):
+    databases = {"default"}
+
+    def test_stream_ends_after_a_terminal_event(self):
+        stream = event_stream(1, snapshot={"chunks": []})
+        self.assertIn("snapshot", next(stream))
+        publish(CHUNK_COMPLETED, 1, index=0)
+        publish(ANALYSIS_DONE, 1)
+        events = list(stream)
+        self.assertEqual(len(events), 2)
+        self.assertIn(ANALYSIS_DONE, events[-1])
+
+    def test_stream_ends_after_its_lifetime(self):
+        stream = event_stream(2, max_seconds=0.05)
+        self.assertEqual(list(stream), [": keep-alive\n\n"])
+
+
+class AnalysisLockTests(SimpleTestCase):
+    def test_second_run_of_a_video_is_refused(self):
+        with video_analysis_lock(1):
+            with self.assertRaises(AnalysisInProgress):
+                with video_analysis_lock(1):
+                    pass
+            # Other videos are not blocked
+            with video_analysis_lock(2):
+                pass
+        with video_analysis_lock(1):
+            pass
+
+
+class ContextWindowTests(SimpleTestCase):
+    def test_every_line_is_kept_whole(self):
+        rng = np.random.default_rng(6)
+        lines = [
+            f"[{i * 30}s - {i * 30 + 30}s] " + "x" * int(rng.integers(10, 400))
+            for i in range(200)
+        ]
+        windows = context_windows(lines, 1000)
+
+        self.assertEqual("\n".join(windows).split("\n"), lines)
+        self.assertTrue(all(len(window) <= 1000 for window in windows))
+
+    def test_a_line_longer_than_a_window_gets_its_own(self):
+        lines = ["short", "y" * 50, "short"]
+        self.assertEqual(context_windows(lines, 20), lines)
+        self.assertEqual(context_windows([], 20), [])
+
+
+def vlm_response(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+class VlmResponseCacheTests(TestCase):
+    def test_stores_only_evict_over_budget_or_periodically(self):
+        cache = VlmResponseCache(max_bytes=2**20, ttl_seconds=0, evict_interval=10)
+        with mock.patch.object(cache, "evict", wraps=cache.evict) as evict:
+            for n in range(12):
+                cache.store(f"clip{n}", "describe", {}, vlm_response("x" * 100))
+        # The first store measures the table, then every 10th store
+        self.assertEqual(evict.call_count, 2)
+
+    def test_eviction_keeps_the_cache_under_its_budget(self):
+        size = len(json.dumps(vlm_response("x" * 100)))
+        cache = VlmResponseCache(
+            max_bytes=size * 10, ttl_seconds=0, evict_interval=1000
+        )
+        for n in range(30):
+            cache.store(f"clip{n}", "describe", {}, vlm_response("x" * 100))
+            stored = sum(
+                InferenceCacheEntry.objects.values_list("size_bytes", flat=True)
+            )
+            self.assertLessEqual(stored, size * 10)
+        # The most recently stored responses survive
+        self.assertIsNotNone(cache.lookup("clip29", "describe", {}))
+        self.assertIsNone(cache.lookup("clip0", "describe", {}))
+
+
+def box(box_type, *payloads):
+    payload = b"".join(payloads)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type, *payloads, version=0):
+    return box(box_type, bytes([version, 0, 0, 0]), *payloads)
+
+
+class ParseMoovTests(SimpleTestCase):
+    def moov(self, handler=b"vide"):
+        # 10 s movie, one 1280x720 avc1 track of 300 samples: 30 fps
+        mvhd = full_box(b"mvhd", bytes(8), struct.pack(">II", 1000, 10000), bytes(80))
+        tkhd = full_box(b"tkhd", bytes(72), struct.pack(">II", 1280 << 16, 720 << 16))
+        mdhd = full_box(b"mdhd", bytes(8), struct.pack(">II", 30000, 300000), bytes(4))
+        hdlr = full_box(b"hdlr", bytes(4), handler, bytes(12))
+        stsd = full_box(
+            b"stsd", struct.pack(">I", 1), struct.pack(">I4s", 86, b"avc1"), bytes(78)
+        )
+        stts = full_box(b"stts", struct.pack(">III", 1, 300, 1000))
+        stbl = box(b"stbl", stsd, stts)
+        mdia = box(b"mdia", mdhd, hdlr, box(b"minf", stbl))
+        return box(b"moov", mvhd, box(b"trak", tkhd, mdia))
+
+    def test_video_track(self):
+        self.assertEqual(
+            parse_moov(self.moov()),
+            {
+                "duration_seconds": 10.0,
+                "width": 1280,
+                "height": 720,
+                "video_codec": "avc1",
+                "fps": 30.0,
+            },
+        )
+
+    def test_other_tracks_are_ignored(self):
+        self.assertEqual(
+            parse_moov(self.moov(handler=b"soun")), {"duration_seconds": 10.0}
+        )
+
+    def test_ffmpeg_timeout_gives_no_metadata(self):
+        timeout = subprocess.TimeoutExpired("ffmpeg", 60)
+        with mock.patch("videos.metadata.subprocess.run", side_effect=timeout):
+            self.assertEqual(_probe_ffmpeg("https://example.com/stalled.mkv"), {})
+
+
+class AdaptiveIntervalTests(SimpleTestCase):
+    def intervals(self, activity, shot_change, duration=100):
+        return adaptive_intervals(
+            duration,
+            np.asarray(activity, dtype=float),
+            np.asarray(shot_change, dtype=float),
+            fps=1,
+            min_seconds=5,
+            max_seconds=30,
+            active_seconds=10,
+            cut_threshold=0.5,
+            activity_threshold=0.1,
+        )
+
+    def test_cuts_at_scene_changes(self):
+        shot_change = np.zeros(100)
+        # Transition 19 sits between the frames of second 19 and 20
+        shot_change[19] = 1
+        self.assertEqual(
+            self.intervals(np.zeros(100), shot_change),
+            [(0, 20), (20, 50), (50, 80), (80, 100)],
+        )
+
+    def test_busy_footage_gets_shorter_chunks(self):
+        activity = np.zeros(100)
+        activity[40:] = 1
+        self.assertEqual(
+            self.intervals(activity, np.zeros(100)),
+            [(0, 30), (30, 50)] + [(start, start + 10) for start in range(50, 100, 10)],
+        )
+
+    def test_long_static_chunks_end_at_their_quietest_moment(self):
+        activity = np.full(100, 0.05)
+        activity[44] = 0
+        self.assertEqual(
+            self.intervals(activity, np.zeros(100)),
+            [(0, 30), (30, 45), (45, 75), (75, 100)],
+        )
+
+    def test_short_tail_is_folded_into_the_last_chunk(self):
+        self.assertEqual(
+            self.intervals(np.zeros(62), np.zeros(62), duration=62),
+            [(0, 30), (30, 62)],
+        )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("videos.scheduler.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_waits_for_the_rate(self):
+        bucket = TokenBucket(rate=4, capacity=4)
+        bucket.acquire(4)
+        self.assertEqual(self.clock.slept, [])
+
+        bucket.acquire(3)
+        self.assertEqual(self.clock.now, 0.75)
+
+    def test_amount_larger_than_the_bucket_waits_for_a_full_bucket(self):
+        bucket = TokenBucket(rate=4, capacity=4)
+        bucket.acquire(4)
+        bucket.acquire(50)
+        self.assertEqual(self.clock.now, 1.0)
+
+    def test_tokens_refill_up_to_capacity(self):
+        bucket = TokenBucket(rate=4, capacity=4)
+        bucket.acquire(4)
+        self.clock.now += 100
+        bucket.acquire(4)
+        self.assertEqual(self.clock.slept, [])
+        bucket.acquire(1)
+        self.assertEqual(self.clock.now, 100.25)
+
+    def test_no_rate_never_waits(self):
+        bucket = TokenBucket(rate=0, capacity=1)
+        for _ in range(10):
+            bucket.acquire(1)
+        self.assertEqual(self.clock.slept, [])
+
+
+class AnalysisEventTests(TestCase):
+    @override_settings(EMBEDDING_INCREMENTAL=False)
+    def test_analysis_done_comes_after_the_final_embedding(self):
+        video = Video.objects.create(
+            title="t",
+            description="",
+            video_url="https://res.cloudinary.com/demo/video/upload/v1/cam/a.mp4",
+        )
+        VideoChunk.objects.create(
+            video=video,
+            index=0,
+            start_time_seconds=0,
+            end_time_seconds=30,
+            status=VideoChunk.STATUS_SUCCEEDED,
+            analysis=vlm_response("A quiet aisle"),
+        )
+        order = []
+
+        def embed(video_id, chunk_results):
+            order.append("embedding")
+            publish(EMBEDDING_DONE, video_id, success=True)
+
+        stream = event_stream(video.id, snapshot={})
+        next(stream)
+        with mock.patch("videos.analysis.get_analyzer"), mock.patch(
+            "videos.analysis.create_embedding", side_effect=embed
+        ):
+            analyze_video_chunks(video)
+
+        types = [json.loads(event.split("data: ", 1)[1])["type"] for event in stream]
+        self.assertEqual(order, ["embedding"])
+        self.assertEqual(types, [EMBEDDING_DONE, ANALYSIS_DONE])
+
+
+def static_chunk(start, end):
+    return SimpleNamespace(
+        start_time_seconds=start, end_time_seconds=end, idle=False, result=None
+    )
+
+
+class PrefilterTests(SimpleTestCase):
+    def test_profile_without_transitions_marks_nothing_idle(self):
+        profile = frame_scores(textured_scene()[None].astype(np.uint8), 1)
+        chunks = [static_chunk(0, 30)]
+
+        self.assertIsNone(chunk_motion(profile, 0, 30))
+        self.assertFalse(is_idle(None))
+        self.assertEqual(prefilter_chunks(chunks, profile), [])
+        self.assertFalse(chunks[0].idle)
+
+    def test_chunks_past_a_short_decode_are_analyzed(self):
+        # Only the first 20 s of a 60 s video could be decoded, nothing moves
+        rng = np.random.default_rng(7)
+        scene = textured_scene()
+        profile = frame_scores(np.stack([noisy(scene, rng, 0.5) for _ in range(21)]), 1)
+        chunks = [static_chunk(0, 20), static_chunk(20, 40), static_chunk(40, 60)]
+
+        idle = prefilter_chunks(chunks, profile)
+        self.assertEqual(idle, chunks[:1])
+        self.assertIsNone(chunk_motion(profile, 40, 60))
+
+
+class FakeAnalyzer:
+    """Records every call the pipeline makes, the clip bytes are its URL"""
+
+    def __init__(
+        self,
+        cached=(),
+        response_cache=None,
+        fail_download=(),
+        fail_upload=(),
+        fail_inference=(),
+    ):
+        self.cached = dict(cached)
+        self.response_cache = response_cache
+        self.fail_download = set(fail_download)
+        self.fail_upload = set(fail_upload)
+        self.fail_inference = set(fail_inference)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def record(self, *call):
+        with self.lock:
+            self.calls.append(call)
+
+    def download_to_file(self, url):
+        self.record("download", url)
+        if url in self.fail_download:
+            raise RuntimeError(f"download of {url} failed")
+        return f"/nonexistent/{url}", f"hash-{url}"
+
+    def stream_to_asset(self, url, description):
+        self.record("stream", url)
+        return f"asset-{url}", f"hash-{url}"
+
+    def _upload_asset(self, path, description):
+        self.record("upload", path)
+        if path.rsplit("/", 1)[-1] in self.fail_upload:
+            raise RuntimeError(f"upload of {path} failed")
+        return f"asset-{path.rsplit('/', 1)[-1]}"
+
+    def _run_inference(self, asset_id, query):
+        self.record("inference", asset_id)
+        if asset_id in self.fail_inference:
+            raise RuntimeError(f"inference of {asset_id} failed")
+        return vlm_response(f"described {asset_id}")
+
+    def cached_response(self, content_hash, query):
+        return self.cached.get(content_hash)
+
+    def store_response(self, content_hash, query, response):
+        self.record("store", content_hash)
+
+    def release_asset(self, asset_id):
+        self.record("release", asset_id)
+
+    def called(self, name):
+        return sorted(call[1] for call in self.calls if call[0] == name)
+
+
+def pipeline_chunks(count):
+    return [Chunk(n, n * 30, n * 30 + 30, url=f"clip{n}") for n in range(count)]
+
+
+SERIAL = {"download": 1, "upload": 1, "inference": 1, "delete": 1}
+
+
+@override_settings(CHUNK_STREAM_UPLOADS=False)
+class PipelineTests(SimpleTestCase):
+    def test_chunks_pass_through_every_stage(self):
+        analyzer = FakeAnalyzer()
+        started, saved, progress = [], [], []
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as segment:
+            segment.write(b"locally cut")
+        chunks = pipeline_chunks(3)
+        # Cut from a local copy, so it starts at the upload stage
+        chunks[2].url, chunks[2].temp_file = None, segment.name
+
+        results = ChunkPipeline(analyzer).run(
+            chunks,
+            progress=lambda done, total: progress.append((done, total)),
+            checkpoint=lambda chunk: saved.append(chunk.index),
+            on_start=lambda chunk: started.append(chunk.index),
+        )
+
+        self.assertEqual(analyzer.called("download"), ["clip0", "clip1"])
+        self.assertEqual(
+            analyzer.called("upload"),
+            sorted(["/nonexistent/clip0", "/nonexistent/clip1", segment.name]),
+        )
+        assets = sorted(
+            ["asset-clip0", "asset-clip1", f"asset-{os.path.basename(segment.name)}"]
+        )
+        self.assertEqual(analyzer.called("inference"), assets)
+        self.assertEqual(analyzer.called("release"), assets)
+        self.assertEqual(len(analyzer.called("store")), 3)
+        self.assertFalse(os.path.exists(segment.name))
+
+        self.assertEqual([r["start_time_seconds"] for r in results], [0, 30, 60])
+        self.assertEqual(sorted(started), [0, 1, 2])
+        self.assertEqual(sorted(saved), [0, 1, 2])
+        self.assertEqual(progress[-1], (3, 3))
+
+    def test_failure_skips_the_chunks_behind_it(self):
+        analyzer = FakeAnalyzer(fail_download={"clip0"})
+        chunks = pipeline_chunks(3)
+        saved = []
+
+        with self.assertRaisesRegex(RuntimeError, "download of clip0 failed"):
+            ChunkPipeline(analyzer, concurrency=SERIAL).run(
+                chunks, checkpoint=saved.append
+            )
+
+        # Every chunk still leaves the pipeline, so it can be checkpointed
+        self.assertEqual(sorted(c.index for c in saved), [0, 1, 2])
+        self.assertEqual(analyzer.called("download"), ["clip0"])
+        self.assertEqual(analyzer.called("upload"), [])
+        self.assertIsInstance(chunks[0].error, RuntimeError)
+        self.assertIsInstance(chunks[1].error, ChunkSkipped)
+        self.assertIsInstance(chunks[2].error, ChunkSkipped)
+
+    def test_failed_inference_still_releases_the_asset(self):
+        analyzer = FakeAnalyzer(fail_inference={"asset-clip0"})
+
+        with self.assertRaises(RuntimeError):
+            ChunkPipeline(analyzer).run(pipeline_chunks(1))
+
+        self.assertEqual(analyzer.called("release"), ["asset-clip0"])
+        self.assertEqual(analyzer.called("store"), [])
+
+
+@override_settings(CHUNK_STREAM_UPLOADS=True)
+class PipelineCacheTests(SimpleTestCase):
+    def test_cache_hit_skips_the_upload(self):
+        analyzer = FakeAnalyzer(
+            cached={"hash-clip1": vlm_response("from cache")},
+            response_cache=object(),
+        )
+        results = ChunkPipeline(analyzer).run(pipeline_chunks(3))
+
+        self.assertEqual(analyzer.called("stream"), [])
+        self.assertEqual(analyzer.called("download"), ["clip0", "clip1", "clip2"])
+        self.assertEqual(
+            analyzer.called("upload"), ["/nonexistent/clip0", "/nonexistent/clip2"]
+        )
+        self.assertEqual(analyzer.called("inference"), ["asset-clip0", "asset-clip2"])
+        self.assertEqual(results[1]["analysis"], vlm_response("from cache"))
+
+    def test_streams_without_a_response_cache(self):
+        analyzer = FakeAnalyzer()
+        ChunkPipeline(analyzer).run(pipeline_chunks(2))
+
+        self.assertEqual(analyzer.called("stream"), ["clip0", "clip1"])
+        self.assertEqual(analyzer.called("download"), [])
+
+
+class VideoStoreCacheTests(SimpleTestCase):
+    def test_cache_can_be_forced_either_way(self):
+        loaded = cached_video(2)
+        with mock.patch.object(VideoStore, "_load", return_value=loaded), mock.patch(
+            "videos.vector_store.vector_cache", VectorCache(max_bytes=2**20, ttl=60)
+        ) as cache:
+            cache.listening = True
+            self.assertIsNone(VideoStore(1, cache=False)._cached())
+            self.assertIs(VideoStore(1, cache=True)._cached(), loaded)
+
+    @override_settings(VECTOR_CACHE_ENABLED=True, VECTOR_CACHE_TEXT_SEARCH=False)
+    def test_text_search_stays_on_the_database_by_default(self):
+        loaded = cached_video(2)
+        with mock.patch.object(VideoStore, "_load", return_value=loaded), mock.patch(
+            "videos.vector_store.vector_cache", VectorCache(max_bytes=2**20, ttl=60)
+        ) as cache:
+            cache.listening = True
+            store = VideoStore(1)
+            self.assertIs(store._cached(), loaded)
+            self.assertIsNone(store._cached(text_search=True))
+            self.assertIs(VideoStore(1, cache=True)._cached(text_search=True), loaded)
+
+    def test_first_collection_creates_the_text_index(self):
+        engine = mock.MagicMock()
+        db = engine.connect.return_value.__enter__.return_value
+        db.execute.return_value.one.return_value = ("uuid", None)
+        vector_store.collection_uuid.cache_clear()
+        vector_store.ensure_text_index.cache_clear()
+        self.addCleanup(vector_store.collection_uuid.cache_clear)
+        self.addCleanup(vector_store.ensure_text_index.cache_clear)
+        with mock.patch("videos.vector_store.get_vector_store"), mock.patch(
+            "videos.vector_store.get_vector_engine", return_value=engine
+        ), mock.patch("videos.vector_store.check_signature"):
+            vector_store.collection_uuid("video_id_1")
+            vector_store.collection_uuid("video_id_2")
+        statements = [
+            str(call.args[0])
+            for call in engine.begin.return_value.__enter__.return_value.execute.call_args_list
+        ]
+        self.assertEqual(len(statements), 1)
+        self.assertIn("USING gin (to_tsvector(", statements[0])
+
+
+class SegmentChunksTests(SimpleTestCase):
+    def test_only_pending_runs_are_segmented(self):
+        def segment_video(source_path, intervals, output_dir, end=None):
+            calls.append((intervals, end))
+            return [
+                (f"{output_dir}/{start}.mp4", start, stop) for start, stop in intervals
+            ]
+
+        calls = []
+        # Chunk 1 was analyzed before the resume, chunks 0, 2 and 3 are left
+        chunks = [
+            Chunk(index=index, start_time_seconds=start, end_time_seconds=start + 5)
+            for index, start in [(3, 15), (0, 0), (2, 10)]
+        ]
+        with mock.patch("videos.analysis.segment_video", side_effect=segment_video):
+            with mock.patch("videos.analysis.os.makedirs"):
+                segment_chunks("/tmp/video.mp4", chunks, "/tmp/work", 20)
+
+        self.assertEqual(calls, [([(0, 5)], 5), ([(10, 15), (15, 20)], None)])
+        paths = {chunk.index: chunk.temp_file for chunk in chunks}
+        self.assertEqual(
+            paths,
+            {
+                0: "/tmp/work/run_0/0.mp4",
+                2: "/tmp/work/run_1/10.mp4",
+                3: "/tmp/work/run_1/15.mp4",
+            },
+        )
+
+
+class AimdLimiterTests(SimpleTestCase):
+    def test_grows_by_about_one_per_window_of_successes(self):
+        limiter = AimdLimiter(initial=2, minimum=1, maximum=3)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(succeeded=True)
+        self.assertEqual(int(limiter.limit), 3)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(succeeded=True)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_throttling_halves_down_to_the_minimum(self):
+        limiter = AimdLimiter(initial=8, minimum=2, maximum=8)
+        limits = []
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(throttled=True)
+            limits.append(limiter.limit)
+        self.assertEqual(limits, [4, 2, 2, 2])
+
+    def test_acquire_waits_for_a_free_slot(self):
+        limiter = AimdLimiter(initial=1, minimum=1, maximum=1)
+        limiter.acquire()
+        acquired = threading.Event()
+        waiter = threading.Thread(
+            target=lambda: (limiter.acquire(), acquired.set()), daemon=True
+        )
+        waiter.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        waiter.join()
+
+
+class InferenceSchedulerTests(SimpleTestCase):
+    def scheduler(self, **kwargs):
+        options = dict(
+            rate=0,
+            burst=1,
+            initial_concurrency=2,
+            min_concurrency=1,
+            max_concurrency=4,
+            global_concurrency=0,
+            max_attempts=3,
+            backoff_base=0,
+            backoff_max=0,
+        )
+        return InferenceScheduler(**{**options, **kwargs})
+
+    def test_at_least_one_attempt(self):
+        with self.assertRaises(ValueError):
+            self.scheduler(max_attempts=0)
+
+    def test_gives_up_after_max_attempts(self):
+        fn = mock.Mock(side_effect=TransientError("503"))
+        scheduler = self.scheduler()
+        with self.assertRaises(TransientError):
+            scheduler.call(fn)
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(scheduler.stats()["failures"], 1)
+
+    def test_throttled_call_is_retried_with_a_lower_limit(self):
+        fn = mock.Mock(side_effect=[RateLimitedError("429"), "described"])
+        scheduler = self.scheduler()
+        self.assertEqual(scheduler.call(fn), "described")
+        stats = scheduler.stats()
+        self.assertEqual((stats["throttled"], stats["retries"]), (1, 1))
+        # Halved from 2 by the 429, then +1/limit for the success
+        self.assertEqual(scheduler.limiter.limit, 2)
+
+
+class NvidiaInferenceTests(SimpleTestCase):
+    @override_settings(NVIDIA_INFERENCE_TIMEOUT_SECONDS=42)
+    def test_inference_request_has_a_timeout(self):
+        analyzer = NvidiaAnalyzer.__new__(NvidiaAnalyzer)
+        analyzer.api_key = "key"
+        analyzer.invoke_url = "https://example.com/invoke"
+        analyzer.inference_params = {}
+        client = mock.Mock()
+        client.post.return_value.status_code = 200
+        with mock.patch("videos.nvidia_analyzer.get_api_client", return_value=client):
+            analyzer._post_inference("asset", "Describe the scene")
+        self.assertEqual(client.post.call_args.kwargs["timeout"], 42)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        # jobs.py imports every agent, only load it for these tests
+        from . import jobs
+
+        self.jobs = jobs
+        self.video = Video.objects.create(
+            title="t", description="", video_url="https://example.com/a.mp4"
+        )
+
+    def test_enqueue_returns_the_active_job_of_the_video(self):
+        job = self.jobs.enqueue(Job.KIND_EMBED, video=self.video)
+        self.assertEqual(self.jobs.enqueue(Job.KIND_EMBED, video=self.video), job)
+        self.assertNotEqual(self.jobs.enqueue(Job.KIND_ANALYZE, video=self.video), job)
+
+    def test_claims_the_oldest_runnable_job(self):
+        now = timezone.now()
+        later = Job.objects.create(kind=Job.KIND_EMBED, run_after=now + timedelta(1))
+        newer = Job.objects.create(kind=Job.KIND_EMBED, run_after=now)
+        older = Job.objects.create(kind=Job.KIND_EMBED, run_after=now - timedelta(1))
+        other = Job.objects.create(kind=Job.KIND_ANALYZE, run_after=now)
+
+        job = self.jobs.claim_next("worker-1", kinds=[Job.KIND_EMBED])
+        self.assertEqual(job, older)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.worker, job.attempts),
+            (Job.STATUS_RUNNING, "worker-1", 1),
+        )
+        self.assertIsNotNone(job.heartbeat_at)
+
+        self.assertEqual(self.jobs.claim_next("worker-2", [Job.KIND_EMBED]), newer)
+        # Not due yet, and the analyze job is of a kind this worker doesn't run
+        self.assertIsNone(self.jobs.claim_next("worker-3", [Job.KIND_EMBED]))
+        self.assertEqual(self.jobs.claim_next("worker-3"), other)
+        self.assertEqual(Job.objects.get(pk=later.pk).status, Job.STATUS_QUEUED)
+
+    @override_settings(JOB_RETRY_BACKOFF_SECONDS=30)
+    def test_failed_job_is_retried_with_backoff_then_failed(self):
+        job = Job.objects.create(kind=Job.KIND_EMBED, max_attempts=2)
+        handler = mock.Mock(side_effect=RuntimeError("embeddings API down"))
+        with mock.patch.dict(self.jobs.JOB_HANDLERS, {Job.KIND_EMBED: handler}):
+            self.jobs.run_job(self.jobs.claim_next("worker"))
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.STATUS_QUEUED)
+            self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+            self.assertIsNone(self.jobs.claim_next("worker"))
+
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.jobs.run_job(self.jobs.claim_next("worker"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+        self.assertEqual(job.error, "embeddings API down")
+
+    def test_permanent_error_fails_at_once(self):
+        job = Job.objects.create(kind=Job.KIND_ANALYZE, max_attempts=3)
+        handler = mock.Mock(side_effect=AnalysisError("not a Cloudinary URL"))
+        with mock.patch.dict(self.jobs.JOB_HANDLERS, {Job.KIND_ANALYZE: handler}):
+            self.jobs.run_job(self.jobs.claim_next("worker"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 1))
+
+    @override_settings(JOB_STALE_SECONDS=600)
+    def test_stale_jobs_are_requeued_or_failed(self):
+        now = timezone.now()
+        running = dict(status=Job.STATUS_RUNNING, worker="lost", max_attempts=3)
+        stale = Job.objects.create(
+            kind=Job.KIND_EMBED,
+            attempts=1,
+            heartbeat_at=now - timedelta(hours=1),
+            **running,
+        )
+        exhausted = Job.objects.create(
+            kind=Job.KIND_EMBED,
+            attempts=3,
+            heartbeat_at=now - timedelta(hours=1),
+            **running,
+        )
+        alive = Job.objects.create(
+            kind=Job.KIND_EMBED, attempts=1, heartbeat_at=now, **running
+        )
+
+        self.assertEqual(self.jobs.requeue_stale_jobs(), 2)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker), (Job.STATUS_QUEUED, None))
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, Job.STATUS_FAILED)
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, Job.STATUS_RUNNING)
+        self.assertEqual(self.jobs.claim_next("worker"), stale)
+
+
+class AssetCollectorTests(TestCase):
+    def setUp(self):
+        self.delete_asset = mock.Mock()
+        self.collector = AssetCollector(
+            self.delete_asset,
+            batch_size=10,
+            interval=1,
+            max_attempts=2,
+            retry_backoff=60,
+            orphan_seconds=3600,
+            sweep_untracked=False,
+            description="Video analysis",
+        )
+        # Collect in the test's thread, never in the background one
+        patcher = mock.patch.object(AssetCollector, "start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def state(self, asset_id):
+        return NvcfAsset.objects.get(asset_id=asset_id).state
+
+    def test_only_released_assets_are_deleted(self):
+        released, active = uuid.uuid4(), uuid.uuid4()
+        self.collector.register(released)
+        self.collector.register(active)
+        self.collector.release(released)
+
+        self.assertEqual(self.collector.collect(), 1)
+        self.delete_asset.assert_called_once_with(released)
+        self.assertEqual(self.state(released), NvcfAsset.STATE_DELETED)
+        self.assertEqual(self.state(active), NvcfAsset.STATE_ACTIVE)
+
+    def test_failed_delete_is_retried_then_given_up(self):
+        asset_id = uuid.uuid4()
+        self.collector.release(asset_id)
+        self.delete_asset.side_effect = RuntimeError("503")
+
+        self.collector.collect()
+        asset = NvcfAsset.objects.get(asset_id=asset_id)
+        self.assertEqual((asset.state, asset.attempts), (NvcfAsset.STATE_RELEASED, 1))
+        self.assertGreater(asset.delete_after, timezone.now())
+        # Backing off, nothing is due yet
+        self.assertEqual(self.collector.collect(), 0)
+
+        NvcfAsset.objects.filter(pk=asset.pk).update(delete_after=timezone.now())
+        self.collector.collect()
+        self.assertEqual(self.state(asset_id), NvcfAsset.STATE_FAILED)
+
+    def test_missing_asset_counts_as_deleted(self):
+        asset_id = uuid.uuid4()
+        self.collector.release(asset_id)
+        error = RuntimeError("404")
+        error.response = SimpleNamespace(status_code=404)
+        self.delete_asset.side_effect = error
+
+        self.collector.collect()
+        self.assertEqual(self.state(asset_id), NvcfAsset.STATE_DELETED)
+
+    def test_orphans_and_untracked_assets_are_released(self):
+        orphan, fresh = uuid.uuid4(), uuid.uuid4()
+        self.collector.register(orphan)
+        self.collector.register(fresh)
+        NvcfAsset.objects.filter(asset_id=orphan).update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+        untracked, foreign = uuid.uuid4(), uuid.uuid4()
+        self.collector.sweep_untracked = True
+        self.collector.list_assets = lambda: [
+            {"assetId": str(untracked), "description": "Video analysis"},
+            {"assetId": str(foreign), "description": "Another deployment"},
+            {"assetId": str(fresh), "description": "Video analysis"},
+        ]
+
+        self.assertEqual(self.collector.sweep_orphans(), 2)
+        self.assertEqual(self.state(orphan), NvcfAsset.STATE_RELEASED)
+        self.assertEqual(self.state(fresh), NvcfAsset.STATE_ACTIVE)
+        self.assertFalse(NvcfAsset.objects.filter(asset_id=foreign).exists())
+        # Untracked assets get the orphan grace period before they are deleted
+        self.assertEqual(self.collector.collect(), 1)
+        self.delete_asset.assert_called_once_with(orphan)
+
+
+@override_settings(
+    VECTOR_STORE_MODE="shared", VECTOR_QUANTIZATION="halfvec", VECTOR_RERANK_FACTOR=4
+)
+class SearchMomentsTests(SimpleTestCase):
+    def search(self, **kwargs):
+        engine = mock.MagicMock()
+        db = engine.begin.return_value.__enter__.return_value
+        db.execute.return_value.all.return_value = [
+            (
+                "doc-1",
+                "A man falls",
+                {"video_id": 7, "start_time_seconds": 30, "end_time_seconds": 60},
+                "shared",
+                0.25,
+            )
+        ]
+        with mock.patch(
+            "videos.vector_store.get_vector_engine", return_value=engine
+        ), mock.patch(
+            "videos.vector_store.collection_uuid", return_value="uuid"
+        ), mock.patch(
+            "videos.vector_store.embedding_signature",
+            return_value={"embedding_dimensions": 4},
+        ):
+            hits = vector_store.search_moments([0.1, 0.2, 0.3, 0.4], **kwargs)
+        return hits, [call.args for call in db.execute.call_args_list]
+
+    def test_filtered_search_scans_the_videos_exactly(self):
+        hits, calls = self.search(video_ids=[7, 8])
+
+        self.assertEqual(len(calls), 1)
+        statement, params = calls[0]
+        self.assertIn("AS MATERIALIZED", str(statement))
+        self.assertNotIn("halfvec", str(statement))
+        self.assertEqual(params["keys"], ["7", "8"])
+        self.assertEqual(
+            hits,
+            [
+                {
+                    "id": "doc-1",
+                    "video_id": 7,
+                    "start_time_seconds": 30,
+                    "end_time_seconds": 60,
+                    "document": "A man falls",
+                    "distance": 0.25,
+                }
+            ],
+        )
+
+    def test_search_of_every_video_uses_the_index_and_reranks(self):
+        _, calls = self.search(limit=20, offset=10)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(str(calls[0][0]), "SET LOCAL hnsw.ef_search = 120")
+        statement, params = calls[1]
+        self.assertIn("::halfvec(4)", str(statement))
+        self.assertNotIn("MATERIALIZED", str(statement))
+        self.assertEqual(params["candidates"], 120)
+
+    def test_no_videos_finds_nothing(self):
+        hits, calls = self.search(video_ids=[])
+        self.assertEqual((hits, calls), ([], []))
@@ -1,11 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import VideoViewSet
+from .views import JobViewSet, SearchViewSet, VideoViewSet
 
 # Create a router and register our viewset
 router = DefaultRouter()
 router.register(r"videos", VideoViewSet, basename="video")
+router.register(r"jobs", JobViewSet, basename="job")
+router.register(r"search", SearchViewSet, basename="search")
 
 # The API URLs are determined automatically by the router
 urlpatterns = [
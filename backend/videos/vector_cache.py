@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+from django.conf import settings
+from langchain_core.documents import Document
+
+from .embedding_backends import STOP_WORDS, TOKEN_PATTERN
+from .events import EMBEDDING_DONE, EMBEDDING_PROGRESS, hub
+
+logger = logging.getLogger(__name__)
+
+# Embedding events that mean a video's stored vectors changed
+INVALIDATING_EVENTS = (EMBEDDING_PROGRESS, EMBEDDING_DONE)
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def rrf(rankings, k, constant):
+    """Reciprocal rank fusion of several rankings (lists of row numbers)"""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] += 1.0 / (constant + rank)
+    return [row for row, _ in scores.most_common(k)]
+
+
+class CachedVideo:
+    """
+    A video's chunk documents and their vectors as one contiguous, row
+    normalized float32 matrix, so exact cosine top-k is a single matrix
+    product.
+    """
+
+    def __init__(self, ids, documents, metadatas, vectors):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        if ids:
+            self.matrix = _normalize(
+                np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+            )
+        else:
+            # A video with no stored chunks yet: nothing to reshape or rank
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.words = [Counter(TOKEN_PATTERN.findall(d.lower())) for d in documents]
+        self.loaded_at = time.monotonic()
+        self.nbytes = self.matrix.nbytes + sum(len(d) for d in documents)
+
+    def _documents(self, rows):
+        return [
+            Document(
+                id=self.ids[row],
+                page_content=self.documents[row],
+                metadata=self.metadatas[row],
+            )
+            for row in rows
+        ]
+
+    def vector_ranking(self, embedding, k):
+        if not self.ids:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        if query.shape[0] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Query has {query.shape[0]} dimensions, the cached vectors "
+                f"{self.matrix.shape[1]}"
+            )
+        similarities = self.matrix @ query
+        k = min(k, len(self.ids))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        return top[np.argsort(-similarities[top])].tolist()
+
+    def text_ranking(self, query, k):
+        """
+        Rows that contain the query's words, most matches first. Words match
+        by prefix ("fall" finds "falls" and "falling"), a rough stand-in for
+        the stemming of the database's full-text search.
+        """
+        terms = [t for t in TOKEN_PATTERN.findall(query.lower()) if t not in STOP_WORDS]
+        if not terms:
+            return []
+        scores = []
+        for row, words in enumerate(self.words):
+            matched = 0
+            score = 0.0
+            for term in terms:
+                count = sum(n for word, n in words.items() if word.startswith(term))
+                if count:
+                    matched += 1
+                    score += 1.0 + np.log(count)
+            if matched:
+                scores.append((matched, score, row))
+        scores.sort(reverse=True)
+        return [row for _, _, row in scores[:k]]
+
+    def similarity_search(self, embedding, k):
+        return self._documents(self.vector_ranking(embedding, k))
+
+    def text_search(self, query, k):
+        return self._documents(self.text_ranking(query, k))
+
+    def hybrid_search(self, query, embedding, k, candidates, constant):
+        rankings = [
+            self.vector_ranking(embedding, candidates),
+            self.text_ranking(query, candidates),
+        ]
+        return self._documents(rrf(rankings, k, constant))
+
+
+class VectorCache:
+    """
+    Per-process LRU of the chunk vectors of recently searched videos, bounded
+    by the bytes it holds. Entries are dropped when an embedding event
+    (embedding_progress or embedding_done) arrives for their video from any
+    process, and expire after ttl seconds in case an event was missed.
+    """
+
+    def __init__(self, max_bytes=None, ttl=None):
+        def setting(value, name):
+            return getattr(settings, name) if value is None else value
+
+        self.max_bytes = setting(max_bytes, "VECTOR_CACHE_MAX_BYTES")
+        self.ttl = setting(ttl, "VECTOR_CACHE_TTL_SECONDS")
+        self.entries = OrderedDict()
+        # Bumped by invalidate (per video) and clear (everything), so a load
+        # that raced an embedding event is returned but not cached
+        self.generations = Counter()
+        self.epoch = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.listening = False
+
+    def get(self, key, load):
+        """
+        The cached entry for key, loaded with load() on a miss.
+
+        Args:
+            key (tuple): (collection name, video_id as a string)
+            load (callable): Returns a CachedVideo from the database
+        """
+        self._listen()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = (self.epoch, self.generations[key[1]])
+
+        entry = load()
+        with self.lock:
+            if generation != (self.epoch, self.generations[key[1]]):
+                return entry
+            self._remove(key)
+            # An empty video is cheap to load and about to get its first chunks
+            if entry.ids and entry.nbytes <= self.max_bytes:
+                self.entries[key] = entry
+                self.bytes += entry.nbytes
+                while self.bytes > self.max_bytes:
+                    self._remove(next(iter(self.entries)))
+        return entry
+
+    def invalidate(self, video_id):
+        with self.lock:
+            self.generations[str(video_id)] += 1
+            for key in [key for key in self.entries if key[1] == str(video_id)]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            self.epoch += 1
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "videos": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.nbytes
+
+    def _listen(self):
+        if self.listening:
+            return
+        self.listening = True
+        hub.add_listener(self._on_event)
+
+    def _on_event(self, event):
+        if event.get("type") in INVALIDATING_EVENTS:
+            self.invalidate(event.get("video_id"))
+
+
+vector_cache = VectorCache()
@@ -0,0 +1,605 @@
+import logging
+import re
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from langchain_core.documents import Document
+from sqlalchemy import bindparam, text
+
+from .clients import get_embeddings, get_vector_engine, get_vector_store
+from .embedding_backends import (
+    EmbeddingMismatchError,
+    check_signature,
+    embedding_signature,
+)
+from .vector_cache import CachedVideo, vector_cache
+
+logger = logging.getLogger(__name__)
+
+# pgvector can't build an HNSW index on more dimensions than this with the
+# vector type, larger embeddings are indexed as half precision (up to 4000)
+MAX_VECTOR_INDEX_DIMENSIONS = 2000
+VIDEO_INDEX_NAME = "ix_langchain_pg_embedding_video"
+# Candidate search of cross-video search: "none" searches the HNSW index of
+# the full vectors, "halfvec" and "binary" an index of half precision or
+# sign-bit vectors and rerank the candidates with the full vectors. "exact"
+# scans without an index, it is the reference of benchmark_quantization.
+QUANTIZATIONS = ("none", "halfvec", "binary", "exact")
+
+
+def shared_mode():
+    return settings.VECTOR_STORE_MODE == "shared"
+
+
+def collection_for(video_id):
+    """The PGVector collection that holds a video's chunk documents"""
+    if shared_mode():
+        return settings.VECTOR_SHARED_COLLECTION
+    return f"video_id_{video_id}"
+
+
+@lru_cache(maxsize=1024)
+def collection_uuid(name):
+    """
+    UUID of a PGVector collection, created if it doesn't exist yet. Raises
+    EmbeddingMismatchError if its vectors come from other embeddings than
+    the configured ones.
+    """
+    get_vector_store(name)
+    ensure_text_index()
+    with get_vector_engine().connect() as db:
+        uuid, metadata = db.execute(
+            text(
+                "SELECT uuid, cmetadata FROM langchain_pg_collection "
+                "WHERE name = :name"
+            ),
+            {"name": name},
+        ).one()
+    check_signature(name, metadata)
+    return uuid
+
+
+def prepare_collection(video_id):
+    """
+    Make sure a video's collection can take vectors of the configured
+    embeddings. A per-video collection of other embeddings is dropped so the
+    video is re-embedded from scratch, the shared collection never is: point
+    VECTOR_SHARED_COLLECTION to a new collection and run embed_backlog.
+    """
+    name = collection_for(video_id)
+    try:
+        return collection_uuid(name)
+    except EmbeddingMismatchError as e:
+        if shared_mode():
+            raise
+        logger.warning(f"{e} Dropping it")
+        get_vector_store(name).delete_collection()
+        get_vector_store.cache_clear()
+        return collection_uuid(name)
+
+
+def stored_ids_by_video(video_ids):
+    """
+    Ids of the documents already stored for each video, in one query.
+
+    Returns:
+        dict: {video_id: set of document ids}
+    """
+    stored = {video_id: set() for video_id in video_ids}
+    if not stored:
+        return stored
+    if shared_mode():
+        query = text(
+            "SELECT e.cmetadata->>'video_id', e.id FROM langchain_pg_embedding e "
+            "JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+            "WHERE c.name = :name AND e.cmetadata->>'video_id' IN :keys"
+        )
+        params = {"name": settings.VECTOR_SHARED_COLLECTION}
+        keys = {str(video_id): video_id for video_id in stored}
+    else:
+        query = text(
+            "SELECT c.name, e.id FROM langchain_pg_embedding e "
+            "JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+            "WHERE c.name IN :keys"
+        )
+        params = {}
+        keys = {collection_for(video_id): video_id for video_id in stored}
+    query = query.bindparams(bindparam("keys", expanding=True))
+    with get_vector_engine().connect() as db:
+        for key, doc_id in db.execute(query, {**params, "keys": list(keys)}):
+            stored[keys[key]].add(doc_id)
+    return stored
+
+
+def vector_literal(embedding):
+    return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+
+def text_search_config():
+    """Postgres text search configuration, inlined so it matches the index"""
+    config = settings.RETRIEVAL_TEXT_SEARCH_CONFIG
+    if not re.fullmatch(r"[a-z_]+", config):
+        raise ValueError(f"Invalid RETRIEVAL_TEXT_SEARCH_CONFIG {config!r}")
+    return config
+
+
+class VideoStore:
+    """
+    Retrieval over one video's chunk documents, in its own collection or in
+    the shared one. search() is the retrieval every agent and the chat agent
+    use, similarity_search() is plain vector search like PGVector's.
+
+    In the shared collection the video is selected with the video_id index
+    (see ensure_indexes), so a search only ever scans that video's rows and
+    its latency doesn't grow with the number of videos.
+
+    With VECTOR_CACHE_ENABLED the video's vectors are loaded once into the
+    in-process vector cache and searched there with NumPy, repeated
+    retrievals on a hot video don't touch the database. Full-text and hybrid
+    retrieval stay on the database's tsvector index unless
+    VECTOR_CACHE_TEXT_SEARCH is set too.
+    """
+
+    def __init__(self, video_id, cache=None):
+        self.video_id = video_id
+        self.collection_name = collection_for(video_id)
+        # None follows the settings, True / False force either path
+        if cache is None:
+            self.cache = settings.VECTOR_CACHE_ENABLED
+            self.text_cache = self.cache and settings.VECTOR_CACHE_TEXT_SEARCH
+        else:
+            self.cache = self.text_cache = cache
+
+    def _where(self):
+        video_clause = (
+            " AND e.cmetadata->>'video_id' = :video_id" if shared_mode() else ""
+        )
+        return f"e.collection_id = :collection{video_clause}"
+
+    def _params(self, **params):
+        return {
+            "collection": collection_uuid(self.collection_name),
+            "video_id": str(self.video_id),
+            **params,
+        }
+
+    def _fetch(self, statement, params):
+        with get_vector_engine().connect() as db:
+            rows = db.execute(statement, params).all()
+        return [
+            Document(id=doc_id, page_content=document, metadata=metadata or {})
+            for doc_id, document, metadata in rows
+        ]
+
+    def _load(self):
+        """Every document and vector of the video, for the vector cache"""
+        statement = text(
+            "SELECT e.id, e.document, e.cmetadata, e.embedding::text "
+            f"FROM langchain_pg_embedding e WHERE {self._where()}"
+        )
+        with get_vector_engine().connect() as db:
+            rows = db.execute(statement, self._params()).all()
+        return CachedVideo(
+            ids=[row[0] for row in rows],
+            documents=[row[1] for row in rows],
+            metadatas=[row[2] or {} for row in rows],
+            vectors=[
+                np.array(row[3][1:-1].split(","), dtype=np.float32) for row in rows
+            ],
+        )
+
+    def _cached(self, text_search=False):
+        """
+        The video's vector cache entry, or None when the cache is disabled
+        (for full-text matching if text_search)
+        """
+        if not (self.text_cache if text_search else self.cache):
+            return None
+        return vector_cache.get((self.collection_name, str(self.video_id)), self._load)
+
+    def search(self, query, k=4):
+        """
+        Hybrid retrieval: vector and full-text candidates merged with
+        reciprocal rank fusion (or vector only with RETRIEVAL_MODE=vector)
+        """
+        embedding = embed_search_query(query)
+        if settings.RETRIEVAL_MODE != "hybrid":
+            return self.similarity_search_by_vector(embedding, k)
+        return self.hybrid_search(query, embedding, k)
+
+    def similarity_search(self, query, k=4):
+        return self.similarity_search_by_vector(get_embeddings().embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        cached = self._cached()
+        if cached is not None:
+            return cached.similarity_search(embedding, k)
+        statement = text(
+            "SELECT e.id, e.document, e.cmetadata FROM langchain_pg_embedding e "
+            f"WHERE {self._where()} "
+            "ORDER BY e.embedding <=> CAST(:embedding AS vector) LIMIT :k"
+        )
+        return self._fetch(
+            statement, self._params(embedding=vector_literal(embedding), k=k)
+        )
+
+    def text_search(self, query, k=4):
+        """Full-text matches only, best ts_rank_cd first"""
+        cached = self._cached(text_search=True)
+        if cached is not None:
+            return cached.text_search(query, k)
+        config = text_search_config()
+        tsvector = f"to_tsvector('{config}', e.document)"
+        statement = text(
+            "SELECT e.id, e.document, e.cmetadata FROM langchain_pg_embedding e, "
+            f"websearch_to_tsquery('{config}', :query) AS q "
+            f"WHERE {self._where()} AND {tsvector} @@ q "
+            f"ORDER BY ts_rank_cd({tsvector}, q) DESC LIMIT :k"
+        )
+        return self._fetch(statement, self._params(query=query, k=k))
+
+    def hybrid_search(self, query, embedding, k=4):
+        """
+        Reciprocal rank fusion of the RETRIEVAL_CANDIDATES nearest vectors and
+        the RETRIEVAL_CANDIDATES best full-text matches, in one round trip.
+        A document scores sum(1 / (RETRIEVAL_RRF_K + rank)) over both lists,
+        so exact terms like "knife" surface even when their embedding isn't
+        the nearest one. The full-text side uses the tsvector GIN index.
+
+        With VECTOR_CACHE_TEXT_SEARCH both rankings are computed in memory on
+        a vector cache hit, the full-text side matching query words by prefix
+        instead of stemming.
+        """
+        cached = self._cached(text_search=True)
+        if cached is not None:
+            return cached.hybrid_search(
+                query,
+                embedding,
+                k,
+                max(settings.RETRIEVAL_CANDIDATES, k),
+                settings.RETRIEVAL_RRF_K,
+            )
+        config = text_search_config()
+        tsvector = f"to_tsvector('{config}', e.document)"
+        statement = text(
+            "WITH vec AS ("
+            "  SELECT e.id, ROW_NUMBER() OVER ("
+            "    ORDER BY e.embedding <=> CAST(:embedding AS vector)) AS rank"
+            f"  FROM langchain_pg_embedding e WHERE {self._where()}"
+            "  ORDER BY e.embedding <=> CAST(:embedding AS vector) LIMIT :candidates"
+            "), lex AS ("
+            "  SELECT e.id, ROW_NUMBER() OVER ("
+            f"    ORDER BY ts_rank_cd({tsvector}, q) DESC) AS rank"
+            "  FROM langchain_pg_embedding e,"
+            f"    websearch_to_tsquery('{config}', :query) AS q"
+            f"  WHERE {self._where()} AND {tsvector} @@ q"
+            f"  ORDER BY ts_rank_cd({tsvector}, q) DESC LIMIT :candidates"
+            ") "
+            "SELECT e.id, e.document, e.cmetadata FROM vec FULL JOIN lex USING (id) "
+            "JOIN langchain_pg_embedding e ON e.id = COALESCE(vec.id, lex.id) "
+            "ORDER BY COALESCE(1.0 / (:rrf_k + vec.rank), 0) "
+            "+ COALESCE(1.0 / (:rrf_k + lex.rank), 0) DESC LIMIT :k"
+        )
+        return self._fetch(
+            statement,
+            self._params(
+                embedding=vector_literal(embedding),
+                query=query,
+                candidates=max(settings.RETRIEVAL_CANDIDATES, k),
+                rrf_k=settings.RETRIEVAL_RRF_K,
+                k=k,
+            ),
+        )
+
+
+def get_video_store(video_id, cache=None):
+    return VideoStore(video_id, cache=cache)
+
+
+def index_vector_type(dimensions):
+    """pgvector type the HNSW index stores vectors of this size as"""
+    if dimensions > MAX_VECTOR_INDEX_DIMENSIONS:
+        return f"halfvec({dimensions})"
+    return f"vector({dimensions})"
+
+
+def quantization_mode(quantization=None):
+    quantization = quantization or settings.VECTOR_QUANTIZATION
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(
+            f"Invalid vector quantization {quantization!r}, "
+            f"expected one of {', '.join(QUANTIZATIONS)}"
+        )
+    return quantization
+
+
+def quantized_type(dimensions, quantization=None):
+    """pgvector type candidate search compares vectors of this size as"""
+    quantization = quantization_mode(quantization)
+    if quantization == "halfvec":
+        return f"halfvec({dimensions})"
+    if quantization == "binary":
+        return f"bit({dimensions})"
+    return index_vector_type(dimensions)
+
+
+def quantize(expression, dimensions, quantization=None):
+    """SQL of a vector expression as the type of candidate search"""
+    vector_type = quantized_type(dimensions, quantization)
+    if vector_type.startswith("bit"):
+        return f"binary_quantize({expression})::{vector_type}"
+    return f"({expression})::{vector_type}"
+
+
+def candidate_distance(dimensions, quantization=None, alias="e."):
+    """
+    Distance that candidate search orders by: cosine over (half precision)
+    vectors, or Hamming distance over their sign bits in binary mode. It
+    matches the expression of the HNSW index, so the index is used.
+    """
+    vector_type = quantized_type(dimensions, quantization)
+    operator = "<~>" if vector_type.startswith("bit") else "<=>"
+    column = quantize(f"{alias}embedding", dimensions, quantization)
+    query = quantize("CAST(:embedding AS vector)", dimensions, quantization)
+    return f"{column} {operator} {query}"
+
+
+def hnsw_expression(dimensions, quantization=None):
+    """Indexed expression and operator class for vectors of this size"""
+    vector_type = quantized_type(dimensions, quantization)
+    base_type = vector_type.split("(")[0]
+    operator_class = (
+        "bit_hamming_ops" if base_type == "bit" else f"{base_type}_cosine_ops"
+    )
+    return f"({quantize('embedding', dimensions, quantization)})", operator_class
+
+
+def hnsw_index_name(collection, dimensions, quantization=None):
+    name = f"ix_langchain_pg_embedding_hnsw_{collection.hex[:12]}_{dimensions}"
+    vector_type = quantized_type(dimensions, quantization)
+    if vector_type != index_vector_type(dimensions):
+        name += f"_{vector_type.split('(')[0]}"
+    return name
+
+
+def ensure_hnsw_index(quantization=None):
+    """
+    Create the HNSW index of the shared collection for a quantization mode,
+    partial on the shared collection, the only one whose vectors are all of
+    the configured size.
+
+    Returns:
+        str: The index name
+    """
+    collection = collection_uuid(settings.VECTOR_SHARED_COLLECTION)
+    dimensions = embedding_signature()["embedding_dimensions"]
+    name = hnsw_index_name(collection, dimensions, quantization)
+    expression, operator_class = hnsw_expression(dimensions, quantization)
+    with get_vector_engine().begin() as db:
+        db.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON langchain_pg_embedding USING hnsw ({expression} "
+                f"{operator_class}) WITH (m = {settings.VECTOR_HNSW_M}, "
+                f"ef_construction = {settings.VECTOR_HNSW_EF_CONSTRUCTION}) "
+                f"WHERE collection_id = '{collection}'"
+            )
+        )
+    return name
+
+
+@lru_cache(maxsize=1)
+def ensure_text_index():
+    """
+    Create the tsvector GIN index of full-text and hybrid retrieval. Every
+    layout needs it, so it is created with the first collection a process
+    uses (see collection_uuid), once per process.
+
+    Returns:
+        str: The index name
+    """
+    config = text_search_config()
+    name = f"ix_langchain_pg_embedding_fts_{config}"
+    with get_vector_engine().begin() as db:
+        db.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {name} ON langchain_pg_embedding "
+                f"USING gin (to_tsvector('{config}', document))"
+            )
+        )
+    return name
+
+
+def ensure_indexes():
+    """
+    Index the shared layout: a btree on (collection, video_id, start time) for
+    per-video retrieval, and the HNSW index of VECTOR_QUANTIZATION for
+    searches across videos (see ensure_hnsw_index). Every layout also gets
+    the tsvector GIN index of hybrid retrieval (see ensure_text_index).
+
+    Returns:
+        list: Names of the indexes that exist afterwards
+    """
+    collection_uuid(settings.VECTOR_SHARED_COLLECTION)
+    with get_vector_engine().begin() as db:
+        db.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {VIDEO_INDEX_NAME} "
+                "ON langchain_pg_embedding (collection_id, (cmetadata->>'video_id'), "
+                "((cmetadata->>'start_time_seconds')::numeric))"
+            )
+        )
+    indexes = [VIDEO_INDEX_NAME, ensure_text_index()]
+    if quantization_mode() != "exact":
+        indexes.insert(1, ensure_hnsw_index())
+    return indexes
+
+
+def migrate_to_shared(dry_run=False):
+    """
+    Move the documents of every per-video collection into the shared
+    collection, adding video_id to their metadata, and drop the emptied
+    collections. Each collection is moved in its own transaction.
+
+    Returns:
+        tuple: (collections moved, documents moved)
+    """
+    shared = collection_uuid(settings.VECTOR_SHARED_COLLECTION)
+    with get_vector_engine().connect() as db:
+        collections = db.execute(
+            text(
+                "SELECT c.uuid, c.name, COUNT(e.id) FROM langchain_pg_collection c "
+                "LEFT JOIN langchain_pg_embedding e ON e.collection_id = c.uuid "
+                "WHERE c.name LIKE 'video\\_id\\_%' GROUP BY c.uuid, c.name"
+            )
+        ).all()
+
+    moved = 0
+    for uuid, name, count in collections:
+        video_id = name[len("video_id_") :]
+        if not video_id.isdigit():
+            continue
+        print(f"{name}: {count} documents")
+        if dry_run:
+            moved += count
+            continue
+        with get_vector_engine().begin() as db:
+            db.execute(
+                text(
+                    "UPDATE langchain_pg_embedding SET collection_id = :shared, "
+                    "cmetadata = COALESCE(cmetadata, '{}'::jsonb) "
+                    "|| jsonb_build_object('video_id', CAST(:video_id AS integer)) "
+                    "WHERE collection_id = :old"
+                ),
+                {"shared": shared, "video_id": video_id, "old": uuid},
+            )
+            db.execute(
+                text("DELETE FROM langchain_pg_collection WHERE uuid = :old"),
+                {"old": uuid},
+            )
+        moved += count
+    # Stores and UUIDs of the dropped collections are no longer valid
+    get_vector_store.cache_clear()
+    collection_uuid.cache_clear()
+    vector_cache.clear()
+    return len(collections), moved
+
+
+@lru_cache(maxsize=1024)
+def embed_search_query(query):
+    """Query embedding, kept so paging through results embeds it only once"""
+    return tuple(get_embeddings().embed_query(query))
+
+
+def search_moments(embedding, video_ids=None, limit=20, offset=0, quantization=None):
+    """
+    Nearest chunk documents of every video, for cross-video search.
+
+    In the shared collection the ordering matches the partial HNSW index, so
+    the search is approximate and its latency stays flat as videos are added.
+    With a halfvec or binary VECTOR_QUANTIZATION the index is searched for
+    VECTOR_RERANK_FACTOR times more candidates than the page needs, which are
+    then reranked by their exact distance on the full vectors. Searches of
+    given videos are exact scans of their documents, found through the
+    video_id btree: HNSW applies filters after the index scan, so a selective
+    filter would leave fewer hits than the page asks for. Per-video
+    collections are scanned exactly, which only scales to a modest number of
+    videos.
+
+    Args:
+        embedding (list): The query embedding
+        video_ids (list, optional): Only search these videos
+        limit (int): Hits returned
+        offset (int): Hits skipped, for paging
+        quantization (str, optional): Overrides VECTOR_QUANTIZATION
+
+    Returns:
+        list: dicts with id, video_id, start_time_seconds, end_time_seconds,
+        document and distance, nearest first
+    """
+    if video_ids is not None and not video_ids:
+        return []
+    params = {"embedding": vector_literal(embedding), "limit": limit, "offset": offset}
+    exact = "e.embedding <=> CAST(:embedding AS vector)"
+    quantization = quantization_mode(quantization)
+    filtered = shared_mode() and video_ids is not None
+    if filtered:
+        quantization = "exact"
+    rerank = shared_mode() and quantization in ("halfvec", "binary")
+    if shared_mode():
+        dimensions = embedding_signature()["embedding_dimensions"]
+        distance = (
+            exact
+            if quantization == "exact"
+            else candidate_distance(dimensions, quantization)
+        )
+        where = "e.collection_id = :collection"
+        params["collection"] = collection_uuid(settings.VECTOR_SHARED_COLLECTION)
+        if video_ids is not None:
+            where += " AND e.cmetadata->>'video_id' IN :keys"
+            params["keys"] = [str(video_id) for video_id in video_ids]
+    else:
+        distance = exact
+        if video_ids is not None:
+            where = "c.name IN :keys"
+            params["keys"] = [collection_for(video_id) for video_id in video_ids]
+        else:
+            where = "c.name LIKE 'video\\_id\\_%'"
+    if rerank:
+        params["candidates"] = (limit + offset) * settings.VECTOR_RERANK_FACTOR
+        statement = text(
+            f"SELECT e.id, e.document, e.cmetadata, e.name, {exact} AS distance "
+            "FROM (SELECT e.id, e.document, e.cmetadata, e.embedding, c.name "
+            "  FROM langchain_pg_embedding e "
+            "  JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+            f"  WHERE {where} ORDER BY {distance} LIMIT :candidates) e "
+            "ORDER BY distance LIMIT :limit OFFSET :offset"
+        )
+    elif filtered:
+        # Materialized, so the planner can't order by the HNSW index and
+        # filter afterwards
+        statement = text(
+            "WITH e AS MATERIALIZED ("
+            "  SELECT e.id, e.document, e.cmetadata, e.embedding, c.name "
+            "  FROM langchain_pg_embedding e "
+            "  JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+            f"  WHERE {where}) "
+            f"SELECT e.id, e.document, e.cmetadata, e.name, {exact} AS distance "
+            "FROM e ORDER BY distance LIMIT :limit OFFSET :offset"
+        )
+    else:
+        statement = text(
+            f"SELECT e.id, e.document, e.cmetadata, c.name, {distance} AS distance "
+            "FROM langchain_pg_embedding e "
+            "JOIN langchain_pg_collection c ON e.collection_id = c.uuid "
+            f"WHERE {where} ORDER BY {distance} LIMIT :limit OFFSET :offset"
+        )
+    if "keys" in params:
+        statement = statement.bindparams(bindparam("keys", expanding=True))
+
+    with get_vector_engine().begin() as db:
+        if shared_mode() and quantization != "exact":
+            # The index has to yield enough candidates for the requested page
+            needed = params.get("candidates", limit + offset)
+            ef_search = max(40, min(needed, 1000))
+            db.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+        rows = db.execute(statement, params).all()
+
+    hits = []
+    for doc_id, document, metadata, name, distance in rows:
+        metadata = metadata or {}
+        video_id = metadata.get("video_id")
+        if video_id is None and name.startswith("video_id_"):
+            video_id = int(name[len("video_id_") :])
+        hits.append(
+            {
+                "id": doc_id,
+                "video_id": video_id,
+                "start_time_seconds": metadata.get("start_time_seconds"),
+                "end_time_seconds": metadata.get("end_time_seconds"),
+                "document": document,
+                "distance": float(distance),
+            }
+        )
+    return hits
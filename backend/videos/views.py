@@ -10,17 +10,30 @@ import cloudinary.api
 import cloudinary.uploader
 from cloudinary import CloudinaryVideo
 from django.conf import settings
-from moviepy import VideoFileClip
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from .agents.chat_agent import create_chat_agent
 from .agents.summarize_agent import run_summarize_agent
+from .analysis import (
+    AnalysisError,
+    AnalysisInProgress,
+    analyze_video_chunks,
+    build_chunk_url,
+)
+from .clients import get_analyzer
 from .embed import create_embedding
-from .models import Video
-from .nvidia_analyzer import NvidiaAnalyzer
-from .serializers import VideoSerializer
+from .events import EventStreamRenderer, event_stream
+from .jobs import enqueue, save_agent_output
+from .metadata import metadata_from_upload_result
+from .models import Job, Video, VideoChunk
+from .serializers import JobSerializer, VideoChunkSerializer, VideoSerializer
+from .vector_store import embed_search_query, search_moments
 from .specialised_agents.assault_agent import run_assault_agent
 from .specialised_agents.commercial_agents.customer_behaviour_agent import (
     run_customer_behaviour_agent,
@@ -29,6 +42,7 @@ from .specialised_agents.commercial_agents.suspicious_agent import run_suspiciou
 from .specialised_agents.commercial_agents.tamper_agent import run_tamper_agent
 from .specialised_agents.crime_agent import run_crime_agent
 from .specialised_agents.drug_agent import run_drug_agent
+from .specialised_agents.evaluate_all import run_evaluate_all
 from .specialised_agents.fire_agent import run_fire_agent
 from .specialised_agents.theft_agent import run_theft_agent
 
@@ -37,6 +51,217 @@ logger = logging.getLogger(__name__)
 agent_executors = {}
 
 
+def wants_background(request):
+    """Whether the caller asked for the work to be queued instead of run inline"""
+    value = request.query_params.get("background", request.data.get("background"))
+    if value is None:
+        return settings.RUN_JOBS_IN_BACKGROUND
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def flag(request, name):
+    """Boolean option passed in the query string or the request body"""
+    value = request.query_params.get(name, request.data.get(name))
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def enqueue_response(video, kind, payload=None):
+    """Queue a job for the video and answer 202 with the job id"""
+    job = enqueue(kind, video=video, payload=payload)
+    print(f"Queued {kind} job {job.id} for video: ", video.id)
+    return Response(
+        {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": reverse("job-detail", args=[job.id]),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+def event_stream_response(video, **snapshot):
+    """
+    Server-sent events for a video (see events.py), starting with a snapshot
+    of its chunks so late subscribers see what already finished.
+    """
+    snapshot["chunks"] = VideoChunkSerializer(video.chunks.all(), many=True).data
+    response = StreamingHttpResponse(
+        event_stream(video.id, snapshot), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status and progress of queued analysis, embedding and agent jobs"""
+
+    queryset = Job.objects.all().order_by("-created_at")
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        video_id = self.request.query_params.get("video")
+        if video_id:
+            queryset = queryset.filter(video_id=video_id)
+        return queryset
+
+    @action(
+        detail=True,
+        methods=["get"],
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+    )
+    def events(self, request, pk=None):
+        """Server-sent progress events of the job's video"""
+        job = self.get_object()
+        if job.video is None:
+            return Response(
+                {"error": "Job has no video"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return event_stream_response(job.video, job=JobSerializer(job).data)
+
+
+def parse_moment(value, name):
+    """
+    A datetime or date query parameter, None when absent.
+
+    Raises:
+        ValueError: When the value is not an ISO date or datetime
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        # Well formatted but invalid, like 2024-02-30
+        moment = None
+    if moment is None:
+        raise ValueError(f"{name} must be an ISO date or datetime, got {value!r}")
+    return moment
+
+
+def snippet(document, length=None):
+    """The start of a chunk description, cut at a word boundary"""
+    length = length or settings.SEARCH_SNIPPET_CHARS
+    if len(document) <= length:
+        return document
+    return document[:length].rsplit(" ", 1)[0] + "..."
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Moment search across every video: GET /api/search/?q=someone falls
+
+    Optional filters: video (repeatable or comma-separated ids), camera_id,
+    created_after and created_before (ISO date or datetime). Results are
+    paged with page and page_size.
+    """
+
+    def list(self, request):
+        started = time.monotonic()
+        query = (request.query_params.get("q") or "").strip()
+        if not query:
+            return Response(
+                {"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            page = max(int(request.query_params.get("page", 1)), 1)
+            page_size = int(
+                request.query_params.get("page_size", settings.SEARCH_PAGE_SIZE)
+            )
+            video_ids = [
+                int(video_id)
+                for value in request.query_params.getlist("video")
+                for video_id in value.split(",")
+                if video_id.strip()
+            ]
+        except ValueError:
+            return Response(
+                {"error": "page, page_size and video must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        page_size = min(max(page_size, 1), settings.SEARCH_MAX_PAGE_SIZE)
+        offset = (page - 1) * page_size
+        if offset + page_size > settings.SEARCH_MAX_RESULTS:
+            return Response(
+                {
+                    "error": f"Only the first {settings.SEARCH_MAX_RESULTS} hits are paged"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Metadata filters are resolved to video ids in the main database
+        videos = Video.objects.all()
+        filtered = bool(video_ids)
+        if video_ids:
+            videos = videos.filter(id__in=video_ids)
+        try:
+            created_after = parse_moment(
+                request.query_params.get("created_after"), "created_after"
+            )
+            created_before = parse_moment(
+                request.query_params.get("created_before"), "created_before"
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        camera_id = request.query_params.get("camera_id")
+        if created_after:
+            videos = videos.filter(created_at__gte=created_after)
+            filtered = True
+        if created_before:
+            videos = videos.filter(created_at__lte=created_before)
+            filtered = True
+        if camera_id:
+            videos = videos.filter(camera_id=camera_id)
+            filtered = True
+
+        hits = search_moments(
+            embed_search_query(query),
+            video_ids=list(videos.values_list("id", flat=True)) if filtered else None,
+            limit=page_size,
+            offset=offset,
+        )
+
+        urls = dict(
+            Video.objects.filter(id__in={hit["video_id"] for hit in hits}).values_list(
+                "id", "video_url"
+            )
+        )
+        results = []
+        for hit in hits:
+            video_url = urls.get(hit["video_id"])
+            if video_url is None:
+                # Deleted video, its documents haven't been cleaned up yet
+                continue
+            start, end = hit["start_time_seconds"], hit["end_time_seconds"]
+            results.append(
+                {
+                    "video_id": hit["video_id"],
+                    "start_time_seconds": start,
+                    "end_time_seconds": end,
+                    "snippet": snippet(hit["document"]),
+                    "chunk_url": (
+                        build_chunk_url(video_url, start, end)
+                        if start is not None and end is not None
+                        else video_url
+                    ),
+                    "score": round(1 - hit["distance"], 4),
+                }
+            )
+
+        return Response(
+            {
+                "query": query,
+                "page": page,
+                "page_size": page_size,
+                "next_page": page + 1 if len(hits) == page_size else None,
+                "results": results,
+                "took_ms": round((time.monotonic() - started) * 1000, 1),
+            }
+        )
+
+
 class VideoViewSet(viewsets.ModelViewSet):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
@@ -45,19 +270,57 @@ class VideoViewSet(viewsets.ModelViewSet):
         video_file = request.FILES.get("video")
         title = request.data.get("title")
         description = request.data.get("description")
+        camera_id = request.data.get("camera_id") or None
 
         # Upload to Cloudinary
         upload_result = cloudinary.uploader.upload(
             video_file, resource_type="video", folder="video_analyzer", format="mp4"
         )
 
-        # Create Video object
+        # Create Video object, with the metadata Cloudinary already probed
         video = Video.objects.create(
-            title=title, description=description, video_url=upload_result["secure_url"]
+            title=title,
+            description=description,
+            video_url=upload_result["secure_url"],
+            camera_id=camera_id,
+            **metadata_from_upload_result(upload_result),
         )
 
         return Response(VideoSerializer(video).data)
 
+    @action(
+        detail=True,
+        methods=["get"],
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+    )
+    def events(self, request, pk=None):
+        """
+        Server-sent events as the video is processed, from any web worker:
+        chunk_started, chunk_completed (with the chunk description),
+        embedding_progress, embedding_done, agent_done, and last
+        analysis_done (once the video is embedded) or analysis_failed, after
+        which the stream closes.
+        """
+        return event_stream_response(self.get_object())
+
+    @action(detail=True, methods=["get"])
+    def chunks(self, request, pk=None):
+        """Per-chunk status and results, readable while an analysis runs"""
+        video = self.get_object()
+        chunks = video.chunks.all()
+        counts = {code: 0 for code, _ in VideoChunk.STATUS_CHOICES}
+        for chunk in chunks:
+            counts[chunk.status] += 1
+        return Response(
+            {
+                "total": len(chunks),
+                "counts": counts,
+                "idle": sum(1 for chunk in chunks if chunk.idle),
+                "deduplicated": sum(1 for chunk in chunks if chunk.duplicate_of_id),
+                "chunks": VideoChunkSerializer(chunks, many=True).data,
+            }
+        )
+
     @action(detail=True, methods=["post"])
     def analyze(self, request, pk=None):
         # SINGLE API CALL PER VIDEO
@@ -83,141 +346,64 @@ class VideoViewSet(viewsets.ModelViewSet):
 
         # MULTIPLE API CALLS PER VIDEO DIVIDED INTO 30s INTERVALS
         """
-        Splits the Cloudinary video into 30s intervals (on-the-fly) and
-        analyzes each segment in a loop by calling NvidiaAnalyzer.analyze_video().
+        Splits the Cloudinary video into intervals (on-the-fly) and
+        analyzes the segments through the chunk pipeline, see
+        analysis.analyze_video_chunks().
+
+        Pass "background": true (or ?background=1) to queue the analysis as a
+        job and get a 202 with the job id back immediately.
+
+        Chunks already analyzed by an earlier (failed or interrupted) call are
+        kept, pass "restart": true to analyze the whole video again. Answers
+        409 while another request or job is analyzing the video, a queued
+        request gets the video's active analyze job back.
         """
         try:
             video = self.get_object()
-            analyzer = NvidiaAnalyzer()
-
-            secure_url = video.video_url
-            if not secure_url:
-                return Response(
-                    {"error": "No video URL found in the database."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            match = re.search(r"/video/upload/(?:v\d+/)?(.+)\.\w+$", secure_url)
-            if not match:
-                error_msg = (
-                    f"Could not parse public_id from URL: {secure_url}. "
-                    "Make sure it's a valid Cloudinary video URL."
-                )
-                logger.error(error_msg)
-                return Response(
-                    {"error": error_msg}, status=status.HTTP_400_BAD_REQUEST
-                )
-
-            public_id = match.group(1)  # e.g. "folder_name/abcd1234"
-            print("public_id: ", public_id)
-
-            try:
-                duration = VideoFileClip(secure_url).duration
-                duration = max(int(duration), 0)
-                print(f"Video duration: {duration} seconds")
-                if duration == 0:
-                    error_msg = "Could not retrieve video duration from Cloudinary."
-                    logger.error(error_msg)
-                    return Response(
-                        {"error": error_msg}, status=status.HTTP_400_BAD_REQUEST
-                    )
-            except cloudinary.exceptions.NotFound as e:
-                error_msg = f"Cloudinary resource not found for public_id: {public_id}"
-                logger.error(error_msg)
-                return Response({"error": error_msg}, status=status.HTTP_404_NOT_FOUND)
-
-            MAX_CHUNK_DURATION = 30
-            start_time = 0
-            intervals = []
-
-            while start_time < duration:
-                end_time = min(start_time + MAX_CHUNK_DURATION, duration)
-                intervals.append((start_time, end_time))
-                start_time = end_time
-
-            def build_chunk_url(original_url, start_sec, end_sec):
-                """
-                E.g. original_url:
-                  https://res.cloudinary.com/.../upload/v1736265995/video_analyzer/ulbcownftehnh9f0ge48.mp4
-                Insert "so_{start_sec},eo_{end_sec}/" after "/upload/", e.g.:
-                  https://res.cloudinary.com/.../upload/so_31,eo_60/v1736265995/...
-                """
-                # Insert transformation right after /upload/
-                return original_url.replace(
-                    "/upload/", f"/upload/so_{int(start_sec)},eo_{int(end_sec)}/"
-                )
+            restart = flag(request, "restart")
 
-            # -------------------------------------------------------------
-            # 4. Loop through each interval, build a subclip URL, and analyze
-            # -------------------------------------------------------------
-            chunk_results = []
-            chunk_count = 1
-            for start_sec, end_sec in intervals:
-                chunk_url = build_chunk_url(secure_url, start_sec, end_sec)
-                logger.info(
-                    f"Analyzing subclip: {start_sec}-{end_sec}s (URL: {chunk_url})"
+            if wants_background(request):
+                return enqueue_response(
+                    video, Job.KIND_ANALYZE, payload={"restart": restart}
                 )
 
-                print(
-                    "Analyzing subclip number: ",
-                    chunk_count,
-                    " : ",
-                    start_sec,
-                    "-",
-                    end_sec,
-                    "s",
-                )
-                subclip_result = analyzer.analyze_video(chunk_url)
-                chunk_results.append(
-                    {
-                        "start_time_seconds": start_sec,
-                        "end_time_seconds": end_sec,
-                        "analysis": subclip_result,
-                    }
-                )
-
-                chunk_count += 1
-
-            # -------------------------------------------------------------
-            # 5. Save / aggregate / return results (Done for debugging purposes)
-            # -------------------------------------------------------------
-            # For this example, we'll just store the entire list (JSON-serializable)
-            # in the `analysis_result` field.
-            # Saving Analysis Results to the Video object
-            video.analysis_result = chunk_results
-            video.save()
-
-            # -------------------------------------------------------------
-            # Writing chunk_results to a file for debugging purposes
-
-            # print("Writing chunk_results to file for debugging purposes...")
-            # file_path = os.path.join(settings.BASE_DIR, "chunk_results.txt")
+            chunk_results = analyze_video_chunks(video, restart=restart)
+            return Response(chunk_results)
 
-            # try:
-            #     # Open the file in write mode and write the chunk_results
-            #     with open(file_path, "w", encoding="utf-8") as file:
-            #         file.write(str(chunk_results))
-            #     print(f"chunk_results successfully written to {file_path}")
-            # except Exception as e:
-            #     # Handle exceptions, such as permission issues
-            #     print(f"Failed to write chunk_results to file: {e}")
+        except AnalysisInProgress as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except AnalysisError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except cloudinary.exceptions.NotFound as e:
+            error_msg = f"Cloudinary resource not found for video: {pk}"
+            logger.error(error_msg)
+            return Response({"error": error_msg}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error analyzing video: {str(e)}", exc_info=True)
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-            # print("chunk_results: ", chunk_results)
+    @action(detail=True, methods=["post"])
+    def embed(self, request, pk=None):
+        """(Re)creates the embedding of the video's analysis results"""
+        try:
+            video = self.get_object()
 
-            # DEBUGGING ENDS
-            # -------------------------------------------------------------
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_EMBED)
 
-            # Create embedding after analysis is complete
             print("Creating embedding for video: ", video.id)
             embedding_result = create_embedding(video.id)
             if embedding_result == -1:
-                logger.warning(f"Failed to create embedding for video {video.id}")
-
-            print("Embedding for video created: ", video.id)
-            return Response(chunk_results)
+                return Response(
+                    {"error": f"Failed to create embedding for video {video.id}"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
 
+            return Response({"status": "success"})
         except Exception as e:
-            logger.error(f"Error analyzing video: {str(e)}", exc_info=True)
+            logger.error(f"Error in embed: {str(e)}", exc_info=True)
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
@@ -231,10 +417,17 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_SUMMARIZE)
+
             print("Running summarize_agent for video: ", video.id)
             summary_output = run_summarize_agent(video.id)
-            video.summary_result = {"summary": summary_output}
-            video.save()
+            save_agent_output(
+                video,
+                "summarize_agent",
+                summary_output,
+                summary_result={"summary": summary_output},
+            )
             print("Summary completed")
 
             return Response({"summary": summary_output})
@@ -332,11 +525,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_FIRE_AGENT)
+
             print("Running fire_agent for video: ", video.id)
             fire_output = run_fire_agent(video.id)
             print(fire_output)
-            video.fire_evaluation = {"fire_evaluation": fire_output}
-            video.save()
+            save_agent_output(
+                video,
+                "fire_agent",
+                fire_output,
+                fire_evaluation={"fire_evaluation": fire_output},
+            )
             print("Fire Agent Analysis completed")
 
             return Response({"fire_evaluation": fire_output})
@@ -355,11 +555,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_ASSAULT_AGENT)
+
             print("Running assault_agent for video: ", video.id)
             assault_output = run_assault_agent(video.id)
             print(assault_output)
-            video.assault_evaluation = {"assault_evaluation": assault_output}
-            video.save()
+            save_agent_output(
+                video,
+                "assault_agent",
+                assault_output,
+                assault_evaluation={"assault_evaluation": assault_output},
+            )
             print("Assault Agent Analysis completed")
 
             return Response({"assault_evaluation": assault_output})
@@ -378,11 +585,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_CRIME_AGENT)
+
             print("Running crime_agent for video: ", video.id)
             crime_output = run_crime_agent(video.id)
             print(crime_output)
-            video.crime_evaluation = {"crime_evaluation": crime_output}
-            video.save()
+            save_agent_output(
+                video,
+                "crime_agent",
+                crime_output,
+                crime_evaluation={"crime_evaluation": crime_output},
+            )
             print("Crime Agent Analysis completed")
 
             return Response({"crime_evaluation": crime_output})
@@ -401,11 +615,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_DRUG_AGENT)
+
             print("Running drug_agent for video: ", video.id)
             drug_output = run_drug_agent(video.id)
             print(drug_output)
-            video.drug_evaluation = {"drug_evaluation": drug_output}
-            video.save()
+            save_agent_output(
+                video,
+                "drug_agent",
+                drug_output,
+                drug_evaluation={"drug_evaluation": drug_output},
+            )
             print("Drug Agent Analysis completed")
 
             return Response({"drug_evaluation": drug_output})
@@ -424,11 +645,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_THEFT_AGENT)
+
             print("Running theft_agent for video: ", video.id)
             theft_output = run_theft_agent(video.id)
             print(theft_output)
-            video.theft_evaluation = {"theft_evaluation": theft_output}
-            video.save()
+            save_agent_output(
+                video,
+                "theft_agent",
+                theft_output,
+                theft_evaluation={"theft_evaluation": theft_output},
+            )
             print("Theft Agent Analysis completed")
 
             return Response({"theft_evaluation": theft_output})
@@ -451,11 +679,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_TAMPER_AGENT)
+
             print("Running assault_agent for video: ", video.id)
             tamper_output = run_tamper_agent(video.id)
             print(tamper_output)
-            video.tamper_evaluation = {"tamper_evaluation": tamper_output}
-            video.save()
+            save_agent_output(
+                video,
+                "tamper_agent",
+                tamper_output,
+                tamper_evaluation={"tamper_evaluation": tamper_output},
+            )
             print("Tamper Agent Analysis completed")
 
             return Response({"tamper_evaluation": tamper_output})
@@ -474,11 +709,18 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_SUSPICIOUS_AGENT)
+
             print("Running suspicious_agent for video: ", video.id)
             suspicious_output = run_suspicious_agent(video.id)
             print(suspicious_output)
-            video.suspicious_evaluation = {"suspicious_evaluation": suspicious_output}
-            video.save()
+            save_agent_output(
+                video,
+                "suspicious_agent",
+                suspicious_output,
+                suspicious_evaluation={"suspicious_evaluation": suspicious_output},
+            )
             print("Suspicious Agent Analysis completed")
 
             return Response({"suspicious_evaluation": suspicious_output})
@@ -497,10 +739,17 @@ class VideoViewSet(viewsets.ModelViewSet):
         try:
             video = self.get_object()
 
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_CUSTOMER_BEHAVIOUR_AGENT)
+
             print("Running customer_behaviour_agent for video: ", video.id)
-            customer_behaviour_output = run_summarize_agent(video.id)
-            video.customer_behaviour = {"customer_behaviour": customer_behaviour_output}
-            video.save()
+            customer_behaviour_output = run_customer_behaviour_agent(video.id)
+            save_agent_output(
+                video,
+                "customer_behaviour_agent",
+                customer_behaviour_output,
+                customer_behaviour={"customer_behaviour": customer_behaviour_output},
+            )
             print("Summary completed")
 
             return Response({"customer_behaviour": customer_behaviour_output})
@@ -510,6 +759,37 @@ class VideoViewSet(viewsets.ModelViewSet):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=["post"])
+    def evaluate_all(self, request, pk=None):
+        """
+        Evaluates the video for every detector (fire, assault, crime, drug,
+        theft, tamper, suspicious and customer behaviour) in one structured
+        LLM pass over its chunk descriptions, instead of running the eight
+        agents one by one. Every evaluation field is saved and returned.
+        """
+        try:
+            video = self.get_object()
+
+            if wants_background(request):
+                return enqueue_response(video, Job.KIND_EVALUATE_ALL)
+
+            print("Running evaluate_all for video: ", video.id)
+            outputs = run_evaluate_all(video.id)
+            save_agent_output(
+                video,
+                "evaluate_all",
+                outputs,
+                **{field: {field: output} for field, output in outputs.items()},
+            )
+            print("Evaluate All completed")
+
+            return Response(outputs)
+        except Exception as e:
+            logger.error(f"Error in evaluate_all: {str(e)}", exc_info=True)
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
     # def create(self, request):
     #     video_file = request.FILES.get("video")
     #     title = request.data.get("title")
@@ -543,7 +823,7 @@ class VideoViewSet(viewsets.ModelViewSet):
             print("Analyzing stream segment")
             print("Video URL: ", video.video_url)
             # time.sleep(30)
-            analyzer = NvidiaAnalyzer()
+            analyzer = get_analyzer()
             result = analyzer.analyze_video(video.video_url)
             print("Stream Analysis completed")
 
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import InferenceCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees space down to this share of max_bytes, so the next stores
+# don't trigger another eviction right away
+EVICT_TO = 0.9
+
+
+def cache_key(content_hash, query, params):
+    """Key for a clip's content hash analyzed with query and params"""
+    raw = json.dumps(
+        {"content_hash": content_hash, "query": query, "params": params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class VlmResponseCache:
+    """
+    Persistent cache of NVIDIA VLM responses, shared by every process through
+    the database.
+
+    Entries expire after VLM_CACHE_TTL_SECONDS (0 disables expiry) and the
+    least recently used ones are evicted once the stored responses exceed
+    VLM_CACHE_MAX_BYTES. Hits, misses, stores and evictions are counted per
+    process, see stats().
+
+    Stores don't sum the table: the process adds what it stores to the total
+    measured by the last eviction, and only evicts when that running total
+    exceeds max_bytes or every evict_interval stores (other processes store
+    too).
+    """
+
+    def __init__(self, max_bytes=None, ttl_seconds=None, evict_interval=None):
+        self.max_bytes = (
+            settings.VLM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        )
+        self.ttl_seconds = (
+            settings.VLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        )
+        self.evict_interval = (
+            settings.VLM_CACHE_EVICT_INTERVAL
+            if evict_interval is None
+            else evict_interval
+        )
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # Running total of the cache size, None until the first eviction
+        self._total_bytes = None
+        self._stores_since_evict = 0
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _expired(self, entry):
+        if not self.ttl_seconds:
+            return False
+        return entry.created_at < timezone.now() - timedelta(seconds=self.ttl_seconds)
+
+    def lookup(self, content_hash, query, params):
+        """
+        Returns:
+            dict or None: The stored response, None on a miss
+        """
+        key = cache_key(content_hash, query, params)
+        entry = InferenceCacheEntry.objects.filter(key=key).first()
+        if entry is not None and self._expired(entry):
+            entry.delete()
+            self._count("evictions")
+            entry = None
+
+        if entry is None:
+            self._count("misses")
+            return None
+
+        InferenceCacheEntry.objects.filter(pk=entry.pk).update(
+            hits=F("hits") + 1, last_accessed_at=timezone.now()
+        )
+        self._count("hits")
+        logger.info(f"VLM cache hit for content {content_hash[:12]}")
+        return entry.response
+
+    def store(self, content_hash, query, params, response):
+        """Store a response, failed inferences (no choices) are not cached"""
+        if not isinstance(response, dict) or not response.get("choices"):
+            return
+
+        size_bytes = len(json.dumps(response).encode("utf-8"))
+        if self.max_bytes and size_bytes > self.max_bytes:
+            return
+
+        InferenceCacheEntry.objects.update_or_create(
+            key=cache_key(content_hash, query, params),
+            defaults={
+                "content_hash": content_hash,
+                "query": query,
+                "params": params,
+                "response": response,
+                "size_bytes": size_bytes,
+                "last_accessed_at": timezone.now(),
+            },
+        )
+        self._count("stores")
+        if self._should_evict(size_bytes):
+            self.evict()
+
+    def _should_evict(self, size_bytes):
+        with self._lock:
+            self._stores_since_evict += 1
+            if self._total_bytes is None:
+                return True
+            self._total_bytes += size_bytes
+            return self._stores_since_evict >= self.evict_interval or bool(
+                self.max_bytes and self._total_bytes > self.max_bytes
+            )
+
+    def evict(self):
+        """
+        Drop expired entries, then once the cache exceeds max_bytes the least
+        recently used ones until it fits in EVICT_TO of it.
+
+        Returns:
+            int: Number of entries removed
+        """
+        removed = 0
+        if self.ttl_seconds:
+            cutoff = timezone.now() - timedelta(seconds=self.ttl_seconds)
+            removed += InferenceCacheEntry.objects.filter(
+                created_at__lt=cutoff
+            ).delete()[0]
+
+        total = (
+            InferenceCacheEntry.objects.aggregate(total=Sum("size_bytes"))["total"] or 0
+        )
+        if self.max_bytes and total > self.max_bytes:
+            excess = total - int(self.max_bytes * EVICT_TO)
+            doomed = []
+            for pk, size_bytes in InferenceCacheEntry.objects.order_by(
+                "last_accessed_at"
+            ).values_list("pk", "size_bytes"):
+                if excess <= 0:
+                    break
+                doomed.append(pk)
+                excess -= size_bytes
+                total -= size_bytes
+            removed += InferenceCacheEntry.objects.filter(pk__in=doomed).delete()[0]
+
+        with self._lock:
+            self._total_bytes = total
+            self._stores_since_evict = 0
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._total_bytes = 0
+        return InferenceCacheEntry.objects.all().delete()[0]
+
+    def stats(self):
+        """Counters of this process plus the size of the persistent cache"""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        aggregate = InferenceCacheEntry.objects.aggregate(
+            total_bytes=Sum("size_bytes"), total_hits=Sum("hits")
+        )
+        stats["entries"] = InferenceCacheEntry.objects.count()
+        stats["total_bytes"] = aggregate["total_bytes"] or 0
+        stats["lifetime_hits"] = aggregate["total_hits"] or 0
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide cache instance, None when VLM_CACHE_ENABLED is off"""
+    global _default_cache
+    if not settings.VLM_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = VlmResponseCache()
+        return _default_cache
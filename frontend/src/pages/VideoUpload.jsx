@@ -91,19 +91,37 @@ const VideoUpload = () => {
         setLoading(false);
     };
 
+    // Background jobs answer 202 with a job id, their result comes later
+    const waitForJob = async (jobId) => {
+        for (;;) {
+            const { data: job } = await axios.get(`${API_BASE_URL}/jobs/${jobId}/`);
+            if (job.status === 'succeeded') return job.result;
+            if (job.status === 'failed') throw new Error(job.error);
+            await new Promise((resolve) => setTimeout(resolve, 2000));
+        }
+    };
+
+    // Runs a video action inline or as a background job, whichever the server
+    // chose, and returns its result
+    const runAction = async (action) => {
+        const response = await axios.post(
+            `${API_BASE_URL}/videos/${uploadedVideo.id}/${action}/`
+        );
+        if (response.status === 202) return waitForJob(response.data.job_id);
+        return response.data;
+    };
+
     const handleSummary = async () => {
         if (!uploadedVideo) return;
 
         setSummaryLoading(true);
         try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/summarize_agent/`
-            );
+            const summary = await runAction('summarize_agent');
             setUploadedVideo(prevVideo => ({
                 ...prevVideo,
-                summary_result: response.data
+                summary_result: summary
             }));
-            console.log('Summary generated:', response.data);
+            console.log('Summary generated:', summary);
             setNotification('Summary generated successfully!');
             await handleFireAgent();
             await handleAssaultAgent();
@@ -122,10 +140,7 @@ const VideoUpload = () => {
         if (!uploadedVideo) return;
 
         try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/fire_agent/`
-            );
-            setFireEvaluation(response.data);
+            setFireEvaluation(await runAction('fire_agent'));
             setNotification('Fire analysis complete!');
         } catch (error) {
             console.error('Fire analysis error:', error);
@@ -137,10 +152,7 @@ const VideoUpload = () => {
         if (!uploadedVideo) return;
 
         try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/assault_agent/`
-            );
-            setAssaultEvaluation(response.data);
+            setAssaultEvaluation(await runAction('assault_agent'));
             setNotification('Assault analysis complete!');
         } catch (error) {
             console.error('Assault analysis error:', error);
@@ -152,10 +164,7 @@ const VideoUpload = () => {
         if (!uploadedVideo) return;
 
         try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/crime_agent/`
-            );
-            setCrimeEvaluation(response.data);
+            setCrimeEvaluation(await runAction('crime_agent'));
             setNotification('Crime analysis complete!');
         } catch (error) {
             console.error('Crime analysis error:', error);
@@ -167,10 +176,7 @@ const VideoUpload = () => {
         if (!uploadedVideo) return;
 
         try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/drug_agent/`
-            );
-            setDrugEvaluation(response.data);
+            setDrugEvaluation(await runAction('drug_agent'));
             setNotification('Drug analysis complete!');
         } catch (error) {
             console.error('Drug analysis error:', error);
@@ -182,10 +188,7 @@ const VideoUpload = () => {
         if (!uploadedVideo) return;
 
         try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/theft_agent/`
-            );
-            setTheftEvaluation(response.data);
+            setTheftEvaluation(await runAction('theft_agent'));
             setNotification('Theft analysis complete!');
         } catch (error) {
             console.error('Theft analysis error:', error);
@@ -197,17 +200,71 @@ const VideoUpload = () => {
         if (!uploadedVideo) return;
 
         setLoading(true);
-        try {
-            const response = await axios.post(
-                `${API_BASE_URL}/videos/${uploadedVideo.id}/analyze/`
+
+        // Chunk results arrive as server-sent events while the analysis runs
+        const chunks = {};
+        const showChunks = () => {
+            const analysisResult = Object.values(chunks)
+                .filter((chunk) => chunk.analysis)
+                .sort((a, b) => a.start_time_seconds - b.start_time_seconds);
+            setUploadedVideo((video) => ({ ...video, analysis_result: analysisResult }));
+        };
+
+        const events = new EventSource(
+            `${API_BASE_URL}/videos/${uploadedVideo.id}/events/`
+        );
+        events.addEventListener('snapshot', (e) => {
+            JSON.parse(e.data).data.chunks.forEach((chunk) => {
+                chunks[chunk.index] = chunk;
+            });
+            showChunks();
+        });
+        events.addEventListener('chunk_completed', (e) => {
+            const chunk = JSON.parse(e.data).data;
+            if (chunk.status !== 'succeeded') return;
+            chunks[chunk.index] = {
+                start_time_seconds: chunk.start_time_seconds,
+                end_time_seconds: chunk.end_time_seconds,
+                analysis: { choices: [{ message: { content: chunk.description } }] },
+            };
+            showChunks();
+        });
+        // The run ends on whichever comes first: the terminal event, or the
+        // analyze request (or its job) finishing. A fast run can be over
+        // before the event stream is subscribed.
+        let finished = false;
+        const finish = async (succeeded) => {
+            if (finished) return;
+            finished = true;
+            events.close();
+            setLoading(false);
+            if (!succeeded) {
+                setNotification('Error analyzing video');
+                return;
+            }
+            const { data: video } = await axios.get(
+                `${API_BASE_URL}/videos/${uploadedVideo.id}/`
             );
-            setUploadedVideo({ ...uploadedVideo, analysis_result: response.data });
+            setUploadedVideo((prevVideo) => ({
+                ...prevVideo,
+                analysis_result: video.analysis_result,
+            }));
             setNotification('Analysis complete!');
             await handleSummary();
+        };
+        events.addEventListener('analysis_done', () => finish(true));
+        events.addEventListener('analysis_failed', () => finish(false));
+
+        try {
+            // The server decides whether to queue the analysis (only when
+            // RUN_JOBS_IN_BACKGROUND is set and `manage.py run_workers` runs)
+            // or run it inline; progress arrives on the event stream either way
+            await runAction('analyze');
+            await finish(true);
         } catch (error) {
-            setNotification('Error analyzing video');
+            console.error('Analysis error:', error);
+            await finish(false);
         }
-        setLoading(false);
     };
 
 